@@ -0,0 +1,277 @@
+"""Benchmarks for every packing path.
+
+Each case runs one packing function on a synthetic workload and records the best wall time
+over a few repeats, the peak traced memory of one extra run and the number of items placed.
+Workload families scale along box area, item count or type count:
+
+    tiny-skus   small items on large shelves (box area)
+    many-types  mixed SKUs, 8 to 128 types (type count)
+    fractional  non-integer box and item dimensions
+    aspect      very long, thin items (worst-case aspect ratios)
+    fleet       many items over a fleet of boxes (item count)
+    startup     a fresh interpreter importing the solver or running one CLI solve
+
+Usage:
+
+    python benchmarks/bench.py run [--quick] [-k PATTERN] [--repeat N] [--output results.json]
+    python benchmarks/bench.py compare benchmarks/baseline.json results.json [--threshold 0.5]
+    python benchmarks/bench.py list
+
+`compare` exits with status 1 when a case got slower or used more memory than the threshold
+allows, or placed fewer items than in the baseline. Timings are scaled by a calibration loop
+recorded with every run so a baseline taken on another machine stays roughly comparable.
+Refresh the baseline with `run --output benchmarks/baseline.json`.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import packer  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+MULTI_PATHS = ('greedy', 'maxrects', 'skyline', 'guillotine')
+
+
+class Case(NamedTuple):
+    name: str
+    path: str
+    family: str
+    run: Callable[[], int]
+    quick: bool
+
+
+def _single(fn, W, H, w, h):
+    return lambda: len(fn(W, H, w, h))
+
+
+def _multi(algorithm, W, H, items):
+    return lambda: len(packer.pack_items(W, H, items, algorithm))
+
+
+def _startup(*args, stdin: Optional[str] = None):
+    # wall time of a new process, so import and start-up costs are measured, not the solve
+    def run():
+        subprocess.run([sys.executable, *args], cwd=ROOT, check=True, input=stdin, text=True, stdout=subprocess.DEVNULL)
+        return 1
+    return run
+
+
+def _mixed_items(rng: random.Random, types: int, lo: float, hi: float, count: int, fractional: bool = False) -> List[Dict]:
+    items = []
+    for _ in range(types):
+        if fractional:
+            w, h = round(rng.uniform(lo, hi), 2), round(rng.uniform(lo, hi), 2)
+        else:
+            w, h = rng.randint(int(lo), int(hi)), rng.randint(int(lo), int(hi))
+        items.append({'w': w, 'h': h, 'count': count})
+    return items
+
+
+def build_cases() -> List[Case]:
+    cases: List[Case] = []
+
+    def add(name, path, family, run, quick=False):
+        cases.append(Case(name, path, family, run, quick))
+
+    # tiny SKUs on large shelves: single-type paths scale with box area
+    for i, side in enumerate((250, 500, 1000)):
+        tag = f'tiny-skus/{side}x{side}/1x2'
+        add(f'grid_pack/{tag}', 'grid_pack', 'tiny-skus', _single(packer.grid_pack, side, side, 1, 2), i == 0)
+        add(f'greedy_row_pack/{tag}', 'greedy_row_pack', 'tiny-skus', _single(packer.greedy_row_pack, side, side, 1, 2), i == 0)
+    for i, side in enumerate((1000, 10000, 100000)):
+        add(f'best_layout/tiny-skus/{side}x{side}/3x7', 'best_layout', 'tiny-skus',
+            _single(packer.best_layout, side, side, 3, 7), i == 0)
+    # tiny SKUs for the multi-item paths; the lattice scan gets a smaller shelf
+    for i, side in enumerate((60, 120)):
+        items = [{'w': 2, 'h': 3, 'count': 0}, {'w': 1, 'h': 4, 'count': 0}]
+        add(f'greedy/tiny-skus/{side}x{side}', 'greedy', 'tiny-skus', _multi('greedy', side, side, items), i == 0)
+    for i, side in enumerate((100, 200)):
+        items = [{'w': 2, 'h': 3, 'count': 0}, {'w': 1, 'h': 4, 'count': 0}]
+        for algorithm in MULTI_PATHS[1:]:
+            add(f'{algorithm}/tiny-skus/{side}x{side}', algorithm, 'tiny-skus', _multi(algorithm, side, side, items), i == 0)
+
+    # many types: scale with the number of distinct SKUs
+    for i, types in enumerate((8, 32, 128)):
+        items = _mixed_items(random.Random(types), types, 5, 60, 3)
+        for algorithm in MULTI_PATHS:
+            if algorithm == 'greedy' and types > 32:
+                continue
+            add(f'{algorithm}/many-types/{types}', algorithm, 'many-types', _multi(algorithm, 400, 300, items), i == 0)
+
+    # fractional dimensions
+    add('grid_pack/fractional', 'grid_pack', 'fractional', _single(packer.grid_pack, 997.3, 611.9, 2.35, 3.7), True)
+    add('greedy_row_pack/fractional', 'greedy_row_pack', 'fractional', _single(packer.greedy_row_pack, 997.3, 611.9, 2.35, 3.7), True)
+    add('best_layout/fractional', 'best_layout', 'fractional', _single(packer.best_layout, 9973.1, 6118.7, 2.35, 3.7), True)
+    items = _mixed_items(random.Random(3), 12, 1.5, 17.5, 20, fractional=True)
+    for algorithm in MULTI_PATHS:
+        add(f'{algorithm}/fractional', algorithm, 'fractional', _multi(algorithm, 97.3, 61.9, items), True)
+
+    # worst-case aspect ratios: long thin items in both orientations
+    for i, (w, h) in enumerate(((1, 97), (0.5, 149.5))):
+        tag = f'aspect/{w}x{h}'
+        add(f'grid_pack/{tag}', 'grid_pack', 'aspect', _single(packer.grid_pack, 1500, 1490, w, h), i == 0)
+        add(f'greedy_row_pack/{tag}', 'greedy_row_pack', 'aspect', _single(packer.greedy_row_pack, 1500, 1490, w, h), i == 0)
+        add(f'best_layout/{tag}', 'best_layout', 'aspect', _single(packer.best_layout, 1500, 1490, w, h), i == 0)
+    items = [{'w': 1, 'h': 37, 'count': 0}, {'w': 41, 'h': 2, 'count': 0}]
+    for algorithm in MULTI_PATHS:
+        add(f'{algorithm}/aspect', algorithm, 'aspect', _multi(algorithm, 160, 120, items), True)
+
+    # fleets: item count across many boxes
+    for i, n in enumerate((200, 1000)):
+        rng = random.Random(n)
+        items = [{'w': rng.randint(5, 40), 'h': rng.randint(5, 40), 'count': 1} for _ in range(n)]
+        boxes = [{'w': 120, 'h': 80, 'count': n}, {'w': 200, 'h': 100, 'count': n}]
+        add(f'pack_bins/fleet/{n}', 'pack_bins', 'fleet',
+            lambda boxes=boxes, items=items: packer.pack_bins(boxes, items)['count'], i == 0)
+
+    # start-up: what a script calling the CLI once per solve pays every time
+    add('startup/python', 'startup', 'startup', _startup('-c', 'pass'), True)
+    add('startup/import-core', 'startup', 'startup', _startup('-c', 'import packer_core'), True)
+    add('startup/import-packer', 'startup', 'startup', _startup('-c', 'import packer'), True)
+    add('startup/cli-single', 'startup', 'startup',
+        _startup('packer.py', '--box', '100', '50', '--item', '30', '20', '--no-cache'), True)
+    jobs = ''.join(json.dumps({'box': [100, 50], 'items': [{'w': 30, 'h': 20, 'count': n}]}) + '\n' for n in range(1, 11))
+    add('startup/serve-10-jobs', 'startup', 'startup', _startup('packer.py', '--serve', '--no-cache', stdin=jobs), True)
+    return cases
+
+
+def calibrate() -> float:
+    """Seconds for a fixed pure-Python loop; used to scale timings between machines."""
+    best = float('inf')
+    # the best of several runs; with fewer, one slow run on a busy machine skews every case
+    for _ in range(9):
+        t0 = time.perf_counter()
+        acc = 0
+        for i in range(300000):
+            acc += i * i % 7
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def measure(case: Case, repeat: int) -> Dict:
+    times = []
+    count = 0
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        count = case.run()
+        times.append(time.perf_counter() - t0)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        case.run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'path': case.path, 'family': case.family, 'seconds': min(times), 'peak_bytes': peak, 'count': count}
+
+
+def run(pattern: Optional[str] = None, quick: bool = False, repeat: int = 3, out=None) -> Dict:
+    results = {}
+    for case in build_cases():
+        if quick and not case.quick:
+            continue
+        if pattern and pattern not in case.name:
+            continue
+        r = measure(case, repeat)
+        results[case.name] = r
+        if out is not None:
+            print(f"{case.name:<45} {r['seconds'] * 1000:10.2f} ms {r['peak_bytes'] / 1024:10.1f} KiB {r['count']:>12}", file=out)
+            out.flush()
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'calibration': calibrate(),
+        'cases': results,
+    }
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = 0.5, min_seconds: float = 0.005) -> List[str]:
+    """Regressions of `current` against `baseline`, one message per failing case.
+
+    A case fails when its calibrated time or its peak memory grows by more than `threshold`
+    (a fraction), or when it places fewer items. Cases faster than `min_seconds` in both runs
+    are too noisy to time and are only checked for memory and count. A case the baseline does
+    not list also fails, so a new case cannot go without a gate."""
+    scale = 1.0
+    if baseline.get('calibration') and current.get('calibration'):
+        scale = current['calibration'] / baseline['calibration']
+    failures = []
+    for name, base in sorted(baseline['cases'].items()):
+        cur = current['cases'].get(name)
+        if cur is None:
+            continue
+        expected = base['seconds'] * scale
+        if max(expected, cur['seconds']) >= min_seconds and cur['seconds'] > expected * (1 + threshold):
+            failures.append(f"{name}: time {cur['seconds'] * 1000:.2f} ms vs {expected * 1000:.2f} ms "
+                            f"(+{cur['seconds'] / expected - 1:.0%})")
+        # allow a little slack for allocator noise on tiny peaks
+        if cur['peak_bytes'] > base['peak_bytes'] * (1 + threshold) + 4096:
+            failures.append(f"{name}: peak memory {cur['peak_bytes']} B vs {base['peak_bytes']} B "
+                            f"(+{cur['peak_bytes'] / max(base['peak_bytes'], 1) - 1:.0%})")
+        if cur['count'] < base['count']:
+            failures.append(f"{name}: placed {cur['count']} items vs {base['count']}")
+    for name in sorted(set(current['cases']) - set(baseline['cases'])):
+        failures.append(f'{name}: not in the baseline; record it with run --output')
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Packing benchmarks')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('run', help='Run the benchmark cases')
+    p.add_argument('-k', dest='pattern', help='Only run cases whose name contains PATTERN')
+    p.add_argument('--quick', action='store_true', help='Smallest scale of every workload only')
+    p.add_argument('--repeat', type=int, default=3, help='Timed runs per case; the best is kept')
+    p.add_argument('--output', help='Write results as JSON to this path')
+    p = sub.add_parser('compare', help='Compare results against a baseline')
+    p.add_argument('baseline', nargs='?', default=BASELINE)
+    p.add_argument('current', nargs='?', help='Results JSON; runs every case when omitted')
+    p.add_argument('--threshold', type=float, default=0.5, help='Allowed relative growth in time and memory (0.5 = 50%%)')
+    sub.add_parser('list', help='List the benchmark cases')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'list':
+        for case in build_cases():
+            print(f"{case.name:<45} {case.path:<16} {'quick' if case.quick else ''}")
+        return
+    if args.command == 'run':
+        results = run(args.pattern, args.quick, max(1, args.repeat), sys.stdout)
+        if args.output:
+            with open(args.output, 'w', encoding='utf8') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+            print(f'Wrote results to {args.output}')
+        return
+    with open(args.baseline, 'r', encoding='utf8') as f:
+        baseline = json.load(f)
+    if args.current:
+        with open(args.current, 'r', encoding='utf8') as f:
+            current = json.load(f)
+    else:
+        current = run(out=sys.stdout)
+    failures = compare(baseline, current, args.threshold)
+    for msg in failures:
+        print(f'REGRESSION {msg}')
+    checked = len(current['cases'])
+    if failures:
+        print(f'{len(failures)} regression(s) in {checked} case(s)')
+        sys.exit(1)
+    print(f'No regressions in {checked} case(s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+"""Precomputed single-type capacities: how many of each catalog item fit on each shelf size.
+
+build_table() solves every (item, shelf) pair of a catalog and a set of shelf sizes with the
+same searches as packer_core.solve_single_type (uniform grids, two- and three-block splits and
+four-block pinwheels, so the best orientation mix), but as NumPy array arithmetic over batches
+of pairs and split positions instead of Python loops per pair. Counts are exactly those of
+best_layout without max_items.
+
+A table is two files: TABLE (a .npy int32 matrix, one row per item and one column per shelf,
+both with the longer side first) and TABLE minus its extension plus .json, the index of rows
+and columns. Rebuilding against a changed catalog or shelf list only solves the new rows and
+columns and copies the rest. CapacityTable answers lookups in O(1) from a memory map of the
+matrix, without NumPy, and reloads the table when a rebuild replaces it.
+"""
+import json
+import math
+import os
+import struct
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from packer_core import CACHE_VERSION, EPS, PINWHEEL_LIMIT, SPLIT_WINDOW, _cuts, _fit
+
+VERSION = 1
+# array elements one batch of pairs may allocate per temporary
+CELL_BUDGET = 1 << 22
+# seconds between checks whether a rebuild has replaced the table on disk
+REFRESH_INTERVAL = 1.0
+
+Dims = Tuple[float, float]
+
+
+def index_path(path: str) -> str:
+    """The JSON index beside a table, e.g. capacity.json for capacity.npy."""
+    return os.path.splitext(path)[0] + '.json'
+
+
+def _canon(w: float, h: float) -> Dims:
+    w, h = float(w), float(h)
+    return (w, h) if w >= h else (h, w)
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('building a capacity table needs NumPy (pip install numpy)')
+    return numpy
+
+
+# --- vectorized single-type counts ---
+# Each helper mirrors its packer_core namesake on arrays of pairs; arguments broadcast, and
+# split positions are laid out along a new last axis and reduced with max.
+
+def _vfit(np, length, size):
+    n = np.floor_divide(length + EPS, size).astype(np.int64)
+    return np.where(length < size - EPS, 0, n)
+
+
+def _vuniform(np, w, h, a, b):
+    return np.maximum(_vfit(np, w, a) * _vfit(np, h, b), _vfit(np, w, b) * _vfit(np, h, a))
+
+
+def _vwindow(np, n, window: Optional[int]):
+    """Split positions k (last axis) of packer_core._window(n, window) and which are used."""
+    n = n[..., None]
+    if window is None:
+        k = np.arange(1, int(n.max(initial=0)) + 1)
+    else:
+        j = np.arange(2 * window)
+        k = np.where((n > 2 * window) & (j >= window), n - 2 * window + 1 + j, j + 1)
+    return k, k <= n
+
+
+def _vband(np, W, H, a, b, window: Optional[int] = None):
+    W, H, a, b = np.broadcast_arrays(W, H, a, b)
+    best = _vuniform(np, W, H, a, b)
+    for p, q in ((a, b), (b, a)):
+        cols = _vfit(np, W, p)[..., None]
+        k, used = _vwindow(np, _vfit(np, H, q), window)
+        c = cols * k + _vuniform(np, W[..., None], H[..., None] - k * q[..., None], a[..., None], b[..., None])
+        best = np.maximum(best, np.where(used & (cols > 0), c, 0).max(axis=-1, initial=0))
+    return best
+
+
+def _vthree_block(np, W, H, a, b, window: int):
+    W, H, a, b = np.broadcast_arrays(W, H, a, b)
+    best = np.full(W.shape, -1, dtype=np.int64)
+    for p, q in ((a, b), (b, a)):
+        cols = _vfit(np, W, p)[..., None]
+        k, used = _vwindow(np, _vfit(np, H, q), window)
+        inner = _vband(np, H[..., None] - k * q[..., None], W[..., None], a[..., None], b[..., None], window)
+        best = np.maximum(best, np.where(used & (cols > 0), cols * k + inner, -1).max(axis=-1, initial=-1))
+    return best
+
+
+def _vpinwheel(np, W: float, H: float, a: float, b: float) -> int:
+    """packer_core._pinwheel's count for one pair, every (x1, x3, y) cut triple at once."""
+    if _fit(W, a) + _fit(W, b) > PINWHEEL_LIMIT or _fit(H, a) + _fit(H, b) > PINWHEEL_LIMIT:
+        return -1
+    xs = np.array(_cuts(W, a, b))
+    ys = np.array(_cuts(H, a, b))
+    x1, x3, y = xs[:, None, None], xs[None, :, None], ys[None, None, :]
+    lower = _vuniform(np, W - x1, y, a, b) + _vuniform(np, W - x3, H - y, a, b)
+    # the best lower pair at or below each y, as the running maximum of the scalar loop
+    c = _vuniform(np, x1, y, a, b) + _vuniform(np, x3, H - y, a, b) + np.maximum.accumulate(lower, axis=2)
+    return int(np.where(x3 >= x1, c, -1).max())
+
+
+def solve_counts(items: Sequence[Dims], shelves: Sequence[Dims]):
+    """int64 matrix of single-type capacities, items x shelves, for canonical dimensions."""
+    np = _numpy()
+    out = np.zeros((len(items), len(shelves)), dtype=np.int64)
+    if not len(items) or not len(shelves):
+        return out
+    ia = np.array(items, dtype=np.float64).reshape(-1, 2)
+    sa = np.array(shelves, dtype=np.float64).reshape(-1, 2)
+    # the full-range band splits allocate one element per split position
+    longest = max(int(sa[:, 0].max() / ia[:, 1].min()) + 1, 2 * SPLIT_WINDOW * (2 * SPLIT_WINDOW + 1))
+    batch = max(1, CELL_BUDGET // (2 * longest))
+    rows, cols = np.divmod(np.arange(out.size), len(shelves))
+    for start in range(0, out.size, batch):
+        r, c = rows[start:start + batch], cols[start:start + batch]
+        W, H, a, b = sa[c, 0], sa[c, 1], ia[r, 0], ia[r, 1]
+        best = _vuniform(np, W, H, a, b)
+        mixed = a != b
+        if mixed.any():
+            W, H, a, b = W[mixed], H[mixed], a[mixed], b[mixed]
+            found = np.maximum.reduce([best[mixed], _vband(np, W, H, a, b), _vband(np, H, W, a, b)])
+            # the costlier searches only run where the area bound leaves room for more; the
+            # bound allows for the EPS tolerance of _fit and for rounding of the division
+            bound = np.floor((W + 4 * EPS) * (H + 4 * EPS) / (a * b) * (1 + 1e-12)).astype(np.int64)
+            open_ = np.flatnonzero(found < bound)
+            if len(open_):
+                Wo, Ho, ao, bo = W[open_], H[open_], a[open_], b[open_]
+                found[open_] = np.maximum.reduce([found[open_], _vthree_block(np, Wo, Ho, ao, bo, SPLIT_WINDOW),
+                                                  _vthree_block(np, Ho, Wo, ao, bo, SPLIT_WINDOW)])
+            for i in open_[found[open_] < bound[open_]]:
+                found[i] = max(found[i], _vpinwheel(np, W[i], H[i], a[i], b[i]))
+            best[mixed] = found
+        out.flat[start:start + batch] = best
+    return out
+
+
+# --- building ---
+
+def _dims_list(entries: Iterable) -> Tuple[List[Dims], Dict[Dims, List]]:
+    """Distinct canonical dimensions in first-seen order, and the SKU/ids naming each."""
+    dims: Dict[Dims, List] = {}
+    for e in entries:
+        key = _canon(e['w'], e['h'])
+        if not (key[1] > 0 and math.isfinite(key[0])):
+            raise ValueError(f"sides must be positive, got {e['w']:g} x {e['h']:g}")
+        names = dims.setdefault(key, [])
+        for name in e.get('skus') or ([e['sku']] if 'sku' in e else [e['id']] if 'id' in e else []):
+            if name not in names:
+                names.append(name)
+    return list(dims), dims
+
+
+def load_index(path: str) -> Optional[Dict]:
+    """The JSON index of a table, or None when there is no usable table at path."""
+    try:
+        with open(index_path(path), 'r', encoding='utf8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get('version') != VERSION or index.get('solver') != CACHE_VERSION or not os.path.exists(path):
+        return None
+    return index
+
+
+def build_table(path: str, items: Iterable[Dict], shelves: Iterable[Dict]) -> Dict:
+    """Write the capacity table of catalog items (dicts with w, h and optional skus/sku) against
+    shelves (dicts with w, h and an optional id) to path, reusing every cell of an existing
+    table there whose item and shelf are still listed. Duplicate sizes share one row or column.
+    Returns {'items', 'shelves', 'solved', 'reused', 'seconds'}."""
+    np = _numpy()
+    t0 = time.perf_counter()
+    item_dims, item_names = _dims_list(items)
+    shelf_dims, shelf_names = _dims_list(shelves)
+    counts = np.zeros((len(item_dims), len(shelf_dims)), dtype=np.int32)
+    new_rows = np.ones(len(item_dims), dtype=bool)
+    new_cols = np.ones(len(shelf_dims), dtype=bool)
+    old = load_index(path)
+    if old is not None:
+        old_rows = {tuple(d): i for i, d in enumerate(old['items'])}
+        old_cols = {tuple(d): i for i, d in enumerate(old['shelves'])}
+        r_new = np.array([old_rows.get(d, -1) for d in item_dims], dtype=np.int64)
+        c_new = np.array([old_cols.get(d, -1) for d in shelf_dims], dtype=np.int64)
+        new_rows, new_cols = r_new < 0, c_new < 0
+        kept_r, kept_c = np.flatnonzero(~new_rows), np.flatnonzero(~new_cols)
+        if len(kept_r) and len(kept_c):
+            prev = np.load(path, mmap_mode='r')
+            counts[np.ix_(kept_r, kept_c)] = prev[np.ix_(r_new[kept_r], c_new[kept_c])]
+            del prev
+    # new rows against every shelf, then kept rows against the new shelves
+    fresh_r, fresh_c = np.flatnonzero(new_rows), np.flatnonzero(new_cols)
+    if len(fresh_r):
+        counts[fresh_r, :] = solve_counts([item_dims[i] for i in fresh_r], shelf_dims)
+    kept_r = np.flatnonzero(~new_rows)
+    if len(kept_r) and len(fresh_c):
+        counts[np.ix_(kept_r, fresh_c)] = solve_counts([item_dims[i] for i in kept_r], [shelf_dims[i] for i in fresh_c])
+    solved = len(fresh_r) * len(shelf_dims) + len(kept_r) * len(fresh_c)
+    # the matrix goes first and the index last: readers reload on a new index and check shapes
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, counts)
+    os.replace(tmp, path)
+    index = {'version': VERSION, 'solver': CACHE_VERSION, 'items': item_dims, 'shelves': shelf_dims,
+             'skus': {str(n): i for i, d in enumerate(item_dims) for n in item_names[d]},
+             'shelf_ids': {str(n): i for i, d in enumerate(shelf_dims) for n in shelf_names[d]}}
+    tmp = f'{index_path(path)}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf8') as f:
+        json.dump(index, f)
+    os.replace(tmp, index_path(path))
+    return {'items': len(item_dims), 'shelves': len(shelf_dims), 'solved': solved,
+            'reused': counts.size - solved, 'seconds': time.perf_counter() - t0}
+
+
+# --- lookups ---
+
+class CapacityTable:
+    """Read side of a capacity table. lookup() is two dict probes and one read from a memory
+    map of the matrix; the files are checked for a rebuild at most every REFRESH_INTERVAL."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._state = None
+        self._stamp = None
+        self._checked = 0.0
+        self._load()
+
+    def _load(self):
+        import mmap
+        import exporters
+        # the stamp is taken first, so an index replaced while loading is picked up next time
+        try:
+            stamp = os.stat(index_path(self.path)).st_mtime_ns
+        except OSError:
+            stamp = None
+        index = load_index(self.path)
+        if index is None:
+            raise ValueError(f'{self.path} is not a capacity table (build it with --build-capacity)')
+        with open(self.path, 'rb') as f:
+            header, offset = exporters.read_npy_dict(f)
+            shape = (len(index['items']), len(index['shelves']))
+            if header['descr'] != '<i4' or header['fortran_order'] or tuple(header['shape']) != shape:
+                raise ValueError(f'{self.path} does not match its index {index_path(self.path)}')
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if shape[0] * shape[1] else b''
+        rows = {tuple(d): i for i, d in enumerate(index['items'])}
+        cols = {tuple(d): i for i, d in enumerate(index['shelves'])}
+        self._state = (rows, cols, mm, offset, shape[1], index)
+        self._stamp = stamp
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked < REFRESH_INTERVAL:
+            return
+        with self._lock:
+            self._checked = now
+            try:
+                if os.stat(index_path(self.path)).st_mtime_ns != self._stamp:
+                    self._load()
+            except (OSError, ValueError):
+                pass  # mid-rebuild or removed: keep answering from the mapped table
+
+    def lookup(self, box_w: float, box_h: float, item_w: float, item_h: float) -> Optional[int]:
+        """Capacity of the box for the item in any orientation, or None if either is not in the table."""
+        self._refresh()
+        rows, cols, mm, offset, ncols, _ = self._state
+        r = rows.get(_canon(item_w, item_h))
+        c = cols.get(_canon(box_w, box_h))
+        if r is None or c is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return struct.unpack_from('<i', mm, offset + 4 * (r * ncols + c))[0]
+
+    def item(self, sku) -> Optional[Dims]:
+        """The (longer, shorter) sides of a catalog SKU, or None."""
+        index = self._state[5]
+        i = index['skus'].get(str(sku))
+        return None if i is None else tuple(index['items'][i])
+
+    def shelf(self, shelf_id) -> Optional[Dims]:
+        """The (longer, shorter) sides of a shelf id from the shelf list, or None."""
+        index = self._state[5]
+        i = index['shelf_ids'].get(str(shelf_id))
+        return None if i is None else tuple(index['shelves'][i])
+
+    def stats(self) -> Dict:
+        rows, cols = self._state[0], self._state[1]
+        lookups = self.hits + self.misses
+        return {'path': self.path, 'items': len(rows), 'shelves': len(cols), 'hits': self.hits,
+                'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,268 @@
+"""Item catalog ingestion shared by the CLI, the GUI and the web app.
+
+A catalog is a CSV file (header w,h[,d],count[,upright][,sku]), a JSON array of item objects
+or JSONL (one object per line), optionally compressed like the exports (.gz, .bz2, .xz, .zst).
+Rows are read one at a time (JSON arrays through JSONDecoder.raw_decode over a sliding
+buffer), so memory grows with the number of distinct item types and SKUs, not with rows.
+
+Rows whose sides are equal up to rotation are merged into one type with the summed count
+(unlimited if any row is); the type keeps the orientation of its first row and the SKU ids of
+every row in 'skus'. A 3D row (with d) merges with any rotation of its sides, or with turns
+about the vertical axis only when it is upright. Every row is validated; all problems are
+collected and raised together as one CatalogError once the file has been read.
+"""
+import csv
+import io
+import json
+import math
+from typing import Dict, IO, Iterator, List, Optional, Tuple, Union
+
+FORMATS = ('csv', 'json', 'jsonl')
+MAX_ERRORS = 100
+# distinct raw (w, h, count, d, upright) values remembered, so repeated rows skip parsing
+PARSED_CACHE = 1 << 16
+READ_CHUNK = 1 << 16
+TRUE = ('1', 'true', 'yes', 'y')
+
+
+class _Missing:
+    # the value the CSV reader gives fields past the end of a short row; None is JSON null
+    def __repr__(self):
+        return '<missing>'
+
+
+MISSING = _Missing()
+
+
+class CatalogError(ValueError):
+    """Invalid catalog rows. errors: up to MAX_ERRORS (where, message) pairs; invalid: how many
+    rows were rejected in total."""
+
+    def __init__(self, errors: List[Tuple[str, str]], invalid: int):
+        self.errors = errors
+        self.invalid = invalid
+        shown = '; '.join(f'{where}: {msg}' for where, msg in errors[:10])
+        more = f' (and {invalid - 10} more)' if invalid > 10 else ''
+        super().__init__(f'{invalid} invalid catalog row{"s" if invalid != 1 else ""}: {shown}{more}')
+
+
+def _side(rec: Dict, key: str) -> float:
+    v = rec.get(key)
+    if v is None or v == '':
+        raise ValueError(f'missing {key}')
+    try:
+        v = float(v)
+    except (TypeError, ValueError):
+        raise ValueError(f'{key} must be a number, got {v!r}')
+    if not (v > 0 and math.isfinite(v)):
+        raise ValueError(f'{key} must be positive, got {v:g}')
+    return v
+
+
+def _count(v) -> Optional[int]:
+    """None for unlimited (0 or JSON null); an absent or empty count means 1."""
+    if v is None:
+        return None
+    if v == '':
+        return 1
+    try:
+        f = float(v)
+    except (TypeError, ValueError):
+        raise ValueError(f'count must be a whole number, got {v!r}')
+    if f < 0 or f != int(f):
+        raise ValueError(f'count must be a whole number >= 0, got {v!r}')
+    return int(f) or None
+
+
+def parse_item(rec) -> Dict:
+    """One validated item dict {'w','h','count'} (+ 'd', 'upright', 'sku') from a catalog row.
+    Raises ValueError naming the first problem."""
+    if not isinstance(rec, dict):
+        raise ValueError(f'expected an object, got {type(rec).__name__}')
+    short = [k for k, v in rec.items() if v is MISSING]
+    if short:
+        raise ValueError(f"fewer fields than the header, missing {', '.join(short)}")
+    if None in rec:
+        raise ValueError('more fields than the header')
+    item = {'w': _side(rec, 'w'), 'h': _side(rec, 'h'), 'count': _count(rec.get('count', 1))}
+    if rec.get('d') not in (None, ''):
+        item['d'] = _side(rec, 'd')
+    upright = rec.get('upright')
+    if upright not in (None, ''):
+        item['upright'] = upright if isinstance(upright, bool) else str(upright).strip().lower() in TRUE
+    sku = rec.get('sku', rec.get('id'))
+    if sku not in (None, ''):
+        item['sku'] = sku
+    return item
+
+
+def _key(item: Dict) -> tuple:
+    w, h = item['w'], item['h']
+    if 'd' not in item:
+        return (min(w, h), max(w, h))
+    d = item['d']
+    if item.get('upright'):
+        return (True, h, min(w, d), max(w, d))
+    return (False,) + tuple(sorted((w, h, d)))
+
+
+class Catalog:
+    """Item types aggregated from catalog rows; add() rows one at a time, then check()."""
+
+    def __init__(self, max_errors: int = MAX_ERRORS):
+        self.items: List[Dict] = []
+        self.rows = 0
+        self.errors: List[Tuple[str, str]] = []
+        self.invalid = 0
+        self.max_errors = max_errors
+        self._index: Dict[tuple, Dict] = {}
+        self._parsed: Dict[tuple, tuple] = {}
+
+    def add(self, rec, where: str):
+        self.rows += 1
+        # short or long CSV rows are never looked up, so parse_item always reports them
+        raw = (rec.get('w'), rec.get('h'), rec.get('count', 1), rec.get('d'), rec.get('upright')) \
+            if isinstance(rec, dict) and None not in rec and MISSING not in rec.values() else None
+        try:
+            hit = self._parsed.get(raw)
+        except TypeError:  # lists or objects where numbers belong; parse_item reports them
+            hit = raw = None
+        if hit is None:
+            try:
+                item = parse_item(rec)
+            except ValueError as e:
+                self.invalid += 1
+                if len(self.errors) < self.max_errors:
+                    self.errors.append((where, str(e)))
+                return
+            item.pop('sku', None)
+            hit = (_key(item), item)
+            if raw is not None and len(self._parsed) < PARSED_CACHE:
+                self._parsed[raw] = hit
+        key, item = hit
+        t = self._index.get(key)
+        if t is None:
+            t = self._index[key] = dict(item)
+            self.items.append(t)
+        elif t['count'] is not None:
+            t['count'] = None if item['count'] is None else t['count'] + item['count']
+        sku = rec.get('sku', rec.get('id'))
+        if sku not in (None, ''):
+            # an ordered set: repeated rows of one SKU keep a single id
+            t.setdefault('skus', {})[sku] = None
+
+    def check(self) -> List[Dict]:
+        """The item types, or CatalogError listing every invalid row seen."""
+        if self.invalid:
+            raise CatalogError(self.errors, self.invalid)
+        for t in self.items:
+            if 'skus' in t and isinstance(t['skus'], dict):
+                t['skus'] = list(t['skus'])
+        return self.items
+
+
+def catalog_format(path: str) -> str:
+    """csv, json or jsonl from a file name such as items.jsonl.gz; anything else reads as CSV."""
+    import exporters
+    root = path.lower()
+    if exporters.split_path(root)[1]:
+        root = root.rsplit('.', 1)[0]
+    if root.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'json' if root.endswith('.json') else 'csv'
+
+
+def _text(f) -> IO[str]:
+    return f if isinstance(f, io.TextIOBase) else io.TextIOWrapper(f, encoding='utf-8-sig', newline='')
+
+
+def iter_rows(f: IO, fmt: str) -> Iterator[Tuple[str, object]]:
+    """(where, record) for each row of an open catalog; a syntax error ends the file with ValueError."""
+    f = _text(f)
+    if fmt == 'csv':
+        reader = csv.DictReader(f, restval=MISSING)
+        for rec in reader:
+            yield f'line {reader.line_num}', rec
+    elif fmt == 'jsonl':
+        for n, line in enumerate(f, 1):
+            if line.strip():
+                try:
+                    yield f'line {n}', json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f'line {n}: {e.msg}')
+    elif fmt == 'json':
+        for n, rec in enumerate(_json_array(f), 1):
+            yield f'item {n}', rec
+    else:
+        raise ValueError(f"unknown catalog format {fmt!r}; choose from {', '.join(FORMATS)}")
+
+
+def _json_array(f: IO[str]) -> Iterator[object]:
+    """The elements of a top-level JSON array, decoded one by one from READ_CHUNK reads."""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = '', 0, False
+
+    def more():
+        nonlocal buf, pos, eof
+        # grow geometrically, so a record split over many reads is not copied over and over
+        data = f.read(max(READ_CHUNK, len(buf) - pos))
+        eof = not data
+        buf, pos = buf[pos:] + data, 0
+        return not eof
+
+    def skip():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos < len(buf) or not more():
+                return
+
+    skip()
+    if buf[pos:pos + 1] != '[':
+        raise ValueError('a JSON catalog must be an array of items')
+    pos += 1
+    n = 0
+    while True:
+        skip()
+        if buf[pos:pos + 1] == ']':
+            return
+        if n:
+            if buf[pos:pos + 1] != ',':
+                raise ValueError(f'expected , or ] after item {n}')
+            pos += 1
+            skip()
+        while True:
+            try:
+                rec, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                if not more():
+                    raise ValueError(f'item {n + 1}: {e.msg}')
+                continue
+            # a bare number may go on past the buffer; read more before trusting it
+            if end < len(buf) or isinstance(rec, (dict, list)) or eof:
+                break
+            more()
+        n += 1
+        pos = end
+        yield rec
+
+
+def read_catalog(source: Union[str, IO], fmt: Optional[str] = None, max_errors: int = MAX_ERRORS) -> Catalog:
+    """Read and aggregate a catalog from a path or an open (binary or text) file. The format
+    follows the file name unless fmt is given (required for file objects). Raises
+    CatalogError for invalid rows and ValueError for a file that cannot be parsed."""
+    cat = Catalog(max_errors)
+    if isinstance(source, str):
+        import exporters
+        fmt = fmt or catalog_format(source)
+        with exporters.open_input(source) as f:
+            for where, rec in iter_rows(f, fmt):
+                cat.add(rec, where)
+    else:
+        if fmt is None:
+            raise ValueError('fmt is needed to read a catalog from a file object')
+        for where, rec in iter_rows(source, fmt):
+            cat.add(rec, where)
+    cat.check()
+    return cat
@@ -0,0 +1,434 @@
+"""Streaming layout exporters shared by the CLI, the GUI and the web app.
+
+Every format is produced as a stream of chunks straight from the placements, so no
+intermediate document is built however many items a layout holds:
+
+- ``.json``  : {"box": ..., "placements": [...], "count": n}, one placement per line
+- ``.jsonl`` / ``.ndjson`` : one placement object per line
+- ``.csv``   : header row plus one row per placement
+- ``.npy``   : NumPy structured array (format 1.0), little-endian records with
+  x, y, w, h as float64 and type (and box) as int32, 36 (40) bytes each
+
+The web API also streams three response encodings of the same rows: columnar JSON (one
+array per field), raw little-endian Float32 columns, and NDJSON with one columnar chunk per
+line so a client can draw a layout while it downloads.
+
+A trailing ``.gz``, ``.bz2``, ``.xz`` or ``.zst`` compresses the output (``.zst`` needs the
+zstandard package, or Python 3.14+). Uncompressed ``.npy`` files can be memory-mapped back
+with load_npy (NumPy) or iter_npy / load_layout (no NumPy needed); read_layout reads
+any of the formats back into a Layout. Compression modules are
+imported only for the files that use them.
+"""
+import csv
+import io
+import itertools
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from packer import BlockLayout, Layout, json_default, placement_rows
+
+FORMATS = ('json', 'jsonl', 'csv', 'npy')
+COMPRESSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz', '.zst': 'zstd'}
+FIELD_ORDER = ('box', 'x', 'y', 'w', 'h', 'type')
+NPY_DTYPES = {'x': '<f8', 'y': '<f8', 'w': '<f8', 'h': '<f8', 'type': '<i4', 'box': '<i4'}
+_STRUCT_CODES = {'<f8': 'd', '<f4': 'f', '<i4': 'i', '<i8': 'q', '<u4': 'I'}
+NPY_MAGIC = b'\x93NUMPY'
+CHUNK_ROWS = 4096
+
+
+def split_path(path: str) -> Tuple[str, Optional[str]]:
+    """(format, compression) from a file name such as layout.csv.gz."""
+    root, ext = os.path.splitext(path.lower())
+    compression = COMPRESSIONS.get(ext)
+    if compression:
+        root, ext = os.path.splitext(root)
+    fmt = {'.ndjson': 'jsonl'}.get(ext, ext.lstrip('.'))
+    return (fmt if fmt in FORMATS else 'json'), compression
+
+
+def _zstd_open(path: str, mode: str, **kwargs):
+    try:
+        from compression import zstd  # Python 3.14+
+        return zstd.open(path, mode, **kwargs)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError('zstd compression needs the zstandard package; use .gz, .bz2 or .xz instead')
+    return zstandard.open(path, mode, **kwargs)
+
+
+def open_output(path: str, binary: bool = False, compression: Optional[str] = None):
+    """Open path for writing, compressed according to its extension unless given explicitly."""
+    if compression is None:
+        compression = split_path(path)[1]
+    mode = 'wb' if binary else 'wt'
+    kwargs = {} if binary else {'encoding': 'utf8', 'newline': ''}
+    if compression is None:
+        return open(path, mode, **kwargs)
+    if compression == 'zstd':
+        return _zstd_open(path, mode, **kwargs)
+    return _opener(compression)(path, mode, **kwargs)
+
+
+def _opener(compression: str):
+    if compression == 'gzip':
+        import gzip
+        return gzip.open
+    if compression == 'bz2':
+        import bz2
+        return bz2.open
+    if compression == 'xz':
+        import lzma
+        return lzma.open
+    raise ValueError(f'unknown compression {compression!r}')
+
+
+def open_input(path: str):
+    compression = split_path(path)[1]
+    if compression is None:
+        return open(path, 'rb')
+    if compression == 'zstd':
+        return _zstd_open(path, 'rb')
+    return _opener(compression)(path, 'rb')
+
+
+def default_fields(placements) -> Tuple[str, ...]:
+    if isinstance(placements, Layout):
+        return placements.fields
+    if isinstance(placements, BlockLayout) or not placements:
+        return FIELD_ORDER[1:]
+    first = placements[0]
+    if isinstance(first, dict):
+        return tuple(f for f in FIELD_ORDER if f in first) + tuple(f for f in first if f not in FIELD_ORDER)
+    return FIELD_ORDER[1:]
+
+
+def _batches(rows: Iterable, size: int = CHUNK_ROWS) -> Iterator[list]:
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+# --- chunk generators ---
+
+def json_chunks(placements, fields: Optional[Tuple[str, ...]] = None, head: Optional[Dict] = None,
+                tail: Optional[Dict] = None) -> Iterator[str]:
+    """JSON document text: head keys, "placements" (one object per line), tail keys, "count"."""
+    fields = tuple(fields or default_fields(placements))
+    yield '{\n'
+    for key, value in (head or {}).items():
+        yield f'  {json.dumps(key)}: {json.dumps(value, default=json_default)},\n'
+    yield '  "placements": ['
+    keys = [json.dumps(f) + ': ' for f in fields]
+    n = 0
+    for batch in _batches(placement_rows(placements, fields)):
+        parts = []
+        for row in batch:
+            parts.append(('\n    {' if n == 0 else ',\n    {') + ', '.join(k + json.dumps(v) for k, v in zip(keys, row)) + '}')
+            n += 1
+        yield ''.join(parts)
+    yield '\n  ],\n' if n else '],\n'
+    for key, value in (tail or {}).items():
+        yield f'  {json.dumps(key)}: {json.dumps(value, default=json_default)},\n'
+    yield f'  "count": {n}\n}}\n'
+
+
+def jsonl_chunks(placements, fields: Optional[Tuple[str, ...]] = None) -> Iterator[str]:
+    fields = tuple(fields or default_fields(placements))
+    for batch in _batches(placement_rows(placements, fields)):
+        yield ''.join(json.dumps(dict(zip(fields, row))) + '\n' for row in batch)
+
+
+def csv_chunks(placements, fields: Optional[Tuple[str, ...]] = None) -> Iterator[str]:
+    fields = tuple(fields or default_fields(placements))
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(fields)
+    for batch in _batches(placement_rows(placements, fields)):
+        writer.writerows(batch)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def columns(placements, fields: Optional[Tuple[str, ...]] = None, start: int = 0,
+            stop: Optional[int] = None) -> Dict[str, list]:
+    """Placements [start:stop] as one list per field. A Layout hands over its arrays directly."""
+    fields = tuple(fields or default_fields(placements))
+    if isinstance(placements, Layout) and all(f in placements.fields for f in fields):
+        return {f: getattr(placements, f)[start:stop].tolist() for f in fields}
+    rows = list(itertools.islice(placement_rows(placements, fields, missing=0), start, stop))
+    cols = list(zip(*rows)) if rows else [()] * len(fields)
+    return {f: list(c) for f, c in zip(fields, cols)}
+
+
+def columns_chunks(placements, fields: Optional[Tuple[str, ...]] = None, tail: Optional[Dict] = None) -> Iterator[str]:
+    """Columnar JSON: {"fields": [...], "placements": {"x": [...], ...}, tail keys, "count": n}."""
+    fields = tuple(fields or default_fields(placements))
+    yield '{"fields": ' + json.dumps(fields) + ', "placements": {'
+    for i, (f, col) in enumerate(columns(placements, fields).items()):
+        yield (', ' if i else '') + json.dumps(f) + ': ' + json.dumps(col)
+    yield '}'
+    for key, value in (tail or {}).items():
+        if key != 'count':
+            yield f', {json.dumps(key)}: {json.dumps(value, default=json_default)}'
+    yield f', "count": {len(placements)}}}\n'
+
+
+def f32_chunks(placements, fields: Optional[Tuple[str, ...]] = None, tail: Optional[Dict] = None) -> Iterator[bytes]:
+    """Little-endian float32 columns, one after the other (all x, then all y, ...), ready to
+    be viewed as Float32Arrays. Coordinates lose precision beyond 2**24. With a tail, the
+    columns are followed by its JSON, prefixed with its byte length as a little-endian uint32."""
+    fields = tuple(fields or default_fields(placements))
+    for col in columns(placements, fields).values():
+        data = array('f', col)
+        if sys.byteorder == 'big':
+            data.byteswap()
+        yield data.tobytes()
+    if tail is not None:
+        text = json.dumps(tail, default=json_default).encode('utf8')
+        yield struct.pack('<I', len(text)) + text
+
+
+def ndjson_chunks(placements, fields: Optional[Tuple[str, ...]] = None, tail: Optional[Dict] = None,
+                  size: int = CHUNK_ROWS) -> Iterator[str]:
+    """NDJSON: a {"fields": [...]} line, one {"columns": {...}} line per `size` placements,
+    and a last line with the tail keys and "count"."""
+    fields = tuple(fields or default_fields(placements))
+    yield json.dumps({'fields': fields}) + '\n'
+    n = len(placements)
+    for start in range(0, n, size):
+        yield json.dumps({'columns': columns(placements, fields, start, start + size)}) + '\n'
+    rest = {k: v for k, v in (tail or {}).items() if k != 'count'}
+    yield json.dumps({**rest, 'count': n}, default=json_default) + '\n'
+
+
+def npy_header(fields: Tuple[str, ...], count: int) -> bytes:
+    """A .npy format 1.0 header for `count` packed little-endian records of `fields`."""
+    descr = '[' + ', '.join(f"('{f}', '{NPY_DTYPES.get(f, '<f8')}')" for f in fields) + ']'
+    text = "{'descr': %s, 'fortran_order': False, 'shape': (%d,), }" % (descr, count)
+    # magic, version and length take 10 bytes; the header ends in a newline and the data
+    # starts on a 64-byte boundary
+    text += ' ' * (-(10 + len(text) + 1) % 64) + '\n'
+    return NPY_MAGIC + b'\x01\x00' + struct.pack('<H', len(text)) + text.encode('latin1')
+
+
+def npy_chunks(placements, fields: Optional[Tuple[str, ...]] = None) -> Iterator[bytes]:
+    fields = tuple(fields or default_fields(placements))
+    yield npy_header(fields, len(placements))
+    np = _numpy()
+    if np is not None and isinstance(placements, Layout) and all(f in placements.fields for f in fields):
+        dtype = np.dtype([(f, NPY_DTYPES.get(f, '<f8')) for f in fields])
+        cols = {f: np.frombuffer(getattr(placements, f), dtype=np.float64 if getattr(placements, f).typecode == 'd' else np.int32)
+                for f in fields}
+        step = CHUNK_ROWS * 16
+        for start in range(0, len(placements), step):
+            block = np.empty(min(step, len(placements) - start), dtype=dtype)
+            for f in fields:
+                block[f] = cols[f][start:start + len(block)]
+            yield block.tobytes()
+        return
+    record = struct.Struct('<' + ''.join(_STRUCT_CODES[NPY_DTYPES.get(f, '<f8')] for f in fields))
+    for batch in _batches(placement_rows(placements, fields, missing=0)):
+        yield b''.join(record.pack(*row) for row in batch)
+
+
+def _numpy():
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+def chunks(placements, fmt: str, fields: Optional[Tuple[str, ...]] = None, box=None) -> Iterator:
+    """Chunks of one export format: str for the text formats, bytes for npy. The JSON
+    document records `box`, given as (w, h) or {'w', 'h'}, when it is set."""
+    if fmt == 'json':
+        if isinstance(box, dict):
+            box = (box.get('w'), box.get('h'))
+        return json_chunks(placements, fields, head={'box': {'w': box[0], 'h': box[1]}} if box else None)
+    if fmt == 'jsonl':
+        return jsonl_chunks(placements, fields)
+    if fmt == 'csv':
+        return csv_chunks(placements, fields)
+    if fmt == 'npy':
+        return npy_chunks(placements, fields)
+    raise ValueError(f"unknown export format {fmt!r}; choose from {', '.join(FORMATS)}")
+
+
+def result_chunks(result: Dict, fmt: str, box=None) -> Iterator:
+    """Chunks for a packer.solve_job result: a single box, or a fleet ('boxes' and 'unplaced')."""
+    if 'placements' not in result:
+        raise ValueError('result has no placements to export')
+    if 'boxes' not in result:
+        return chunks(result['placements'], fmt, box=box)
+    fields = ('box', 'x', 'y', 'w', 'h', 'type')
+    if fmt == 'json':
+        return json_chunks(result['placements'], fields, head={'boxes': result['boxes']}, tail={'unplaced': result['unplaced']})
+    return chunks(result['placements'], fmt, fields)
+
+
+def compress_chunks(stream: Iterable, method: Optional[str], flush: bool = False) -> Iterator[bytes]:
+    """Encode (str to UTF-8) and optionally gzip or deflate a chunk stream, e.g. for HTTP.
+    With flush every chunk is sync-flushed, so the receiver can decode it on arrival."""
+    if method not in (None, 'gzip', 'deflate'):
+        raise ValueError(f'unknown content encoding {method!r}')
+    comp = zlib.compressobj(6, zlib.DEFLATED, 31 if method == 'gzip' else 15) if method else None
+    for chunk in stream:
+        data = chunk.encode('utf8') if isinstance(chunk, str) else chunk
+        if comp is not None:
+            data = comp.compress(data)
+            if flush:
+                data += comp.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    if comp is not None:
+        yield comp.flush()
+
+
+# --- files ---
+
+def _write(path: str, fmt: str, stream: Iterable):
+    with open_output(path, binary=(fmt == 'npy')) as f:
+        for chunk in stream:
+            f.write(chunk)
+
+
+def export(path: str, placements, box: Optional[Tuple[float, float]] = None, fields: Optional[Tuple[str, ...]] = None,
+           fmt: Optional[str] = None):
+    """Write placements to path in the format (and compression) named by its extension,
+    or in `fmt` when given. The JSON document also records the box when given."""
+    fmt = fmt or split_path(path)[0]
+    _write(path, fmt, chunks(placements, fmt, fields, box))
+
+
+def export_bins(path: str, result: Dict, fmt: Optional[str] = None):
+    """Write a pack_bins result: JSON keeps the per-box summary and unplaced items, the
+    record formats hold the placements with their box index."""
+    fmt = fmt or split_path(path)[0]
+    fields = ('box', 'x', 'y', 'w', 'h', 'type')
+    if fmt == 'json':
+        boxes = [{'box': b['box'], 'id': b['id'], 'w': b['w'], 'h': b['h'], 'count': b['count']} for b in result['bins']]
+        stream = json_chunks(result['placements'], fields, head={'boxes': boxes}, tail={'unplaced': result['unplaced']})
+    else:
+        stream = chunks(result['placements'], fmt, fields)
+    _write(path, fmt, stream)
+
+
+# --- reading .npy back ---
+
+def read_npy_dict(f) -> Tuple[Dict, int]:
+    """(header dict with descr, fortran_order and shape, data offset) of any .npy stream."""
+    import ast
+    magic = f.read(8)
+    if magic[:6] != NPY_MAGIC:
+        raise ValueError('not a .npy file')
+    major = magic[6]
+    size_fmt = '<H' if major == 1 else '<I'
+    (hlen,) = struct.unpack(size_fmt, f.read(struct.calcsize(size_fmt)))
+    header = ast.literal_eval(f.read(hlen).decode('latin1'))
+    return header, 8 + struct.calcsize(size_fmt) + hlen
+
+
+def read_npy_header(f) -> Tuple[Tuple[Tuple[str, str], ...], int, int]:
+    """((field, dtype) pairs, record count, data offset) of a 1-D structured .npy stream."""
+    header, offset = read_npy_dict(f)
+    descr = header['descr']
+    if not isinstance(descr, list) or header['fortran_order'] or len(header['shape']) != 1:
+        raise ValueError('expected a 1-D structured array of placements')
+    return tuple((name, dt) for name, dt in descr), header['shape'][0], offset
+
+
+def iter_npy(path: str) -> Iterator[Dict]:
+    """Placement dicts from a .npy export without NumPy; plain files are memory-mapped."""
+    with open_input(path) as f:
+        descr, count, offset = read_npy_header(f)
+        names = [name for name, _ in descr]
+        record = struct.Struct('<' + ''.join(_STRUCT_CODES[dt] for _, dt in descr))
+        if split_path(path)[1] is None and count:
+            import mmap
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)[offset:offset + count * record.size]
+                try:
+                    for row in record.iter_unpack(view):
+                        yield dict(zip(names, row))
+                finally:
+                    view.release()
+            return
+        while True:
+            data = f.read(record.size * CHUNK_ROWS)
+            if not data:
+                return
+            for row in record.iter_unpack(data):
+                yield dict(zip(names, row))
+
+
+def load_npy(path: str, mmap_mode: Optional[str] = 'r'):
+    """The export as a NumPy structured array, memory-mapped unless the file is compressed."""
+    np = _numpy()
+    if np is None:
+        raise ImportError('numpy is required for load_npy; use iter_npy instead')
+    if split_path(path)[1] is None:
+        return np.load(path, mmap_mode=mmap_mode)
+    with open_input(path) as f:
+        return np.load(io.BytesIO(f.read()))
+
+
+def iter_records(path: str) -> Iterator[Dict]:
+    """Placement dicts from a .jsonl, .csv or .npy export, read one at a time."""
+    fmt = split_path(path)[0]
+    if fmt == 'npy':
+        yield from iter_npy(path)
+        return
+    with io.TextIOWrapper(open_input(path), encoding='utf-8-sig', newline='') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def read_layout(path: str) -> Tuple[Layout, Optional[Union[Tuple[float, float], List[Tuple[float, float]]]]]:
+    """A Layout from any export format, and the box when the file records one (JSON only):
+    (w, h), or for a fleet export (see export_bins) a list of (w, h) by box index.
+    A JSON file may also hold a bare list of placements."""
+    box = None
+    if split_path(path)[0] == 'json':
+        with io.TextIOWrapper(open_input(path), encoding='utf-8-sig') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            if data.get('box'):
+                box = (float(data['box']['w']), float(data['box']['h']))
+            elif data.get('boxes'):
+                sizes = {int(b['box']): (float(b['w']), float(b['h'])) for b in data['boxes']}
+                box = [sizes[i] for i in range(len(sizes))]
+            data = data.get('placements', [])
+        records = data
+    else:
+        records = iter_records(path)
+    layout = None
+    for p in records:
+        if layout is None:
+            layout = Layout(with_box='box' in p)
+        layout.append(float(p['x']), float(p['y']), float(p['w']), float(p['h']), int(float(p.get('type') or 0)),
+                      int(float(p['box'])) if layout.box is not None else None)
+    return (layout if layout is not None else Layout()), box
+
+
+def load_layout(path: str) -> Layout:
+    """A Layout from an export file (see read_layout)."""
+    return read_layout(path)[0]
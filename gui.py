@@ -1,16 +1,23 @@
 #!/usr/bin/env python3
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import json, csv, os
-from packer import pack_multiple_items, best_layout
+import threading
+from packer import best_layout, ALGORITHMS, default_cache, Layout, LayoutSession
+import render
 from typing import List, Dict
 
-try:
-    from PIL import Image
-    from PIL import Image as PilImage
-    from PIL import ImageOps
-except Exception:
-    PilImage = None
+# PIL.ImageTk, imported with the first drawing (False: not tried yet, None: not installed)
+ImageTk = False
+
+
+def _image_tk():
+    global ImageTk
+    if ImageTk is False:
+        try:
+            from PIL import ImageTk
+        except Exception:
+            ImageTk = None
+    return ImageTk
 
 class PackerGUI(tk.Tk):
     def __init__(self):
@@ -49,29 +56,66 @@ class PackerGUI(tk.Tk):
         self.item_count = tk.IntVar(value=10)
         ttk.Entry(ctrl, textvariable=self.item_count).grid(row=5, column=1)
 
-        ttk.Button(ctrl, text='Add Item', command=self.add_item).grid(row=6, column=0, columnspan=2, pady=6, sticky='ew')
-        ttk.Button(ctrl, text='Pack', command=self.pack_items).grid(row=7, column=0, columnspan=2, pady=6, sticky='ew')
+        ttk.Label(ctrl, text='Algorithm').grid(row=6, column=0, sticky='w')
+        self.algorithm = tk.StringVar(value='greedy')
+        ttk.Combobox(ctrl, textvariable=self.algorithm, values=list(ALGORITHMS), state='readonly').grid(row=6, column=1)
 
-        ttk.Button(ctrl, text='Load items', command=self.load_items).grid(row=8, column=0, columnspan=2, pady=6, sticky='ew')
-        ttk.Button(ctrl, text='Save items', command=self.save_items).grid(row=9, column=0, columnspan=2, pady=6, sticky='ew')
+        add_btn = ttk.Button(ctrl, text='Add Item', command=self.add_item)
+        add_btn.grid(row=7, column=0, columnspan=2, pady=6, sticky='ew')
+        pack_btn = ttk.Button(ctrl, text='Pack', command=self.pack_items)
+        pack_btn.grid(row=8, column=0, columnspan=2, pady=6, sticky='ew')
 
-        ttk.Button(ctrl, text='Export JSON', command=self.export_json).grid(row=10, column=0, columnspan=2, pady=6, sticky='ew')
-        ttk.Button(ctrl, text='Export CSV', command=self.export_csv).grid(row=11, column=0, columnspan=2, pady=6, sticky='ew')
-        ttk.Button(ctrl, text='Save Image', command=self.save_image).grid(row=12, column=0, columnspan=2, pady=6, sticky='ew')
+        file_btns = []
+        for row, (text, command) in enumerate((('Load items', self.load_items), ('Save items', self.save_items),
+                                               ('Export JSON', self.export_json), ('Export CSV / NPY', self.export_csv),
+                                               ('Save Image', self.save_image)), 9):
+            btn = ttk.Button(ctrl, text=text, command=command)
+            btn.grid(row=row, column=0, columnspan=2, pady=6, sticky='ew')
+            file_btns.append(btn)
 
-        ttk.Separator(ctrl, orient='horizontal').grid(row=13, column=0, columnspan=2, pady=8, sticky='ew')
-        ttk.Label(ctrl, text='Items list').grid(row=14, column=0, columnspan=2)
+        ttk.Separator(ctrl, orient='horizontal').grid(row=14, column=0, columnspan=2, pady=8, sticky='ew')
+        ttk.Label(ctrl, text='Items list').grid(row=15, column=0, columnspan=2)
         self.items_listbox = tk.Listbox(ctrl, height=10)
-        self.items_listbox.grid(row=15, column=0, columnspan=2, sticky='ew')
-        ttk.Button(ctrl, text='Remove selected', command=self.remove_selected).grid(row=16, column=0, columnspan=2, pady=6, sticky='ew')
+        self.items_listbox.grid(row=16, column=0, columnspan=2, sticky='ew')
+        remove_btn = ttk.Button(ctrl, text='Remove selected', command=self.remove_selected)
+        remove_btn.grid(row=17, column=0, columnspan=2, pady=6, sticky='ew')
+        # disabled while a solve runs in the background: they change or read the items and layout
+        self.action_buttons = [add_btn, pack_btn, remove_btn] + file_btns
+
+        ttk.Separator(ctrl, orient='horizontal').grid(row=18, column=0, columnspan=2, pady=8, sticky='ew')
+        self.progress_bar = ttk.Progressbar(ctrl, mode='determinate', maximum=100)
+        self.progress_bar.grid(row=19, column=0, columnspan=2, sticky='ew')
+        self.status = tk.StringVar(value='Wheel to zoom, drag to pan, double-click to fit')
+        ttk.Label(ctrl, textvariable=self.status, wraplength=220).grid(row=20, column=0, columnspan=2, sticky='w')
+        self.cancel_btn = ttk.Button(ctrl, text='Cancel', command=self.cancel, state='disabled')
+        self.cancel_btn.grid(row=21, column=0, columnspan=2, pady=6, sticky='ew')
 
         # canvas area
         canvas_frame = ttk.Frame(frm)
         canvas_frame.pack(side='left', fill='both', expand=True)
         self.canvas = tk.Canvas(canvas_frame, bg='white')
         self.canvas.pack(fill='both', expand=True, padx=10, pady=10)
+        self.canvas.bind('<MouseWheel>', lambda e: self.zoom(e, 1.25 if e.delta > 0 else 0.8))
+        self.canvas.bind('<Button-4>', lambda e: self.zoom(e, 1.25))
+        self.canvas.bind('<Button-5>', lambda e: self.zoom(e, 0.8))
+        self.canvas.bind('<ButtonPress-1>', self.pan_start)
+        self.canvas.bind('<B1-Motion>', self.pan)
+        self.canvas.bind('<Double-Button-1>', lambda e: self.set_view(None))
+        self.canvas.bind('<Configure>', lambda e: self.schedule_redraw())
 
-        self.placements = []
+        self.placements = Layout()
+        # the packed multi-item layout; Add/Remove edit it in place instead of re-packing
+        self.session = None
+        # shown part of the box as (x0, y0, x1, y1) in box units, None for all of it
+        self.box = None
+        self.view = None
+        self.scale = 1.0
+        self.redraw_pending = None
+        self.drag = (0, 0)
+        # background solve: worker thread, cancel flag and the latest (placed, passes)
+        self.worker = None
+        self.cancel_event = threading.Event()
+        self.job_progress = (0, 0)
 
     def add_item(self):
         w = float(self.item_w.get())
@@ -79,6 +123,9 @@ class PackerGUI(tk.Tk):
         cnt = self.item_count.get()
         self.items.append({'w': w, 'h': h, 'count': cnt})
         self.items_listbox.insert('end', f"{w}x{h} (x{cnt})")
+        if self.session is not None:
+            item = self.items[-1]
+            self.run_job('Adding', lambda: self.session.add_items([item]), self.show_session)
 
     def remove_selected(self):
         sel = self.items_listbox.curselection()
@@ -87,59 +134,211 @@ class PackerGUI(tk.Tk):
         idx = sel[0]
         self.items_listbox.delete(idx)
         del self.items[idx]
+        if self.session is not None:
+            self.run_job('Removing', lambda: self.session.remove_items(idx), self.show_session)
 
     def pack_items(self):
         box_w = float(self.box_w.get())
         box_h = float(self.box_h.get())
         if self.items:
-            placements = pack_multiple_items(box_w, box_h, self.items)
-            self.placements = placements
-            self.draw_placements(box_w, box_h, placements)
-            messagebox.showinfo('Packed', f'Placed {len(placements)} items')
+            session = self.session
+            if session is not None and session.algorithm == self.algorithm.get() and (session.box_w, session.box_h) != (box_w, box_h):
+                # same items, new box: keep what still fits
+                self.view = None
+                self.run_job('Resizing', lambda: session.resize_box(box_w, box_h), self.show_session)
+                return
+            items, algorithm = list(self.items), self.algorithm.get()
+
+            def solve():
+                return LayoutSession(box_w, box_h, items, algorithm, cache=default_cache(), progress=self.report)
+
+            def done(session):
+                if self.items != items:
+                    # the item list changed while solving; its indices no longer match the session
+                    return
+                self.session = session
+                self.view = None
+                self.show_session()
+                if self.cancel_event.is_set():
+                    messagebox.showinfo('Cancelled', f'Kept the {len(self.session.layout)} items placed so far')
+                else:
+                    messagebox.showinfo('Packed', f'Placed {len(self.session.layout)} items')
+
+            self.run_job('Packing', solve, done, total=self.expected_units())
         else:
+            self.session = None
+            self.view = None
             # single-item mode from inputs
             w = float(self.item_w.get())
             h = float(self.item_h.get())
             cnt = self.item_count.get()
             if cnt == 0:
                 cnt = None
-            best = best_layout(box_w, box_h, w, h, cnt)
-            placements = [{'x': x, 'y': y, 'w': w, 'h': h, 'type': 0} for (x, y, w, h) in best]
+            best = best_layout(box_w, box_h, w, h, cnt, cache=default_cache())
+            placements = best.to_layout()
             self.placements = placements
             self.draw_placements(box_w, box_h, placements)
             messagebox.showinfo('Packed', f'Placed {len(placements)} items')
 
+    def expected_units(self):
+        # total units for the progress bar, None (indeterminate) when a type is unlimited
+        total = 0
+        for it in self.items:
+            if not it.get('count'):
+                return None
+            total += int(it['count'])
+        return total
+
+    def report(self, placed, passes):
+        # progress callback, called on the worker thread; False stops the solve
+        self.job_progress = (placed, passes)
+        return not self.cancel_event.is_set()
+
+    def run_job(self, label, fn, done, total=None):
+        """Run fn() on a worker thread and done(result) back on the Tk thread; the Cancel
+        button stops solves that report progress, keeping what was placed so far."""
+        if self.worker is not None and self.worker.is_alive():
+            return
+        self.cancel_event.clear()
+        self.job_progress = (0, 0)
+        result = {}
+
+        def work():
+            try:
+                result['value'] = fn()
+            except Exception as e:
+                result['error'] = e
+
+        for b in self.action_buttons:
+            b['state'] = 'disabled'
+        self.cancel_btn['state'] = 'normal'
+        self.progress_bar.configure(mode='determinate' if total else 'indeterminate', value=0)
+        if not total:
+            self.progress_bar.start(50)
+        self.status.set(f'{label}...')
+        self.worker = threading.Thread(target=work, name='packer-gui', daemon=True)
+        self.worker.start()
+
+        def poll():
+            placed, passes = self.job_progress
+            if self.worker.is_alive():
+                if total:
+                    self.progress_bar['value'] = min(100, placed * 100 / total)
+                self.status.set(f'{label}: {placed} placed, pass {passes}' if passes > 1 else f'{label}: {placed} placed')
+                self.after(100, poll)
+                return
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode='determinate', value=100 if total else 0)
+            self.cancel_btn['state'] = 'disabled'
+            for b in self.action_buttons:
+                b['state'] = 'normal'
+            self.status.set('Cancelled' if self.cancel_event.is_set() else 'Done')
+            if 'error' in result:
+                messagebox.showerror('Error', str(result['error']))
+            else:
+                done(result.get('value'))
+
+        self.after(100, poll)
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.status.set('Cancelling...')
+
+    def show_session(self, change=None):
+        session = self.session
+        self.placements = session.layout
+        self.draw_placements(session.box_w, session.box_h, session.layout)
+        if change is not None and change['pending']:
+            messagebox.showwarning('Packed', f"Placed {change['count']} items; {change['pending']} did not fit")
+
     def draw_placements(self, box_w, box_h, placements):
+        self.box = (box_w, box_h)
+        self.placements = placements
+        self.redraw()
+
+    def schedule_redraw(self):
+        # coalesce bursts of resize and wheel events into one render
+        if self.redraw_pending is None and self.box is not None:
+            self.redraw_pending = self.after(30, self.redraw)
+
+    def redraw(self):
+        self.redraw_pending = None
+        if self.box is None:
+            return
+        box_w, box_h = self.box
+        x0, y0, x1, y1 = self.view or (0, 0, box_w, box_h)
         self.canvas.delete('all')
         cw = self.canvas.winfo_width() or int(self.canvas['width'])
         ch = self.canvas.winfo_height() or int(self.canvas['height'])
-        scale = min(cw / box_w, ch / box_h)
+        scale = self.scale = min(cw / (x1 - x0), ch / (y1 - y0))
+        if _image_tk() is not None:
+            # one raster image of the visible part instead of a canvas item per placement
+            img = render.render_image(self.placements, box_w, box_h, width=max(1, int((x1 - x0) * scale)),
+                                      height=max(1, int((y1 - y0) * scale)), viewport=(x0, y0, x1, y1))
+            self.preview = ImageTk.PhotoImage(img)  # keep a reference or Tk drops the image
+            self.canvas.create_image(0, 0, image=self.preview, anchor='nw')
+            return
         # draw box
-        self.canvas.create_rectangle(0, 0, box_w * scale, box_h * scale, outline='black')
+        self.canvas.create_rectangle(-x0 * scale, -y0 * scale, (box_w - x0) * scale, (box_h - y0) * scale, outline='black')
         colors = ['lightblue','lightgreen','orange','pink','lightgrey','lightyellow']
-        for p in placements:
-            x = p['x'] * scale
-            y = p['y'] * scale
-            w = p['w'] * scale
-            h = p['h'] * scale
-            color = colors[p.get('type',0) % len(colors)]
+        for x, y, w, h, t in render.visible(self.placements, (x0, y0, x1, y1)):
+            if w * scale < render.LOD_PIXELS or h * scale < render.LOD_PIXELS:
+                continue
+            x = (x - x0) * scale
+            y = (y - y0) * scale
+            w *= scale
+            h *= scale
+            color = colors[t % len(colors)]
             self.canvas.create_rectangle(x, y, x + w, y + h, fill=color, outline='black')
 
+    def set_view(self, view):
+        if view is not None and self.box is not None:
+            box_w, box_h = self.box
+            x0, y0, x1, y1 = view
+            if x1 - x0 >= box_w and y1 - y0 >= box_h:
+                view = None
+            else:
+                dx, dy = self._clamp(x0, x1, box_w), self._clamp(y0, y1, box_h)
+                view = (x0 + dx, y0 + dy, x1 + dx, y1 + dy)
+        self.view = view
+        self.schedule_redraw()
+
+    @staticmethod
+    def _clamp(a0, a1, size):
+        # shift keeping [a0, a1] inside [0, size], or centred on it when wider
+        if a1 - a0 >= size:
+            return (size - (a1 - a0)) / 2 - a0
+        return max(0, -a0) - max(0, a1 - size)
+
+    def zoom(self, event, factor):
+        if self.box is None:
+            return
+        x0, y0, x1, y1 = self.view or (0, 0) + self.box
+        # the point under the cursor stays where it is
+        x, y = x0 + event.x / self.scale, y0 + event.y / self.scale
+        self.set_view((x - (x - x0) / factor, y - (y - y0) / factor, x + (x1 - x) / factor, y + (y1 - y) / factor))
+
+    def pan_start(self, event):
+        self.drag = (event.x, event.y)
+
+    def pan(self, event):
+        if self.box is None or self.view is None:
+            return
+        dx, dy = (self.drag[0] - event.x) / self.scale, (self.drag[1] - event.y) / self.scale
+        self.drag = (event.x, event.y)
+        x0, y0, x1, y1 = self.view
+        self.set_view((x0 + dx, y0 + dy, x1 + dx, y1 + dy))
+
     def save_image(self):
-        if PilImage is None:
-            messagebox.showerror('Missing dependency', 'Pillow is required to save PNG. Install pillow in your environment.')
+        if not self.placements:
+            messagebox.showwarning('No layout', 'No placements to save')
             return
-        path = filedialog.asksaveasfilename(defaultextension='.png', filetypes=[('PNG','*.png')])
+        path = filedialog.asksaveasfilename(defaultextension='.png', filetypes=[('PNG','*.png'),('SVG','*.svg'),('PDF','*.pdf')])
         if not path:
             return
-        # export via postscript
-        ps = filedialog.asksaveasfilename(defaultextension='.ps', filetypes=[('PostScript','*.ps')], title='Temporary PostScript (internal)')
+        # rendered from the layout itself, at full resolution rather than the canvas size
         try:
-            ps = path + '.ps'
-            self.canvas.postscript(file=ps)
-            img = PilImage.open(ps)
-            img.save(path, 'png')
-            os.remove(ps)
+            render.save(path, self.placements, float(self.box_w.get()), float(self.box_h.get()))
             messagebox.showinfo('Saved', f'Saved image to {path}')
         except Exception as e:
             messagebox.showerror('Error', str(e))
@@ -148,51 +347,47 @@ class PackerGUI(tk.Tk):
         if not self.placements:
             messagebox.showwarning('No layout', 'No placements to export')
             return
-        path = filedialog.asksaveasfilename(defaultextension='.json', filetypes=[('JSON','*.json')])
+        path = filedialog.asksaveasfilename(defaultextension='.json', filetypes=[('JSON','*.json'),('JSON lines','*.jsonl'),('Compressed JSON','*.json.gz')])
         if not path:
             return
-        data = {'box': {'w': float(self.box_w.get()), 'h': float(self.box_h.get())}, 'placements': self.placements}
-        with open(path, 'w', encoding='utf8') as f:
-            json.dump(data, f, indent=2)
-        messagebox.showinfo('Saved', f'Wrote {path}')
+        self.export_to(path)
 
     def export_csv(self):
         if not self.placements:
             messagebox.showwarning('No layout', 'No placements to export')
             return
-        path = filedialog.asksaveasfilename(defaultextension='.csv', filetypes=[('CSV','*.csv')])
+        path = filedialog.asksaveasfilename(defaultextension='.csv', filetypes=[('CSV','*.csv'),('Compressed CSV','*.csv.gz'),('NumPy records','*.npy')])
         if not path:
             return
-        with open(path, 'w', newline='', encoding='utf8') as f:
-            w = csv.writer(f)
-            w.writerow(['x','y','w','h','type'])
-            for p in self.placements:
-                w.writerow([p['x'], p['y'], p['w'], p['h'], p.get('type','')])
+        self.export_to(path)
+
+    def export_to(self, path):
+        # format and compression follow the file extension (see exporters)
+        import exporters
+        try:
+            exporters.export(path, self.placements, box=(float(self.box_w.get()), float(self.box_h.get())))
+        except (OSError, ValueError) as e:
+            messagebox.showerror('Error', str(e))
+            return
         messagebox.showinfo('Saved', f'Wrote {path}')
 
     def load_items(self):
-        path = filedialog.askopenfilename(filetypes=[('JSON','*.json'),('CSV','*.csv')])
+        import catalog
+        path = filedialog.askopenfilename(filetypes=[('Catalogs','*.json *.jsonl *.csv'),('JSON','*.json'),('JSON Lines','*.jsonl'),('CSV','*.csv')])
         if not path:
             return
-        if path.lower().endswith('.json'):
-            with open(path,'r',encoding='utf8') as f:
-                data = json.load(f)
-                self.items = data
-        else:
-            items = []
-            with open(path,'r',encoding='utf8') as f:
-                r = csv.DictReader(f)
-                for row in r:
-                    c = int(row.get('count',1))
-                    if c == 0:
-                        c = None
-                    items.append({'w': float(row['w']), 'h': float(row['h']), 'count': c})
-            self.items = items
+        try:
+            self.items = catalog.read_catalog(path).items
+        except (OSError, ValueError) as e:
+            messagebox.showerror('Error', str(e))
+            return
+        self.session = None
         self.items_listbox.delete(0,'end')
         for it in self.items:
             self.items_listbox.insert('end', f"{it['w']}x{it['h']} (x{it.get('count',1)})")
 
     def save_items(self):
+        import json
         path = filedialog.asksaveasfilename(defaultextension='.json', filetypes=[('JSON','*.json')])
         if not path:
             return
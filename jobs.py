@@ -0,0 +1,148 @@
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from multiprocessing.connection import wait
+from typing import Dict, Optional
+
+from packer import solve_job
+
+
+JOB_GRACE = 5.0
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when max_pending jobs are already waiting."""
+
+
+def _worker(conn, payload: Dict):
+    try:
+        conn.send(('done', solve_job(payload)))
+    except Exception as e:
+        conn.send(('failed', f'{type(e).__name__}: {e}'))
+    finally:
+        conn.close()
+
+
+class JobQueue:
+    """Bounded background queue of packing jobs (payloads as accepted by packer.solve_job).
+    At most max_workers jobs run at once, each in its own worker process so that a job can be
+    stopped when it is cancelled or runs past its time limit; a ProcessPoolExecutor cannot
+    interrupt a task that has started. At most max_pending jobs wait to start and submit raises
+    QueueFull beyond that. The newest `keep` job records are retained for polling."""
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 16, time_limit: float = 60.0, keep: int = 1000):
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max_pending
+        self.time_limit = time_limit
+        self.keep = keep
+        self._ctx = multiprocessing.get_context('spawn')
+        self._cond = threading.Condition()
+        self._jobs: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._queue = deque()
+        self._running: Dict[str, tuple] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, payload: Dict, time_limit: Optional[float] = None) -> str:
+        with self._cond:
+            if len(self._queue) >= self.max_pending:
+                raise QueueFull(f'{len(self._queue)} jobs already waiting')
+            job_id = uuid.uuid4().hex
+            limit = self.time_limit if time_limit is None else min(float(time_limit), self.time_limit)
+            if payload.get('time_limit'):
+                # the optimizer budget must end before the job is stopped
+                payload = dict(payload, time_limit=limit)
+            self._jobs[job_id] = {'id': job_id, 'status': 'queued', 'submitted': time.time(), 'time_limit': limit}
+            self._queue.append((job_id, payload))
+            self._trim()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='packer-jobs', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._cond:
+            rec = self._jobs.get(job_id)
+            return dict(rec) if rec is not None else None
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """Cancel a queued or running job; finished jobs are left as they are."""
+        with self._cond:
+            rec = self._jobs.get(job_id)
+            if rec is None:
+                return None
+            if rec['status'] == 'queued':
+                self._queue = deque(q for q in self._queue if q[0] != job_id)
+                self._finish(job_id, 'cancelled')
+            elif rec['status'] == 'running':
+                self._stop(job_id, 'cancelled')
+            return dict(rec)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {'queued': len(self._queue), 'running': len(self._running),
+                    'max_workers': self.max_workers, 'max_pending': self.max_pending}
+
+    # --- internals, called with the condition held unless noted ---
+
+    def _trim(self):
+        while len(self._jobs) > self.keep:
+            oldest = next(iter(self._jobs))
+            if self._jobs[oldest]['status'] in ('queued', 'running'):
+                break
+            del self._jobs[oldest]
+
+    def _finish(self, job_id: str, status: str, **fields):
+        rec = self._jobs.get(job_id)
+        if rec is not None:
+            rec.update(fields, status=status, finished=time.time())
+
+    def _stop(self, job_id: str, status: str, error: Optional[str] = None):
+        # the worker loop notices the closed pipe and reaps the process
+        self._running[job_id][0].terminate()
+        self._finish(job_id, status, **({'error': error} if error else {}))
+
+    def _start_queued(self):
+        while self._queue and len(self._running) < self.max_workers:
+            job_id, payload = self._queue.popleft()
+            parent, child = self._ctx.Pipe(duplex=False)
+            proc = self._ctx.Process(target=_worker, args=(child, payload), daemon=True)
+            proc.start()
+            child.close()
+            rec = self._jobs[job_id]
+            rec.update(status='running', started=time.time())
+            # the grace period covers process start-up and sending back a result that used its whole budget
+            self._running[job_id] = (proc, parent, rec['started'] + rec['time_limit'] + JOB_GRACE)
+
+    def _loop(self):
+        # runs on the background thread; the condition is only held while touching shared state
+        while True:
+            with self._cond:
+                self._start_queued()
+                while not self._running and not self._queue:
+                    self._cond.wait()
+                    self._start_queued()
+                conns = {entry[1]: job_id for job_id, entry in self._running.items()}
+            ready = wait(list(conns), timeout=0.05)
+            with self._cond:
+                for conn in ready:
+                    job_id = conns[conn]
+                    proc, _, _ = self._running.pop(job_id)
+                    try:
+                        status, value = conn.recv()
+                    except (EOFError, OSError):
+                        status, value = 'failed', 'worker exited without a result'
+                    proc.join()
+                    conn.close()
+                    if self._jobs.get(job_id, {}).get('status') != 'running':
+                        continue  # cancelled or timed out while we waited
+                    if status == 'done':
+                        self._finish(job_id, 'done', result=value)
+                    else:
+                        self._finish(job_id, 'failed', error=value)
+                now = time.time()
+                for job_id, (_, _, deadline) in list(self._running.items()):
+                    if now > deadline and self._jobs[job_id]['status'] == 'running':
+                        self._stop(job_id, 'timeout', 'time limit exceeded')
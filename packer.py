@@ -1,241 +1,727 @@
 ﻿#!/usr/bin/env python3
-import argparse
-import json
-import csv
+"""Command line, result cache, batch jobs and file I/O around the solver in packer_core.
+
+Everything in packer_core is re-exported, so `from packer import pack_items` keeps working.
+argparse, csv, json, sqlite3 and the process pools are imported when first used, which keeps
+the start-up of a single CLI solve or a `--serve` process short.
+"""
+import os
 import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from collections.abc import Mapping
 from typing import List, Tuple, Optional, Dict
 
-Rect = Tuple[float, float, float, float]
-
-
-def grid_pack(box_w: float, box_h: float, item_w: float, item_h: float, max_items: Optional[int] = None) -> List[Rect]:
-    cols = int(box_w // item_w)
-    rows = int(box_h // item_h)
-    placements: List[Rect] = []
-    for r in range(rows):
-        for c in range(cols):
-            if max_items is not None and len(placements) >= max_items:
-                return placements
-            x = c * item_w
-            y = r * item_h
-            placements.append((x, y, item_w, item_h))
-    return placements
-
-
-def greedy_row_pack(box_w: float, box_h: float, item_w: float, item_h: float, max_items: Optional[int] = None) -> List[Rect]:
-    placements: List[Rect] = []
-    y = 0.0
-    while y + min(item_h, item_w) <= box_h:
-        remaining_width = box_w
-        x = 0.0
-        while True:
-            if max_items is not None and len(placements) >= max_items:
-                return placements
-            placed = False
-            if item_w <= remaining_width and item_h <= (box_h - y):
-                placements.append((x, y, item_w, item_h))
-                x += item_w
-                remaining_width -= item_w
-                placed = True
-            elif item_h <= remaining_width and item_w <= (box_h - y):
-                placements.append((x, y, item_h, item_w))
-                x += item_h
-                remaining_width -= item_h
-                placed = True
-            if not placed:
-                break
-        y += item_h
-        if max_items is not None and len(placements) >= max_items:
-            break
-    return placements
-
-
-def best_layout(box_w: float, box_h: float, item_w: float, item_h: float, max_items: Optional[int] = None):
-    candidates = []
-    p_grid = grid_pack(box_w, box_h, item_w, item_h, max_items)
-    candidates.append(p_grid)
-    p_grid_rot = grid_pack(box_w, box_h, item_h, item_w, max_items)
-    p_grid_rot_norm = [(x, y, item_w, item_h) for (x, y, w, h) in p_grid_rot]
-    candidates.append(p_grid_rot_norm)
-    p_greedy = greedy_row_pack(box_w, box_h, item_w, item_h, max_items)
-    candidates.append(p_greedy)
-    best = max(candidates, key=lambda p: len(p))
-    return best
-
-
-# --- multi-item support helpers ---
-
-def rects_overlap(a: Rect, b: Rect) -> bool:
-    ax, ay, aw, ah = a
-    bx, by, bw, bh = b
-    return not (ax + aw <= bx or bx + bw <= ax or ay + ah <= by or by + bh <= ay)
-
-
-def can_place(x: float, y: float, w: float, h: float, box_w: float, box_h: float, placed: List[Rect]) -> bool:
-    if x + w > box_w or y + h > box_h:
-        return False
-    r = (x, y, w, h)
-    for p in placed:
-        if rects_overlap(r, p):
-            return False
-    return True
-
-
-def pack_multiple_items(box_w: float, box_h: float, items: List[Dict]) -> List[Dict]:
-    """Pack multiple item types. Items: list of dicts {'w','h','count','id'(optional)}
-    Returns list of placements with fields x,y,w,h,type_id
-    Greedy multi-pass placement: place largest-first repeatedly until no more placements are possible.
-    Count==0 or None means unlimited supply for that type."""
-    # Build types list with counts; count=None means unlimited
-    types = []
-    for i, it in enumerate(items):
-        cnt = it.get('count', 1)
-        if cnt is None or (isinstance(cnt, int) and cnt == 0) or (isinstance(cnt, str) and int(cnt) == 0):
-            cnt = None
-        else:
-            cnt = int(cnt)
-        types.append({'w': float(it['w']), 'h': float(it['h']), 'count': cnt, 'type': i})
-    # sort types by area descending
-    types.sort(key=lambda x: x['w'] * x['h'], reverse=True)
-
-    placements = []
-    step = 1.0
-    # Keep placing until a full pass yields no placements
-    while True:
-        placed_in_pass = 0
-        for t in types:
-            if t['count'] is not None and t['count'] <= 0:
-                continue
-            w = t['w']; h = t['h']
-            for y in [round(i * step, 6) for i in range(int((box_h // step) + 1))]:
-                if y + min(w, h) > box_h:
-                    break
-                for x in [round(i * step, 6) for i in range(int((box_w // step) + 1))]:
-                    if t['count'] is not None and t['count'] <= 0:
-                        break
-                    if can_place(x, y, w, h, box_w, box_h, [(p['x'], p['y'], p['w'], p['h']) for p in placements]):
-                        placements.append({'x': x, 'y': y, 'w': w, 'h': h, 'type': t['type']})
-                        placed_in_pass += 1
-                        if t['count'] is not None:
-                            t['count'] -= 1
-                        continue
-                    if can_place(x, y, h, w, box_w, box_h, [(p['x'], p['y'], p['w'], p['h']) for p in placements]):
-                        placements.append({'x': x, 'y': y, 'w': h, 'h': w, 'type': t['type']})
-                        placed_in_pass += 1
-                        if t['count'] is not None:
-                            t['count'] -= 1
-                        continue
-        if placed_in_pass == 0:
-            break
-    return placements
+from packer_core import *  # noqa: F401,F403
+
+# --- result cache ---
+
+class PackCache:
+    """LRU cache of packing results keyed on the canonical problem the solvers work on: the box
+    and each item type with its longer side first, the types sorted, and the algorithm. Uncached
+    solves use the same form, so a hit returns what an uncached solve would.
+    Memory use is bounded by max_entries and by max_bytes of serialized results. With a path,
+    results are also stored in an SQLite file shared by every process that opens it."""
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 64 << 20, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.path = path
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._data: 'OrderedDict[str, Tuple[object, int]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+
+    def _conn(self):
+        # one connection per process; a forked child must not reuse its parent's
+        if self._db is None or self._db_pid != os.getpid():
+            import sqlite3
+            self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._db.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value BLOB)')
+            self._db.commit()
+            self._db_pid = os.getpid()
+        return self._db
+
+    @timed('cache.get')
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if self.path:
+                row = self._conn().execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    import json
+                    text = zlib.decompress(row[0]).decode('utf8')
+                    value = json.loads(text)
+                    self._remember(key, value, len(text))
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    @timed('cache.put')
+    def put(self, key: str, value):
+        import json
+        text = json.dumps(value, separators=(',', ':'))
+        with self._lock:
+            self._remember(key, value, len(text))
+            if self.path:
+                db = self._conn()
+                db.execute('INSERT OR REPLACE INTO results (key, value) VALUES (?, ?)', (key, zlib.compress(text.encode('utf8'))))
+                db.commit()
+
+    def _remember(self, key: str, value, size: int):
+        if key in self._data:
+            self.bytes -= self._data.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self._data[key] = (value, size)
+        self.bytes += size
+        while len(self._data) > self.max_entries or self.bytes > self.max_bytes:
+            self.bytes -= self._data.popitem(last=False)[1][1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+            if self.path:
+                db = self._conn()
+                db.execute('DELETE FROM results')
+                db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                    'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                    'entries': len(self._data), 'bytes': self.bytes, 'path': self.path}
+
+
+_default_cache: Optional[PackCache] = None
+_cache_disabled = False
+
+
+def default_cache() -> Optional[PackCache]:
+    """Process-wide cache used by solve_job, the CLI and the GUI; PACKER_CACHE names an SQLite
+    file to persist results in. None once disabled through configure_cache(enabled=False)."""
+    global _default_cache
+    if _default_cache is None and not _cache_disabled:
+        _default_cache = PackCache(path=os.environ.get('PACKER_CACHE') or None)
+    return _default_cache
+
+
+def configure_cache(path: Optional[str] = None, enabled: bool = True) -> Optional[PackCache]:
+    """Replace the process-wide cache and return it (None when disabled)."""
+    global _default_cache, _cache_disabled
+    _cache_disabled = not enabled
+    _default_cache = PackCache(path=path) if enabled else None
+    return _default_cache
+
+
+# --- capacity table ---
+
+_default_capacity = None
+_capacity_path: Optional[str] = None
+
+
+def default_capacity():
+    """Process-wide capacity.CapacityTable answering count-only single-type jobs; PACKER_CAPACITY
+    names the table file. None when no table is configured."""
+    global _default_capacity
+    if _default_capacity is None:
+        path = _capacity_path if _capacity_path is not None else os.environ.get('PACKER_CAPACITY')
+        if path:
+            import capacity
+            _default_capacity = capacity.CapacityTable(path)
+    return _default_capacity
+
+
+def configure_capacity(path: Optional[str]):
+    """Use the table at path (None or '' for none) instead of $PACKER_CAPACITY and return it."""
+    global _default_capacity, _capacity_path
+    _capacity_path = path or ''
+    _default_capacity = None
+    return default_capacity()
+
+
+# --- job records (batch mode and web) ---
+
+def _dims(d, default_w: float = 100, default_h: float = 50) -> Tuple[float, float]:
+    if isinstance(d, dict):
+        return float(d.get('w', default_w)), float(d.get('h', default_h))
+    w, h = d
+    return float(w), float(h)
+
+
+@timed('job')
+def solve_job(job: Dict) -> Dict:
+    """Solve one /pack-style request. Placements come back as a Layout; serialize the result
+    with json.dumps(result, default=json_default).
+    Keys: 'box' ({w,h} or [w,h]), 'items' with optional 'algorithm', or 'item' with optional
+    'count' (0 = unlimited) and 'count_only' (answered from the capacity table when one is
+    configured, see default_capacity), or 'boxes' plus 'items' with optional 'strategy'.
+    With 'items', a 'time_limit' in seconds (plus optional 'seed', 'workers', 'iterations')
+    runs the portfolio optimizer instead of the single algorithm. 'exact': true (with 'items'
+    or 'item') searches for the proven maximum instead, within 'node_limit' and 'time_limit',
+    and adds 'bound', 'optimal' and 'gap' to the result. A box with a depth ({w,h,d} or
+    [w,h,d]) packs 'items' with a 'd' in 3D, see pack_3d (optional 'layering', 'workers').
+    An 'id' is echoed back. Bad input raises ValueError."""
+    result = _solve_job(job)
+    if 'id' in job:
+        result = {'id': job['id'], **result}
+    return result
+
+
+def _solve_job(job: Dict) -> Dict:
+    items = job.get('items')
+    if job.get('boxes'):
+        if not items:
+            raise ValueError('boxes need items')
+        res = pack_bins(job['boxes'], items, job.get('algorithm') or 'maxrects', job.get('strategy', 'best-fit'))
+        boxes = [{'box': b['box'], 'id': b['id'], 'w': b['w'], 'h': b['h'], 'count': b['count']} for b in res['bins']]
+        return {'placements': res['placements'], 'unplaced': res['unplaced'], 'boxes': boxes, 'count': res['count']}
+    box = job.get('box', {})
+    if not isinstance(box, (dict, list, tuple)) or (not isinstance(box, dict) and len(box) not in (2, 3)):
+        raise ValueError('box must be {w,h} or [w,h], with an optional depth d')
+    depth = box.get('d') if isinstance(box, dict) else (box[2] if len(box) == 3 else None)
+    if depth is not None:
+        if not items:
+            raise ValueError('a 3D box needs items')
+        box_w, box_h = _dims(box if isinstance(box, dict) else box[:2])
+        res = pack_3d(box_w, box_h, float(depth), items, job.get('algorithm') or 'maxrects',
+                      job.get('layering', 'auto'), int(job.get('workers') or 1))
+        return {k: res[k] for k in ('mode', 'layers', 'placements', 'unplaced', 'count', 'utilization')}
+    box_w, box_h = _dims(box)
+    if job.get('exact'):
+        if not items and job.get('item'):
+            items = [{'w': _dims(job['item'])[0], 'h': _dims(job['item'])[1], 'count': job.get('count') or 0}]
+        if not items:
+            raise ValueError('no item or items provided')
+        time_limit = job.get('time_limit')
+        res = exact_pack(box_w, box_h, items, int(job.get('node_limit', EXACT_NODE_LIMIT)) or None,
+                         float(time_limit) if time_limit else None)
+        return {k: res[k] for k in ('placements', 'count', 'bound', 'optimal', 'gap')}
+    if items and job.get('time_limit'):
+        placements = optimize(box_w, box_h, items, float(job['time_limit']), int(job.get('seed', 0)),
+                              job.get('workers'), job.get('algorithm', 'greedy'), job.get('iterations'))
+        return {'placements': placements, 'count': len(placements)}
+    if items:
+        placements = pack_items(box_w, box_h, items, job.get('algorithm', 'greedy'), cache=default_cache())
+        return {'placements': placements, 'count': len(placements)}
+    item = job.get('item')
+    if not item:
+        raise ValueError('no item or items provided')
+    item_w, item_h = _dims(item)
+    count = int(job['count']) if job.get('count') else None
+    if job.get('count_only'):
+        return {'count': best_count(box_w, box_h, item_w, item_h, count, default_cache(), default_capacity())}
+    layout = best_layout(box_w, box_h, item_w, item_h, count, cache=default_cache())
+    return {'placements': layout.to_layout(), 'count': len(layout)}
+
+
+# set in batch pool workers, which hand their counters back with each result
+_worker_stats: Optional[Stats] = None
+
+
+def _init_batch_worker(cache_path: Optional[str], cache_enabled: bool, stats_enabled: bool,
+                       capacity_path: Optional[str] = None):
+    global _worker_stats
+    configure_cache(cache_path, cache_enabled)
+    configure_capacity(capacity_path)
+    if stats_enabled:
+        _worker_stats = enable_stats()
+
+
+def _run_job_line(arg: Tuple[int, str]) -> Tuple[int, str, bool, Optional[Dict]]:
+    import json
+    seq, line = arg
+    job = None
+    try:
+        job = json.loads(line)
+        if not isinstance(job, dict):
+            raise ValueError('job must be a JSON object')
+        result = solve_job(job)
+        failed = False
+    except Exception as e:
+        result = {'id': job.get('id', seq) if isinstance(job, dict) else seq, 'error': f'{type(e).__name__}: {e}'}
+        failed = True
+    if 'id' not in result:
+        result = {'id': seq, **result}
+    text = json.dumps(result, default=json_default)
+    return seq, text, failed, _worker_stats.snapshot(reset=True) if _worker_stats is not None else None
+
+
+def run_batch(src, out, jobs: int = 1, ordered: bool = False) -> Tuple[int, int]:
+    """Stream JSONL job records from src and write one JSON result line per job to out.
+    With jobs > 1 records are solved on a process pool; at most 4 * jobs records are in flight
+    or waiting to be written, so memory stays bounded for arbitrarily long inputs. Results are
+    written as they finish unless ordered is set. A job without an 'id' is identified by its
+    position among the non-blank lines. Returns (jobs processed, jobs that failed)."""
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
+    records = ((seq, line) for seq, line in enumerate((l for l in src if l.strip()), 1))
+    done_count = 0
+    errors = 0
+
+    def emit(res: Tuple[int, str, bool, Optional[Dict]]):
+        nonlocal done_count, errors
+        done_count += 1
+        errors += res[2]
+        stats = current_stats()
+        if res[3] is not None and stats is not None:
+            stats.merge(res[3])
+        out.write(res[1] + '\n')
+        out.flush()
+
+    if jobs <= 1:
+        for rec in records:
+            emit(_run_job_line(rec))
+        return done_count, errors
+
+    cache = default_cache()
+    table = default_capacity()
+    window = 4 * jobs
+    next_seq = 1
+    buffered: Dict[int, Tuple[int, str, bool, Optional[Dict]]] = {}
+    pending = set()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_batch_worker,
+                             initargs=(cache.path if cache else None, cache is not None, current_stats() is not None,
+                                       table.path if table else None)) as ex:
+        def collect(block: bool):
+            nonlocal pending, next_seq
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED if block else ALL_COMPLETED)
+            for fut in sorted(finished, key=lambda f: f.result()[0]):
+                res = fut.result()
+                if not ordered:
+                    emit(res)
+                    continue
+                buffered[res[0]] = res
+                while next_seq in buffered:
+                    emit(buffered.pop(next_seq))
+                    next_seq += 1
+
+        for rec in records:
+            while len(pending) + len(buffered) >= window:
+                collect(True)
+            pending.add(ex.submit(_run_job_line, rec))
+        while pending:
+            collect(False)
+    return done_count, errors
+
+
+def serve(src, out) -> Tuple[int, int]:
+    """--serve: answer job records from src one at a time, each result line written and flushed
+    as soon as it is solved, until src ends. Lines are read one by one (never ahead), so a
+    script can send a job and wait for its answer while the process, its imports and its cache
+    stay warm between calls. Returns (jobs processed, jobs that failed)."""
+    return run_batch(iter(src.readline, ''), out)
 
 
 # --- exports ---
 
-def export_json(path: str, box_w: float, box_h: float, placements: List[Dict]):
-    data = {
-        'box': {'w': box_w, 'h': box_h},
-        'placements': placements,
-        'count': len(placements)
-    }
-    with open(path, 'w', encoding='utf8') as f:
-        json.dump(data, f, indent=2)
+def placement_rows(placements, fields: Tuple[str, ...], missing=''):
+    """Rows of field values from a Layout (straight from its arrays), a BlockLayout or
+    dicts/tuples; fields a placement does not have come out as `missing`."""
+    if isinstance(placements, Layout):
+        cols = [getattr(placements, f) if f in placements.fields else None for f in fields]
+        n = len(placements)
+        return zip(*[c if c is not None else [missing] * n for c in cols])
+    if isinstance(placements, BlockLayout):
+        defaults = {'type': 0}
+        idx = [('x', 'y', 'w', 'h').index(f) if f in ('x', 'y', 'w', 'h') else None for f in fields]
+        return (tuple(r[i] if i is not None else defaults.get(f, missing) for i, f in zip(idx, fields)) for r in placements)
+    return ([p.get(f, missing) if isinstance(p, Mapping) else (list(p) + [0])[i] for i, f in enumerate(fields)] for p in placements)
+
+
+@timed('export.json')
+def export_json(path: str, box_w: float, box_h: float, placements):
+    """Stream placements to JSON (compressed by extension, see exporters.open_output)."""
+    import exporters
+    exporters.export(path, placements, box=(box_w, box_h), fmt='json')
 
 
-def export_csv(path: str, placements: List[Dict]):
-    with open(path, 'w', newline='', encoding='utf8') as f:
-        writer = csv.writer(f)
-        writer.writerow(['x','y','w','h','type'])
-        for p in placements:
-            writer.writerow([p['x'], p['y'], p['w'], p['h'], p.get('type', '')])
+@timed('export.json')
+def export_bins_json(path: str, result: Dict):
+    import exporters
+    exporters.export_bins(path, result, fmt='json')
 
 
-def visualize(placements: List[Rect], box_w: float, box_h: float, out_path: str):
+@timed('export.csv')
+def export_csv(path: str, placements, fields: Tuple[str, ...] = ('x', 'y', 'w', 'h', 'type')):
+    import exporters
+    exporters.export(path, placements, fields=fields, fmt='csv')
+
+
+@timed('export')
+def export_output(path: str, placements=None, box: Optional[Tuple[float, float]] = None, result: Optional[Dict] = None):
+    """CLI --output: any exporters format, chosen by the file extension."""
+    import exporters
     try:
-        import matplotlib.pyplot as plt
-        from matplotlib.patches import Rectangle
-    except Exception:
-        print("matplotlib not available; install it to enable visualization", file=sys.stderr)
-        return
-    fig, ax = plt.subplots()
-    ax.set_xlim(0, box_w)
-    ax.set_ylim(0, box_h)
-    ax.set_aspect('equal')
-    ax.add_patch(Rectangle((0, 0), box_w, box_h, fill=False, edgecolor='black', lw=1))
-    colors = ['C0','C1','C2','C3','C4','C5','C6','C7','C8','C9']
-    for p in placements:
-        x = p['x'] if isinstance(p, dict) else p[0]
-        y = p['y'] if isinstance(p, dict) else p[1]
-        w = p['w'] if isinstance(p, dict) else p[2]
-        h = p['h'] if isinstance(p, dict) else p[3]
-        t = p.get('type', 0) if isinstance(p, dict) else 0
-        ax.add_patch(Rectangle((x, y), w, h, facecolor=colors[t % len(colors)], edgecolor='black', alpha=0.6))
-    ax.invert_yaxis()
-    plt.savefig(out_path, bbox_inches='tight')
-    plt.close(fig)
+        if result is not None:
+            exporters.export_bins(path, result)
+        else:
+            exporters.export(path, placements, box=box)
+    except ValueError as e:
+        print(f'Error: {e}', file=sys.stderr)
+        sys.exit(1)
+    print(f'Wrote {exporters.split_path(path)[0].upper()} to {path}')
+
+
+@timed('visualize')
+def visualize(placements, box_w: float, box_h: float, out_path: str, width: int = 1200):
+    """Render the layout to out_path (see render.save: SVG, Pillow raster or matplotlib)."""
+    import render
+    try:
+        render.save(out_path, placements, box_w, box_h, width)
+    except ImportError as e:
+        print(e, file=sys.stderr)
+
+
+@timed('parse')
+def load_catalog(path: str):
+    """A catalog.Catalog read from a CSV, JSON or JSONL file (see catalog)."""
+    import catalog
+    return catalog.read_catalog(path)
 
 
 def parse_items_file(path: str) -> List[Dict]:
+    """Item types from a catalog file: rows validated, rotation-equivalent ones merged with
+    their counts summed. Raises catalog.CatalogError listing every invalid row."""
+    return load_catalog(path).items
+
+
+def read_items(path: str) -> List[Dict]:
+    """parse_items_file for the command line: reports merged rows and exits on a bad catalog."""
+    try:
+        cat = load_catalog(path)
+    except (OSError, ValueError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        sys.exit(1)
+    if cat.rows != len(cat.items):
+        print(f'Catalog: {cat.rows} rows merged into {len(cat.items)} types')
+    return cat.items
+
+
+@timed('parse')
+def parse_boxes_file(path: str) -> List[Dict]:
+    """CSV or JSON list of boxes with w,h and an optional count of identical boxes (default 1)."""
+    import csv
+    import json
     if path.lower().endswith('.json'):
-        with open(path, 'r', encoding='utf8') as f:
+        with open(path, 'r', encoding='utf-8-sig') as f:
             data = json.load(f)
-            # expect list of objects {w,h,count} - treat count==0 as unlimited
-            for it in data:
-                c = it.get('count', 1)
-                if c is None or (isinstance(c, int) and c == 0) or (isinstance(c, str) and int(c) == 0):
-                    it['count'] = None
-                else:
-                    it['count'] = int(c)
-            return data
     else:
-        # assume CSV with headers w,h,count
-        items = []
-        with open(path, 'r', encoding='utf8') as f:
-            reader = csv.DictReader(f)
-            for r in reader:
-                c = int(r.get('count', 1))
-                if c == 0:
-                    c = None
-                items.append({'w': float(r['w']), 'h': float(r['h']), 'count': c})
-        return items
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            data = list(csv.DictReader(f))
+    boxes = []
+    for i, b in enumerate(data):
+        box = {'w': float(b['w']), 'h': float(b['h']), 'count': int(b.get('count') or 1)}
+        if b.get('id') not in (None, ''):
+            box['id'] = b['id']
+        boxes.append(box)
+    return boxes
 
 
 def parse_args():
+    import argparse
     p = argparse.ArgumentParser(description='Pack identical rectangles in a box and return best layout')
-    p.add_argument('--box', nargs=2, type=float, required=True, metavar=('W', 'H'), help='Box width and height')
+    p.add_argument('--box', nargs=2, type=float, metavar=('W', 'H'), help='Box width and height')
+    p.add_argument('--depth', type=float, metavar='D', help='Box depth: pack --items-file items (w,h,d) in 3D, as layers or columns of 2D slices')
+    p.add_argument('--layering', choices=('auto',) + tuple(LAYER_MODES), default='auto', help='Slices for --depth: layers stack up the height, columns along the depth (default: auto, the better of both)')
+    p.add_argument('--boxes-file', type=str, help='CSV or JSON file with a fleet of boxes (w,h,count) to pack --items-file across')
+    p.add_argument('--strategy', choices=BIN_STRATEGIES, default='best-fit', help='Box selection for --boxes-file (default: best-fit)')
     p.add_argument('--item', nargs=2, type=float, help='Item width and height (single-type pack)')
-    p.add_argument('--items-file', type=str, help='CSV or JSON file containing multiple item types')
+    p.add_argument('--items-file', type=str, help='CSV, JSON or JSONL catalog of item types (w,h,count and optional sku); rows with the same sides are merged')
     p.add_argument('--count', type=int, default=None, help='Maximum number of items available (single-type)')
-    p.add_argument('--visualize', action='store_true', help='Save an image of the layout (requires matplotlib)')
-    p.add_argument('--out', type=str, default='layout.png', help='Output image path')
+    p.add_argument('--count-only', action='store_true', help='With --item: print only how many fit, from the --capacity table when it lists the box and item')
+    p.add_argument('--algorithm', choices=list(ALGORITHMS), default='greedy', help='Packing algorithm for --items-file (default: greedy)')
+    p.add_argument('--resolution', type=float, metavar='UNIT', help='Grid unit for --items-file; item sides are rounded up to it (default: the GCD of the item sides)')
+    p.add_argument('--visualize', action='store_true', help='Save an image of the layout (PNG and other raster formats need Pillow, SVG nothing, PDF matplotlib)')
+    p.add_argument('--out', type=str, default='layout.png', help='Output image path; the format follows the extension')
+    p.add_argument('--image-width', type=int, default=1200, metavar='PX', help='Width of the --visualize image in pixels (default: 1200)')
     p.add_argument('--output-json', type=str, help='Write placements to JSON file')
     p.add_argument('--output-csv', type=str, help='Write placements to CSV file')
+    p.add_argument('--output', type=str, metavar='PATH', help='Write placements to PATH, format from the extension: .json, .jsonl, .csv or .npy, optionally compressed with .gz, .bz2, .xz or .zst')
+    p.add_argument('--verify', type=str, metavar='LAYOUT', help='Check a layout file (any --output format) for placements outside the box and overlaps; with --item or --items-file also sizes and counts. A multi-box layout takes its boxes from --boxes-file. Exits 1 when invalid')
+    p.add_argument('--no-rotate', action='store_true', help='With --verify: items must keep their w x h orientation')
+    p.add_argument('--batch', type=str, metavar='JOBS', help="Solve a JSONL file of /pack-style job records ('-' for stdin), one result line per job")
+    p.add_argument('--batch-output', type=str, help='Write batch results to this file instead of stdout')
+    p.add_argument('--jobs', type=int, default=1, help='Worker processes for --batch (default: 1)')
+    p.add_argument('--ordered', action='store_true', help='Write batch results in input order')
+    p.add_argument('--serve', action='store_true', help='Keep running: read job records from stdin and answer each on its own stdout line, flushed, until stdin closes')
+    p.add_argument('--cache', type=str, metavar='PATH', help='SQLite file to persist results in, shared across runs (default: $PACKER_CACHE)')
+    p.add_argument('--no-cache', action='store_true', help='Do not cache results')
+    p.add_argument('--build-capacity', type=str, metavar='TABLE', help='Precompute single-type capacities of every --items-file item on every --boxes-file (or --box) shelf size into TABLE (.npy plus a .json index); an existing TABLE is updated, solving only new items and shelves')
+    p.add_argument('--capacity', type=str, metavar='TABLE', help='Capacity table for count-only queries (--count-only, count_only jobs; default: $PACKER_CAPACITY)')
+    p.add_argument('--time-limit', type=float, metavar='SECONDS', help='Search a portfolio of strategies for up to SECONDS with --items-file')
+    p.add_argument('--seed', type=int, default=0, help='Random seed for --time-limit (default: 0)')
+    p.add_argument('--iterations', type=int, metavar='N', help='With --time-limit: stop after N portfolio candidates, so the result does not depend on machine speed')
+    p.add_argument('--workers', type=int, default=None, help='Worker processes for --time-limit (default: CPU count) and --depth (default: 1)')
+    p.add_argument('--exact', action='store_true', help='Search for the proven maximum count (small instances); stops at --node-limit or --time-limit and reports the gap')
+    p.add_argument('--node-limit', type=int, default=EXACT_NODE_LIMIT, help=f'Search nodes allowed for --exact, 0 for no limit (default: {EXACT_NODE_LIMIT})')
+    p.add_argument('--stats', nargs='?', const='text', choices=('text', 'json'), help='Print solver counters and phase timings to stderr (text or json)')
     return p.parse_args()
 
 
+def run_bins(args):
+    if not args.items_file:
+        print('Error: --boxes-file needs --items-file', file=sys.stderr)
+        sys.exit(1)
+    algorithm = args.algorithm if args.algorithm in ENGINES else 'maxrects'
+    boxes = parse_boxes_file(args.boxes_file)
+    items = read_items(args.items_file)
+    result = pack_bins(boxes, items, algorithm, args.strategy)
+    used = sum(1 for b in result['bins'] if b['count'])
+    print(f"Placed {result['count']} total items in {used} of {len(result['bins'])} boxes ({algorithm}, {args.strategy})")
+    for b in result['bins']:
+        print(f"Box {b['box']} ({b['w']:g}x{b['h']:g}): {b['count']}")
+    for u in result['unplaced']:
+        print(f"Unplaced type {u['type']}: {u['count']}")
+    if args.output_json:
+        export_bins_json(args.output_json, result)
+        print(f'Wrote JSON to {args.output_json}')
+    if args.output_csv:
+        export_csv(args.output_csv, result['placements'], ('box', 'x', 'y', 'w', 'h', 'type'))
+        print(f'Wrote CSV to {args.output_csv}')
+    if args.output:
+        export_output(args.output, result=result)
+    if args.visualize:
+        stem, dot, ext = args.out.rpartition('.')
+        for b in result['bins']:
+            out = f"{stem}_{b['box']}.{ext}" if dot else f"{args.out}_{b['box']}"
+            visualize(b['placements'], b['w'], b['h'], out, args.image_width)
+            print(f'Layout image written to {out}')
+
+
+FIELDS_3D = ('x', 'y', 'z', 'w', 'h', 'd', 'type', 'layer')
+
+
+def run_3d(args):
+    import exporters
+    if not args.items_file:
+        print('Error: --depth needs --items-file with w,h,d items', file=sys.stderr)
+        sys.exit(1)
+    algorithm = args.algorithm if args.algorithm in ENGINES else 'maxrects'
+    box_w, box_h = args.box
+    items = read_items(args.items_file)
+    try:
+        result = pack_3d(box_w, box_h, args.depth, items, algorithm, args.layering, args.workers or 1)
+    except ValueError as e:
+        print(f'Error: {e}', file=sys.stderr)
+        sys.exit(1)
+    print(f"Placed {result['count']} total items from {len(items)} types ({algorithm}, {result['mode']})")
+    for i, layer in enumerate(result['layers']):
+        print(f"Layer {i}: {layer['axis']}={layer['offset']:g}, thickness {layer['thickness']:g}, "
+              f"{layer['count']} items, {layer['utilization']:.1%} full")
+    for u in result['unplaced']:
+        print(f"Unplaced type {u['type']}: {u['count']}")
+    print(f"Utilization: {result['utilization']:.1%} ({result['solved']} slices solved, {result['reused']} reused)")
+    for path, fmt in ((args.output_json, 'json'), (args.output_csv, 'csv'), (args.output, None)):
+        if path:
+            exporters.export(path, result['placements'], fields=FIELDS_3D, fmt=fmt)
+            print(f'Wrote placements to {path}')
+    if args.visualize:
+        plane = (box_w, args.depth) if result['mode'] == 'layers' else (box_w, box_h)
+        stem, dot, ext = args.out.rpartition('.')
+        for i, layer in enumerate(result['layers']):
+            out = f'{stem}_{i}.{ext}' if dot else f'{args.out}_{i}'
+            visualize(layer['placements'], plane[0], plane[1], out, args.image_width)
+            print(f'Layout image written to {out}')
+
+
+def run_verify(args):
+    import exporters
+    try:
+        layout, box = exporters.read_layout(args.verify)
+    except (OSError, ValueError, KeyError) as e:
+        print(f'Error: cannot read {args.verify}: {e}', file=sys.stderr)
+        sys.exit(1)
+    fleet = layout.box is not None
+    if fleet and args.boxes_file:
+        # box indices follow the expanded fleet, as pack_bins numbers them
+        box = [(b['w'], b['h']) for b in parse_boxes_file(args.boxes_file) for _ in range(b['count'])]
+    elif args.box:
+        box = [tuple(args.box)] * (max(layout.box, default=-1) + 1) if fleet else tuple(args.box)
+    if fleet and not isinstance(box, list):
+        print('Error: --verify of a multi-box layout needs --boxes-file (or --box when every box has that size) '
+              'unless the layout file records its boxes', file=sys.stderr)
+        sys.exit(1)
+    if box is None:
+        print('Error: --verify needs --box unless the layout file records it', file=sys.stderr)
+        sys.exit(1)
+    items = None
+    if args.items_file:
+        items = read_items(args.items_file)
+    elif args.item:
+        items = [{'w': args.item[0], 'h': args.item[1], 'count': args.count or 0}]
+    if fleet:
+        res = validate_bins(box, layout, items, rotate=not args.no_rotate)
+        where = f"{len(box)} box{'es' if len(box) != 1 else ''}"
+    else:
+        res = validate_layout(box[0], box[1], layout, items, rotate=not args.no_rotate)
+        where = f'{box[0]:g} x {box[1]:g}'
+    if res['valid']:
+        print(f"Layout OK: {res['count']} placements in {where}")
+        return
+    summary = ', '.join(f'{n} {kind}' for kind, n in sorted(res['errors'].items()))
+    print(f"Layout invalid: {res['count']} placements in {where}; {summary}")
+    for issue in res['issues'][:20]:
+        detail = ', '.join(f'{k} {v}' for k, v in issue.items() if k != 'kind')
+        print(f"  {issue['kind']}: {detail}")
+    sys.exit(1)
+
+
+def run_build_capacity(args):
+    import capacity
+    if not args.items_file or not (args.boxes_file or args.box):
+        print('Error: --build-capacity needs --items-file and --boxes-file or --box', file=sys.stderr)
+        sys.exit(1)
+    items = read_items(args.items_file)
+    shelves = parse_boxes_file(args.boxes_file) if args.boxes_file else [{'w': args.box[0], 'h': args.box[1]}]
+    try:
+        res = capacity.build_table(args.build_capacity, items, shelves)
+    except (ImportError, ValueError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        sys.exit(1)
+    print(f"Capacity table {args.build_capacity}: {res['items']} item sizes x {res['shelves']} shelf sizes, "
+          f"{res['solved']} solved, {res['reused']} reused ({res['seconds']:.2f}s)")
+
+
+def run_batch_cli(args):
+    src = sys.stdin if args.batch == '-' else open(args.batch, 'r', encoding='utf8')
+    out = open(args.batch_output, 'w', encoding='utf8') if args.batch_output else sys.stdout
+    try:
+        done, errors = run_batch(src, out, max(1, args.jobs), args.ordered)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if out is not sys.stdout:
+            out.close()
+    print(f'Processed {done} job(s), {errors} failed', file=sys.stderr)
+
+
 def main():
     args = parse_args()
+    if not args.stats:
+        run(args)
+        return
+    stats = enable_stats()
+    t0 = time.perf_counter()
+    try:
+        run(args)
+    finally:
+        stats.add_time('total', time.perf_counter() - t0)
+        if args.stats == 'json':
+            import json
+            print(json.dumps(stats.snapshot(), indent=2), file=sys.stderr)
+        else:
+            print(stats.format(), file=sys.stderr)
+
+
+def print_exact(res: Dict):
+    if res['optimal']:
+        print(f"Optimal: {res['count']} (proven after {res['nodes']} nodes, {res['seconds']:.2f}s)")
+    else:
+        print(f"Best found: {res['count']}, upper bound {res['bound']}, gap {res['gap']:.1%} "
+              f"(stopped after {res['nodes']} nodes, {res['seconds']:.2f}s)")
+
+
+def print_reduction(red: Reduction, types: int):
+    if red.unit is None:
+        print(f'Reduction: none, item sides have no common unit (box {red.box_w:g} x {red.box_h:g}, {len(red.items)} of {types} types)')
+        return
+    if red.positions is None:
+        print(f'Reduction: unit {float(red.unit):g}, box {red.box_w:g} x {red.box_h:g} units, {len(red.items)} of {types} types')
+        return
+    print(f'Reduction: unit {float(red.unit):g}, box {red.box_w:g} x {red.box_h:g} units, '
+          f'{red.positions[0]} x {red.positions[1]} positions ({red.factor:,.0f}x fewer), {len(red.items)} of {types} types')
+
+
+def run(args):
+    if args.no_cache:
+        configure_cache(enabled=False)
+    elif args.cache:
+        configure_cache(args.cache)
+    if args.capacity:
+        try:
+            configure_capacity(args.capacity)
+        except (OSError, ValueError) as e:
+            print(f'Error: {e}', file=sys.stderr)
+            sys.exit(1)
+    if args.build_capacity:
+        run_build_capacity(args)
+        return
+    if args.serve:
+        try:
+            serve(sys.stdin, sys.stdout)
+        except KeyboardInterrupt:
+            pass
+        return
+    if args.batch:
+        run_batch_cli(args)
+        return
+    if args.verify:
+        run_verify(args)
+        return
+    if args.boxes_file:
+        run_bins(args)
+        return
+    if not args.box:
+        print('Error: either --box or --boxes-file must be supplied', file=sys.stderr)
+        sys.exit(1)
     box_w, box_h = args.box
+    if args.depth:
+        run_3d(args)
+        return
 
     if args.items_file:
-        items = parse_items_file(args.items_file)
-        placements = pack_multiple_items(box_w, box_h, items)
-        print(f'Placed {len(placements)} total items from {len(items)} types')
+        items = read_items(args.items_file)
+        if args.exact:
+            res = exact_pack(box_w, box_h, items, args.node_limit or None, args.time_limit)
+            placements = res['placements']
+            print(f'Placed {len(placements)} total items from {len(items)} types (exact)')
+            print_exact(res)
+        elif args.time_limit:
+            placements = optimize(box_w, box_h, items, args.time_limit, args.seed, args.workers, args.algorithm, args.iterations)
+            print(f'Placed {len(placements)} total items from {len(items)} types (portfolio, {args.time_limit:g}s)')
+        else:
+            try:
+                red = reduce_problem(box_w, box_h, items, args.resolution, normal=args.algorithm == 'greedy')
+            except ValueError as e:
+                print(f'Error: {e}', file=sys.stderr)
+                sys.exit(1)
+            placements = pack_items(box_w, box_h, items, args.algorithm, cache=default_cache(), resolution=args.resolution)
+            print(f'Placed {len(placements)} total items from {len(items)} types ({args.algorithm})')
+            print_reduction(red, len(items))
         if args.output_json:
             export_json(args.output_json, box_w, box_h, placements)
             print(f'Wrote JSON to {args.output_json}')
         if args.output_csv:
             export_csv(args.output_csv, placements)
             print(f'Wrote CSV to {args.output_csv}')
+        if args.output:
+            export_output(args.output, placements, (box_w, box_h))
         if args.visualize:
-            visualize(placements, box_w, box_h, args.out)
+            visualize(placements, box_w, box_h, args.out, args.image_width)
             print(f'Layout image written to {args.out}')
         # print a small summary
-        counts = {}
-        for p in placements:
-            counts[p['type']] = counts.get(p['type'], 0) + 1
-        for t, c in counts.items():
+        for t, c in placements.counts().items():
             print(f'Type {t}: {c}')
+        print(f'Utilization: {placements.utilization(box_w, box_h):.1%}')
         return
 
     if not args.item:
@@ -248,7 +734,15 @@ def main():
         max_items = None
     else:
         max_items = args.count
-    best = best_layout(box_w, box_h, item_w, item_h, max_items)
+    if args.count_only and not args.exact:
+        print(best_count(box_w, box_h, item_w, item_h, max_items, default_cache(), default_capacity()))
+        return
+    best = best_layout(box_w, box_h, item_w, item_h, max_items, cache=default_cache())
+    if args.exact:
+        res = exact_pack(box_w, box_h, [{'w': item_w, 'h': item_h, 'count': max_items}], args.node_limit or None,
+                         args.time_limit, incumbent=best.to_layout())
+        print_exact(res)
+        best = res['placements']
     placed = len(best)
     print(f'Placed: {placed} item(s)')
     if max_items is not None:
@@ -256,16 +750,19 @@ def main():
     cols_est = int(box_w // item_w)
     rows_est = int(box_h // item_h)
     print(f'Estimate grid (no-rotation): {cols_est} x {rows_est} = {cols_est*rows_est}')
-    for i, (x, y, w, h) in enumerate(best[:50]):
+    for i, (x, y, w, h) in zip(range(50), best.rects() if isinstance(best, Layout) else iter(best)):
         print(f'{i+1:3d}: x={x:.2f}, y={y:.2f}, w={w:.2f}, h={h:.2f}')
+    # exports stream straight from the lazy layout
     if args.output_json:
-        export_json(args.output_json, box_w, box_h, [{'x':x,'y':y,'w':w,'h':h} for (x,y,w,h) in best])
+        export_json(args.output_json, box_w, box_h, best)
         print(f'Wrote JSON to {args.output_json}')
     if args.output_csv:
-        export_csv(args.output_csv, [{'x':x,'y':y,'w':w,'h':h} for (x,y,w,h) in best])
+        export_csv(args.output_csv, best)
         print(f'Wrote CSV to {args.output_csv}')
+    if args.output:
+        export_output(args.output, best, (box_w, box_h))
     if args.visualize:
-        visualize([{'x':x,'y':y,'w':w,'h':h,'type':0} for (x,y,w,h) in best], box_w, box_h, args.out)
+        visualize(best, box_w, box_h, args.out, args.image_width)
         print(f'Layout image written to {args.out}')
 
 
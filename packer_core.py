@@ -0,0 +1,2529 @@
+"""Solver core: placement storage, single-type layouts, the multi-item engines, problem
+reduction, the anytime optimizer, exact search, layout sessions and multi-box packing.
+
+Only cheap standard-library modules are imported up front so that a CLI call, a web worker
+or the one-file executable starts quickly; json, multiprocessing and numpy are imported by
+the functions that need them. I/O, the result cache, batch jobs and the command line live in
+packer, which re-exports everything here.
+"""
+import bisect
+import functools
+import heapq
+import math
+import operator
+import threading
+import time
+from array import array
+from collections import Counter
+from collections.abc import Mapping
+from fractions import Fraction
+from typing import TYPE_CHECKING, Callable, Iterator, List, Tuple, Optional, Dict, Union
+
+if TYPE_CHECKING:
+    from packer import PackCache
+
+Rect = Tuple[float, float, float, float]
+# progress(placed, passes) -> False to stop a solve early and keep what is placed so far
+Progress = Callable[[int, int], Optional[bool]]
+
+EPS = 1e-9
+PROGRESS_EVERY = 64
+
+# --- placement storage ---
+
+_np = False
+# below this many placements summing in Python beats importing numpy for one call
+NUMPY_MIN_ROWS = 1 << 16
+
+
+def _numpy():
+    """numpy if it is installed, else None (imported on first use)."""
+    global _np
+    if _np is False:
+        try:
+            import numpy
+            _np = numpy
+        except ImportError:
+            _np = None
+    return _np
+
+
+class Placement(Mapping):
+    """Read-only dict view of one row of a Layout: p['x'], p.get('type'), dict(p) all work."""
+
+    __slots__ = ('_layout', '_i')
+
+    def __init__(self, layout: 'Layout', i: int):
+        self._layout = layout
+        self._i = i
+
+    def __getitem__(self, key: str):
+        if key not in self._layout.fields:
+            raise KeyError(key)
+        return getattr(self._layout, key)[self._i]
+
+    def __iter__(self):
+        return iter(self._layout.fields)
+
+    def __len__(self) -> int:
+        return len(self._layout.fields)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class Layout:
+    """Placements stored as parallel typed arrays: x, y, w, h ('d'), type and, for multi-box
+    results, box ('i'). About 36 bytes per placement instead of a dict each. Iterating yields
+    Placement views, so code written for lists of dicts keeps working; rows(), rects() and
+    columns() give tuples or the arrays themselves without building any dicts."""
+
+    __slots__ = ('x', 'y', 'w', 'h', 'type', 'box')
+
+    def __init__(self, with_box: bool = False):
+        self.x = array('d')
+        self.y = array('d')
+        self.w = array('d')
+        self.h = array('d')
+        self.type = array('i')
+        self.box = array('i') if with_box else None
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        if self.box is not None:
+            return ('box', 'x', 'y', 'w', 'h', 'type')
+        return ('x', 'y', 'w', 'h', 'type')
+
+    @classmethod
+    def from_rects(cls, rects, type: int = 0) -> 'Layout':
+        layout = cls()
+        for x, y, w, h in rects:
+            layout.append(x, y, w, h, type)
+        return layout
+
+    @classmethod
+    def from_rows(cls, rows) -> 'Layout':
+        """Build from (x, y, w, h, type) or (x, y, w, h, type, box) tuples."""
+        layout = None
+        for r in rows:
+            if layout is None:
+                layout = cls(with_box=len(r) > 5)
+            layout.append(*r)
+        return layout if layout is not None else cls()
+
+    def append(self, x: float, y: float, w: float, h: float, type: int = 0, box: Optional[int] = None):
+        self.x.append(x)
+        self.y.append(y)
+        self.w.append(w)
+        self.h.append(h)
+        self.type.append(type)
+        if self.box is not None:
+            self.box.append(box)
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def __iter__(self):
+        for i in range(len(self.x)):
+            yield Placement(self, i)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            part = Layout(self.box is not None)
+            for name in self.fields:
+                getattr(part, name).extend(getattr(self, name)[i])
+            return part
+        if i < 0:
+            i += len(self.x)
+        if not 0 <= i < len(self.x):
+            raise IndexError('layout index out of range')
+        return Placement(self, i)
+
+    def __delitem__(self, i):
+        for name in self.fields:
+            del getattr(self, name)[i]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Layout):
+            return self.fields == other.fields and all(getattr(self, f) == getattr(other, f) for f in self.fields)
+        try:
+            return len(self) == len(other) and all(p == q for p, q in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self) -> str:
+        return f'Layout(count={len(self)})'
+
+    def rects(self):
+        return zip(self.x, self.y, self.w, self.h)
+
+    def rows(self):
+        if self.box is not None:
+            return zip(self.x, self.y, self.w, self.h, self.type, self.box)
+        return zip(self.x, self.y, self.w, self.h, self.type)
+
+    def columns(self) -> Dict[str, array]:
+        """The underlying arrays by field name (no copies)."""
+        return {name: getattr(self, name) for name in self.fields}
+
+    def to_dicts(self) -> List[Dict]:
+        names = self.fields
+        cols = [getattr(self, n) for n in names]
+        return [dict(zip(names, row)) for row in zip(*cols)]
+
+    def counts(self) -> Dict[int, int]:
+        return dict(Counter(self.type))
+
+    def area(self) -> float:
+        np = _numpy() if len(self.x) >= NUMPY_MIN_ROWS else None
+        if np is not None:
+            return float(np.dot(np.frombuffer(self.w), np.frombuffer(self.h)))
+        return math.fsum(map(operator.mul, self.w, self.h))
+
+    def utilization(self, box_w: float, box_h: float) -> float:
+        return self.area() / (box_w * box_h) if box_w > 0 and box_h > 0 else 0.0
+
+    def to_numpy(self):
+        """Zero-copy NumPy views of the columns (requires numpy)."""
+        np = _numpy()
+        if np is None:
+            raise ImportError('numpy is required for Layout.to_numpy')
+        return {name: np.frombuffer(col, dtype=np.float64 if col.typecode == 'd' else np.int32)
+                for name, col in self.columns().items()}
+
+
+def json_default(o):
+    """json.dump(default=...) hook so results holding a Layout serialize as lists of dicts."""
+    if isinstance(o, Layout):
+        return o.to_dicts()
+    if isinstance(o, BlockLayout):
+        return o.to_layout().to_dicts()
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+# --- instrumentation ---
+
+class Stats:
+    """Counters and per-phase wall time collected while stats are enabled (see enable_stats).
+    Counter names may carry labels in Prometheus notation, e.g. placements{type="0"}.
+    Phase times are inclusive: a phase that calls another counts the inner time too."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {}
+        self.phases: Dict[str, List[float]] = {}  # name -> [calls, seconds]
+
+    def incr(self, name: str, n: int = 1, **labels):
+        if labels:
+            name += '{' + ','.join(f'{k}="{v}"' for k, v in sorted(labels.items())) + '}'
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, phase: str, seconds: float, calls: int = 1):
+        with self._lock:
+            rec = self.phases.setdefault(phase, [0, 0.0])
+            rec[0] += calls
+            rec[1] += seconds
+
+    def merge(self, snapshot: Dict):
+        for name, n in snapshot.get('counters', {}).items():
+            self.incr(name, n)
+        for phase, rec in snapshot.get('phases', {}).items():
+            self.add_time(phase, rec['seconds'], rec['calls'])
+
+    def snapshot(self, reset: bool = False) -> Dict:
+        with self._lock:
+            snap = {
+                'counters': dict(sorted(self.counters.items())),
+                'phases': {k: {'calls': int(c), 'seconds': t} for k, (c, t) in sorted(self.phases.items())},
+            }
+            if reset:
+                self.counters = {}
+                self.phases = {}
+        return snap
+
+    def format(self) -> str:
+        snap = self.snapshot()
+        lines = ['Counters:']
+        lines += [f'  {name:<40} {n:>14}' for name, n in snap['counters'].items()]
+        lines.append('Phases:')
+        lines += [f"  {name:<28} {rec['calls']:>8} call(s) {rec['seconds'] * 1000:12.2f} ms"
+                  for name, rec in snap['phases'].items()]
+        return '\n'.join(lines)
+
+
+# the active Stats, or None when instrumentation is off (the default)
+_stats: Optional[Stats] = None
+
+
+def enable_stats(stats: Optional[Stats] = None) -> Stats:
+    global _stats
+    _stats = stats if stats is not None else Stats()
+    return _stats
+
+
+def disable_stats():
+    global _stats
+    _stats = None
+
+
+def current_stats() -> Optional[Stats]:
+    return _stats
+
+
+def timed(phase: str):
+    """Decorator recording the wall time of every call under `phase` while stats are enabled;
+    when they are off the only cost is one global lookup per call."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            stats = _stats
+            if stats is None:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                stats.add_time(phase, time.perf_counter() - t0)
+        return inner
+    return wrap
+
+
+def _count_placements(stats: Stats, layout: 'Layout'):
+    for t, n in layout.counts().items():
+        stats.incr('placements', n, type=t)
+
+
+def grid_pack(box_w: float, box_h: float, item_w: float, item_h: float, max_items: Optional[int] = None) -> List[Rect]:
+    cols = int(box_w // item_w)
+    rows = int(box_h // item_h)
+    placements: List[Rect] = []
+    for r in range(rows):
+        for c in range(cols):
+            if max_items is not None and len(placements) >= max_items:
+                return placements
+            x = c * item_w
+            y = r * item_h
+            placements.append((x, y, item_w, item_h))
+    return placements
+
+
+def greedy_row_pack(box_w: float, box_h: float, item_w: float, item_h: float, max_items: Optional[int] = None) -> List[Rect]:
+    placements: List[Rect] = []
+    y = 0.0
+    while y + min(item_h, item_w) <= box_h:
+        remaining_width = box_w
+        x = 0.0
+        while True:
+            if max_items is not None and len(placements) >= max_items:
+                return placements
+            placed = False
+            if item_w <= remaining_width and item_h <= (box_h - y):
+                placements.append((x, y, item_w, item_h))
+                x += item_w
+                remaining_width -= item_w
+                placed = True
+            elif item_h <= remaining_width and item_w <= (box_h - y):
+                placements.append((x, y, item_h, item_w))
+                x += item_h
+                remaining_width -= item_h
+                placed = True
+            if not placed:
+                break
+        y += item_h
+        if max_items is not None and len(placements) >= max_items:
+            break
+    return placements
+
+
+# --- closed-form single-type layouts ---
+# A single-type layout is described by a few homogeneous grid blocks, each a tuple
+# (x, y, cols, rows, w, h). Counts are computed arithmetically from the block sizes and the
+# individual placements are only generated when somebody iterates over the layout.
+
+Block = Tuple[float, float, int, int, float, float]
+
+# how many split positions at each end of a range the multi-block searches try
+SPLIT_WINDOW = 32
+# largest number of cut positions per axis for which the four-block pinwheel search runs
+PINWHEEL_LIMIT = 48
+# pinwheel searches remembered per process, keyed on the box and the item's sides
+PINWHEEL_CACHE = 4096
+
+
+def _fit(length: float, size: float) -> int:
+    if size <= 0 or length < size - EPS:
+        return 0
+    return int((length + EPS) // size)
+
+
+def _uniform(w: float, h: float, a: float, b: float) -> int:
+    return max(_fit(w, a) * _fit(h, b), _fit(w, b) * _fit(h, a))
+
+
+def _grid_block(x: float, y: float, w: float, h: float, a: float, b: float) -> Block:
+    up = (_fit(w, a), _fit(h, b))
+    rot = (_fit(w, b), _fit(h, a))
+    if rot[0] * rot[1] > up[0] * up[1]:
+        return (x, y, rot[0], rot[1], b, a)
+    return (x, y, up[0], up[1], a, b)
+
+
+def _transpose(blocks: List[Block]) -> List[Block]:
+    return [(y, x, rows, cols, h, w) for (x, y, cols, rows, w, h) in blocks]
+
+
+def _offset(blocks: List[Block], dx: float, dy: float) -> List[Block]:
+    return [(x + dx, y + dy, cols, rows, w, h) for (x, y, cols, rows, w, h) in blocks]
+
+
+def _window(n: int, window: Optional[int]):
+    if window is None or n <= 2 * window:
+        return range(1, n + 1)
+    return list(range(1, window + 1)) + list(range(n - window + 1, n + 1))
+
+
+def _band_split(W: float, H: float, a: float, b: float, window: Optional[int] = None):
+    """Best layout made of k full-width rows of one orientation above a uniform block.
+    Returns (count, (p, q, k)) with k == 0 meaning a single uniform block."""
+    best = (_uniform(W, H, a, b), (a, b, 0))
+    for p, q in ((a, b), (b, a)):
+        cols = _fit(W, p)
+        if cols == 0:
+            continue
+        for k in _window(_fit(H, q), window):
+            c = cols * k + _uniform(W, H - k * q, a, b)
+            if c > best[0]:
+                best = (c, (p, q, k))
+    return best
+
+
+def _band_blocks(W: float, H: float, a: float, b: float, params) -> List[Block]:
+    p, q, k = params
+    if k == 0:
+        return [_grid_block(0.0, 0.0, W, H, a, b)]
+    return [(0.0, 0.0, _fit(W, p), k, p, q), _grid_block(0.0, k * q, W, H - k * q, a, b)]
+
+
+def _three_block_split(W: float, H: float, a: float, b: float, window: int):
+    """k full-width rows of one orientation above a region split into columns
+    (a two-block vertical split). Returns (count, (p, q, k, inner_params))."""
+    best = (-1, None)
+    for p, q in ((a, b), (b, a)):
+        cols = _fit(W, p)
+        if cols == 0:
+            continue
+        for k in _window(_fit(H, q), window):
+            rest = H - k * q
+            # columns of the remaining region are rows of the transposed region
+            inner = _band_split(rest, W, a, b, window)
+            c = cols * k + inner[0]
+            if c > best[0]:
+                best = (c, (p, q, k, inner[1]))
+    return best
+
+
+def _three_block_blocks(W: float, H: float, a: float, b: float, params) -> List[Block]:
+    p, q, k, inner = params
+    rest = _transpose(_band_blocks(H - k * q, W, a, b, inner))
+    return [(0.0, 0.0, _fit(W, p), k, p, q)] + _offset(rest, 0.0, k * q)
+
+
+def _cuts(L: float, a: float, b: float) -> List[float]:
+    cuts = set()
+    for s in (a, b):
+        for i in range(_fit(L, s) + 1):
+            cuts.add(round(i * s, 9))
+            cuts.add(round(L - i * s, 9))
+    return sorted(c for c in cuts if 0 <= c <= L)
+
+
+def _pinwheel(W: float, H: float, a: float, b: float):
+    """Four-block (Smith-de Cani style) pinwheel: blocks [0,x1]x[0,y1], [x1,W]x[0,y2],
+    [x3,W]x[y2,H] and [0,x3]x[y1,H] with x1 <= x3 and y2 <= y1, each a uniform grid.
+    The mirrored pinwheel has the same counts, so one handedness is enough. The search does
+    not depend on the order of a and b, so it is cached with the longer side first."""
+    return _pinwheel_search(W, H, max(a, b), min(a, b))
+
+
+@functools.lru_cache(maxsize=PINWHEEL_CACHE)
+def _pinwheel_search(W: float, H: float, a: float, b: float):
+    if _fit(W, a) + _fit(W, b) > PINWHEEL_LIMIT or _fit(H, a) + _fit(H, b) > PINWHEEL_LIMIT:
+        return (-1, None)
+    xs = _cuts(W, a, b)
+    ys = _cuts(H, a, b)
+    # grid counts of the four blocks per (x cut, y cut), so the cubic loop only adds
+    below_right = [[_uniform(W - x, y, a, b) for y in ys] for x in xs]
+    above_right = [[_uniform(W - x, H - y, a, b) for y in ys] for x in xs]
+    below_left = [[_uniform(x, y, a, b) for y in ys] for x in xs]
+    above_left = [[_uniform(x, H - y, a, b) for y in ys] for x in xs]
+    best = (-1, None)
+    for i, x1 in enumerate(xs):
+        lower1, upper1 = below_right[i], below_left[i]
+        for j in range(i, len(xs)):
+            lower3, upper3 = above_right[j], above_left[j]
+            run_best = -1
+            run_y2 = 0.0
+            for k, y in enumerate(ys):
+                lower = lower1[k] + lower3[k]
+                if lower > run_best:
+                    run_best = lower
+                    run_y2 = y
+                c = upper1[k] + upper3[k] + run_best
+                if c > best[0]:
+                    best = (c, (x1, xs[j], y, run_y2))
+    return best
+
+
+def _pinwheel_blocks(W: float, H: float, a: float, b: float, params) -> List[Block]:
+    x1, x3, y1, y2 = params
+    return [_grid_block(0.0, 0.0, x1, y1, a, b), _grid_block(x1, 0.0, W - x1, y2, a, b),
+            _grid_block(x3, y2, W - x3, H - y2, a, b), _grid_block(0.0, y1, x3, H - y1, a, b)]
+
+
+class BlockLayout:
+    """Single-type layout kept as grid blocks. Acts as a read-only sequence of (x, y, w, h)
+    tuples; len() is arithmetic and placements are produced on iteration or indexing."""
+
+    __slots__ = ('box_w', 'box_h', 'blocks', 'capacity', 'max_items')
+
+    def __init__(self, box_w: float, box_h: float, blocks: List[Block], max_items: Optional[int] = None):
+        self.box_w = box_w
+        self.box_h = box_h
+        self.blocks = [b for b in blocks if b[2] > 0 and b[3] > 0]
+        self.capacity = sum(b[2] * b[3] for b in self.blocks)
+        self.max_items = max_items
+
+    def __len__(self) -> int:
+        if self.max_items is not None:
+            return max(0, min(self.capacity, self.max_items))
+        return self.capacity
+
+    def __iter__(self):
+        left = len(self)
+        for x, y, cols, rows, w, h in self.blocks:
+            for r in range(rows):
+                for c in range(cols):
+                    if left <= 0:
+                        return
+                    left -= 1
+                    yield (x + c * w, y + r * h, w, h)
+
+    def _at(self, i: int) -> Rect:
+        for x, y, cols, rows, w, h in self.blocks:
+            n = cols * rows
+            if i < n:
+                r, c = divmod(i, cols)
+                return (x + c * w, y + r * h, w, h)
+            i -= n
+        raise IndexError('layout index out of range')
+
+    def __getitem__(self, i):
+        n = len(self)
+        if isinstance(i, slice):
+            return [self._at(k) for k in range(n)[i]]
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError('layout index out of range')
+        return self._at(i)
+
+    def to_layout(self, type: int = 0) -> 'Layout':
+        return Layout.from_rects(self, type)
+
+    def __repr__(self) -> str:
+        return f'BlockLayout(box=({self.box_w}, {self.box_h}), count={len(self)}, blocks={len(self.blocks)})'
+
+
+@timed('solve.single_type')
+def solve_single_type(box_w: float, box_h: float, item_w: float, item_h: float) -> BlockLayout:
+    """Count-first single-type solver. Tries uniform grids, two-block splits in both directions
+    (every split position), three-block guillotine splits and four-block pinwheels (split
+    positions near the ends of each range), and keeps the first layout with the highest count.
+    The costlier searches are skipped once a layout reaches the area bound. The box and the item
+    are solved longer side first, so every rotation of a request gets the same layout."""
+    W, H = float(box_w), float(box_h)
+    if H > W:
+        return BlockLayout(W, H, _transpose(_single_type_blocks(H, W, item_w, item_h)))
+    return BlockLayout(W, H, _single_type_blocks(W, H, item_w, item_h))
+
+
+def _single_type_blocks(W: float, H: float, item_w: float, item_h: float) -> List[Block]:
+    # solve_single_type for a box with W >= H
+    a, b = max(float(item_w), float(item_h)), min(float(item_w), float(item_h))
+    best_count = _uniform(W, H, a, b)
+    best_blocks = lambda: [_grid_block(0.0, 0.0, W, H, a, b)]
+    if a == b:
+        # square items: nothing beats the grid
+        return best_blocks()
+    count, params = _band_split(W, H, a, b)
+    if count > best_count:
+        best_count, best_blocks = count, lambda p=params: _band_blocks(W, H, a, b, p)
+    count, params = _band_split(H, W, a, b)
+    if count > best_count:
+        best_count, best_blocks = count, lambda p=params: _transpose(_band_blocks(H, W, a, b, p))
+    # no layout holds more than the area bound, which allows for the EPS tolerance of _fit and
+    # for rounding of the division (as capacity.solve_counts does)
+    bound = math.floor((W + 4 * EPS) * (H + 4 * EPS) / (a * b) * (1 + 1e-12)) if a > 0 and b > 0 else 0
+    if best_count < bound:
+        count, params = _three_block_split(W, H, a, b, SPLIT_WINDOW)
+        if count > best_count:
+            best_count, best_blocks = count, lambda p=params: _three_block_blocks(W, H, a, b, p)
+        count, params = _three_block_split(H, W, a, b, SPLIT_WINDOW)
+        if count > best_count:
+            best_count, best_blocks = count, lambda p=params: _transpose(_three_block_blocks(H, W, a, b, p))
+    if best_count < bound:
+        count, params = _pinwheel(W, H, a, b)
+        if count > best_count:
+            best_count, best_blocks = count, lambda p=params: _pinwheel_blocks(W, H, a, b, p)
+    return best_blocks()
+
+
+def best_layout(box_w: float, box_h: float, item_w: float, item_h: float, max_items: Optional[int] = None,
+                cache: Optional['PackCache'] = None) -> BlockLayout:
+    """Best single-type layout as a lazy BlockLayout, truncated to max_items placements.
+    With a cache, the solve is shared by every rotation of the box and of the item. When only
+    the count is needed, best_count can answer it from a precomputed capacity table."""
+    if cache is None:
+        layout = solve_single_type(box_w, box_h, item_w, item_h)
+    else:
+        layout = _cached_single_type(cache, box_w, box_h, item_w, item_h)
+    layout.max_items = max_items
+    if _stats is not None:
+        _stats.incr('placements', len(layout), type=0)
+    return layout
+
+
+def best_count(box_w: float, box_h: float, item_w: float, item_h: float, max_items: Optional[int] = None,
+               cache: Optional['PackCache'] = None, capacity=None) -> int:
+    """len(best_layout(...)) for count-only queries. With a capacity.CapacityTable listing the
+    box and the item (in any orientation) the count is an O(1) lookup and nothing is solved."""
+    count = capacity.lookup(box_w, box_h, item_w, item_h) if capacity is not None else None
+    if count is None:
+        return len(best_layout(box_w, box_h, item_w, item_h, max_items, cache))
+    if _stats is not None:
+        _stats.incr('capacity_hits')
+    return count if max_items is None else max(0, min(count, max_items))
+
+
+# --- multi-item support helpers ---
+
+def rects_overlap(a: Rect, b: Rect) -> bool:
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    return not (ax + aw <= bx or bx + bw <= ax or ay + ah <= by or by + bh <= ay)
+
+
+class SpatialIndex:
+    """Uniform grid bucket index over placed rectangles.
+    Each rectangle is registered in every cell it touches, so an overlap query only
+    compares against rectangles sharing a cell with the query instead of every placement."""
+
+    def __init__(self, cell: float = 1.0):
+        self.cell = float(cell) if cell > 0 else 1.0
+        self.buckets: Dict[Tuple[int, int], List[Rect]] = {}
+        self.count = 0
+        self.queries = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _cells(self, r: Rect):
+        x, y, w, h = r
+        c = self.cell
+        for cy in range(int(y // c), int((y + h) // c) + 1):
+            for cx in range(int(x // c), int((x + w) // c) + 1):
+                yield (cx, cy)
+
+    def insert(self, r: Rect):
+        for key in self._cells(r):
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                self.buckets[key] = [r]
+            else:
+                bucket.append(r)
+        self.count += 1
+
+    def overlaps(self, r: Rect) -> bool:
+        self.queries += 1
+        for key in self._cells(r):
+            for p in self.buckets.get(key, ()):
+                if rects_overlap(r, p):
+                    return True
+        return False
+
+    def blocking(self, r: Rect) -> Optional[Rect]:
+        """Return the overlapping rectangle reaching furthest right, or None if r is free."""
+        self.queries += 1
+        x, y, w, h = r
+        x2 = x + w; y2 = y + h
+        c = self.cell
+        best = None
+        best_right = 0.0
+        buckets = self.buckets
+        for cy in range(int(y // c), int(y2 // c) + 1):
+            for cx in range(int(x // c), int(x2 // c) + 1):
+                bucket = buckets.get((cx, cy))
+                if not bucket:
+                    continue
+                for p in bucket:
+                    px, py, pw, ph = p
+                    if px < x2 and x < px + pw and py < y2 and y < py + ph and (best is None or px + pw > best_right):
+                        best = p
+                        best_right = px + pw
+        return best
+
+
+def can_place(x: float, y: float, w: float, h: float, box_w: float, box_h: float, placed: Union[List[Rect], SpatialIndex]) -> bool:
+    if x + w > box_w or y + h > box_h:
+        return False
+    r = (x, y, w, h)
+    if isinstance(placed, SpatialIndex):
+        return not placed.overlaps(r)
+    for p in placed:
+        if rects_overlap(r, p):
+            return False
+    return True
+
+
+def _blocked_until(x: float, y: float, w: float, h: float, box_w: float, box_h: float, index: SpatialIndex) -> Optional[float]:
+    """None if (x, y, w, h) can be placed, otherwise the first x at which it might fit on this row
+    (infinity when it runs past the box edge)."""
+    if x + w > box_w or y + h > box_h:
+        return math.inf
+    b = index.blocking((x, y, w, h))
+    if b is None:
+        return None
+    return b[0] + b[2]
+
+
+# --- layout validation ---
+
+VALIDATION_ISSUES = 100
+
+
+def _columns(placements) -> Tuple[list, list, list, list, list]:
+    """x, y, w, h and type lists of a Layout, BlockLayout, or placement dicts/tuples."""
+    if isinstance(placements, Layout):
+        return (list(placements.x), list(placements.y), list(placements.w), list(placements.h),
+                list(placements.type))
+    rows = [(p['x'], p['y'], p['w'], p['h'], p.get('type', 0)) if isinstance(p, Mapping) else (tuple(p) + (0,))[:5]
+            for p in placements]
+    if not rows:
+        return [], [], [], [], []
+    return tuple(list(map(float, c)) if i < 4 else [int(v) for v in c] for i, c in enumerate(zip(*rows)))
+
+
+def _overlapping_pairs(xs: list, ys: list, ws: list, hs: list, tol: float) -> Iterator[Tuple[int, int]]:
+    """Pairs (i, j) of rectangles sharing more than `tol` in both directions. A sweep over x
+    keeps the open rectangles in lists ordered by y, one per height class (heights within a
+    factor of two), so a query only looks as far down as the tallest of each class reaches and
+    one tall rectangle does not widen every query. In a packed layout that is a few candidates
+    per class and query; adding and removing shift one open list, which holds about one
+    column of rectangles, so the sweep is near n log n for such layouts."""
+    order = sorted(range(len(xs)), key=xs.__getitem__)
+    classes: Dict[int, list] = {}  # height class -> [(y, index) of open rectangles, tallest ever]
+    ends: List[Tuple[float, int]] = []  # (right edge, index) heap of the open rectangles
+    for i in order:
+        x, y = xs[i], ys[i]
+        while ends and ends[0][0] <= x + tol:
+            _, j = heapq.heappop(ends)
+            active = classes[math.frexp(hs[j])[1]][0]
+            del active[bisect.bisect_left(active, (ys[j], j))]
+        top = y + hs[i] - tol
+        for active, tallest in classes.values():
+            lo = bisect.bisect_left(active, (y - tallest + tol, -1))
+            hi = bisect.bisect_left(active, (top, -1))
+            for yj, j in active[lo:hi]:
+                if yj + hs[j] > y + tol:
+                    yield (j, i) if j < i else (i, j)
+        cls = classes.get(math.frexp(hs[i])[1])
+        if cls is None:
+            cls = classes[math.frexp(hs[i])[1]] = [[], hs[i]]
+        elif hs[i] > cls[1]:
+            cls[1] = hs[i]
+        bisect.insort(cls[0], (y, i))
+        heapq.heappush(ends, (x + ws[i], i))
+
+
+def validate_layout(box_w: float, box_h: float, placements, items: Optional[List[Dict]] = None,
+                    rotate: bool = True, tol: float = EPS, max_issues: int = VALIDATION_ISSUES) -> Dict:
+    """Check a single-box layout: every placement inside the box with a positive size, no two
+    overlapping (touching edges are fine), and with items given, known types whose placements
+    match the item's w x h (or h x w when rotate) and do not exceed its count.
+    Returns {'valid', 'count', 'counts', 'errors', 'issues'}: placements per type, the number
+    of problems per kind ('bounds', 'size', 'type', 'count', 'overlap') and the first
+    `max_issues` of them, each naming its placement indices ('placement' or 'pair')."""
+    return _validate(placements, [(box_w, box_h)], None, items, rotate, tol, max_issues)
+
+
+def validate_bins(boxes: List[Tuple[float, float]], placements: Layout, items: Optional[List[Dict]] = None,
+                  rotate: bool = True, tol: float = EPS, max_issues: int = VALIDATION_ISSUES) -> Dict:
+    """Check a fleet layout whose rows carry their box index (see pack_bins) against boxes, the
+    (w, h) of each box by index: every placement inside its own box, no two overlapping within
+    a box, and item sizes and counts over the whole fleet. A placement in a box that is not
+    listed is a 'box' problem. Returns the same report as validate_layout."""
+    if placements.box is None:
+        raise ValueError('the placements carry no box index')
+    return _validate(placements, [(float(w), float(h)) for w, h in boxes], placements.box, items, rotate, tol, max_issues)
+
+
+def _validate(placements, boxes: List[Tuple[float, float]], bins, items: Optional[List[Dict]], rotate: bool,
+              tol: float, max_issues: int) -> Dict:
+    # validate_layout with every placement in boxes[0] (bins None) or in boxes[bins[i]]
+    xs, ys, ws, hs, types = _columns(placements)
+    errors: Counter = Counter()
+    issues: List[Dict] = []
+    groups: Dict[int, List[int]] = {}
+
+    def report(kind: str, **where):
+        errors[kind] += 1
+        if len(issues) < max_issues:
+            issues.append({'kind': kind, **where})
+
+    box_w, box_h = boxes[0] if bins is None else (None, None)
+    for i in range(len(xs)):
+        x, y, w, h = xs[i], ys[i], ws[i], hs[i]
+        if bins is not None and not 0 <= bins[i] < len(boxes):
+            report('box', placement=i, box=bins[i])
+        else:
+            if bins is not None:
+                box_w, box_h = boxes[bins[i]]
+                groups.setdefault(bins[i], []).append(i)
+            if not (w > 0 and h > 0 and x >= -tol and y >= -tol and x + w <= box_w + tol and y + h <= box_h + tol):
+                report('bounds', placement=i)
+        t = types[i]
+        if items is not None:
+            if not 0 <= t < len(items):
+                report('type', placement=i, type=t)
+                continue
+            iw, ih = float(items[t]['w']), float(items[t]['h'])
+            fits = abs(w - iw) <= tol and abs(h - ih) <= tol
+            if not fits and rotate:
+                fits = abs(w - ih) <= tol and abs(h - iw) <= tol
+            if not fits:
+                report('size', placement=i, type=t)
+    counts = Counter(types)
+    if items is not None:
+        for t, it in enumerate(items):
+            cnt = it.get('count', 1)
+            if cnt is not None and int(cnt) > 0 and counts.get(t, 0) > int(cnt):
+                report('count', type=t, placed=counts[t], count=int(cnt))
+    if bins is None:
+        for i, j in _overlapping_pairs(xs, ys, ws, hs, tol):
+            report('overlap', pair=[i, j])
+    for idx in groups.values():
+        sub = [[col[i] for i in idx] for col in (xs, ys, ws, hs)]
+        for i, j in _overlapping_pairs(*sub, tol):
+            report('overlap', pair=[idx[i], idx[j]])
+    if _stats is not None:
+        _stats.incr('validations')
+    return {'valid': not errors, 'count': len(xs), 'counts': dict(sorted(counts.items())),
+            'errors': dict(errors), 'issues': issues}
+
+
+def _item_types(items: List[Dict]) -> List[Dict]:
+    """Normalize item dicts into mutable type records sorted by area descending."""
+    # Build types list with counts; count=None means unlimited
+    types = []
+    for i, it in enumerate(items):
+        cnt = it.get('count', 1)
+        if cnt is None or (isinstance(cnt, int) and cnt == 0) or (isinstance(cnt, str) and int(cnt) == 0):
+            cnt = None
+        else:
+            cnt = int(cnt)
+        types.append({'w': float(it['w']), 'h': float(it['h']), 'count': cnt, 'type': i})
+    # sort types by area descending
+    types.sort(key=lambda x: x['w'] * x['h'], reverse=True)
+    return types
+
+
+@timed('pack.greedy')
+def pack_multiple_items(box_w: float, box_h: float, items: List[Dict], progress: Optional[Progress] = None) -> Layout:
+    """Pack multiple item types. Items: list of dicts {'w','h','count','id'(optional)}
+    Returns a Layout of placements with fields x,y,w,h,type
+    Greedy multi-pass placement: place largest-first repeatedly until no more placements are possible.
+    Count==0 or None means unlimited supply for that type.
+    Only normal positions (sums of item sides) are tried, see _lattice. Occupancy is tracked
+    in a SpatialIndex; when both orientations are blocked the scan jumps past the blocking
+    rectangles, which never skips a position that could have been used.
+    progress(placed, passes) is called once per scanned row; when it returns False the scan
+    stops and the placements so far are returned."""
+    types = _item_types(items)
+
+    placements = Layout()
+    sides = [s for t in types for s in (t['w'], t['h'])]
+    xs = _lattice(box_w, sides)
+    ys = _lattice(box_h, sides)
+    # buckets roughly the size of the largest item keep each query to a handful of cells
+    index = SpatialIndex(max([1.0] + sides))
+    # A type whose scan ran through every lattice point with supply left cannot fit anywhere
+    # later either (occupancy only grows), so later passes skip it.
+    settled = set()
+    passes = tried = 0
+    stopped = False
+    # Keep placing until a full pass yields no placements
+    while not stopped:
+        passes += 1
+        placed_in_pass = 0
+        for t in types:
+            if t['count'] is not None and t['count'] <= 0:
+                continue
+            if t['type'] in settled:
+                continue
+            w = t['w']; h = t['h']
+            for y in ys:
+                if y + min(w, h) > box_h:
+                    break
+                if progress is not None and progress(len(placements), passes) is False:
+                    stopped = True
+                    break
+                i = 0
+                while i < len(xs):
+                    if t['count'] is not None and t['count'] <= 0:
+                        break
+                    x = xs[i]
+                    tried += 1
+                    upright = _blocked_until(x, y, w, h, box_w, box_h, index)
+                    rotated = None if upright is None else _blocked_until(x, y, h, w, box_w, box_h, index)
+                    if upright is not None and rotated is not None:
+                        nxt = min(upright, rotated)
+                        if nxt == math.inf:
+                            break
+                        i = max(i + 1, bisect.bisect_left(xs, nxt - EPS))
+                        continue
+                    pw, ph = (w, h) if upright is None else (h, w)
+                    index.insert((x, y, pw, ph))
+                    placements.append(x, y, pw, ph, t['type'])
+                    placed_in_pass += 1
+                    if t['count'] is not None:
+                        t['count'] -= 1
+                    i += 1
+            if stopped:
+                break
+            if t['count'] is None or t['count'] > 0:
+                settled.add(t['type'])
+        if placed_in_pass == 0:
+            break
+    stats = _stats
+    if stats is not None:
+        stats.incr('passes', passes)
+        stats.incr('candidates', tried)
+        stats.incr('overlap_checks', index.queries)
+        _count_placements(stats, placements)
+    return placements
+
+
+# --- candidate-point engines ---
+# Each engine keeps its own free-space structure and only tests positions taken from it,
+# so run time depends on the number of placements rather than on the box area.
+
+
+def _contains(a: Rect, b: Rect) -> bool:
+    return (b[0] >= a[0] - EPS and b[1] >= a[1] - EPS
+            and b[0] + b[2] <= a[0] + a[2] + EPS and b[1] + b[3] <= a[1] + a[3] + EPS)
+
+
+class MaxRectsPacker:
+    """MaxRects with best-short-side-fit: the free space is kept as the list of maximal
+    free rectangles and an item goes into the one leaving the smallest leftover side."""
+
+    def __init__(self, box_w: float, box_h: float):
+        self.box_w = box_w
+        self.box_h = box_h
+        self.free: List[Rect] = [(0.0, 0.0, float(box_w), float(box_h))] if box_w > 0 and box_h > 0 else []
+
+    def __len__(self) -> int:
+        """Number of free regions find() looks at (each in both orientations)."""
+        return len(self.free)
+
+    def find(self, w: float, h: float, rotate: bool = True):
+        """Return (score, rect, ctx) for the best position of a w x h item, or None.
+        The item is also tried turned by 90 degrees unless rotate is False."""
+        best = None
+        shapes = ((w, h), (h, w)) if rotate else ((w, h),)
+        for fx, fy, fw, fh in self.free:
+            for pw, ph in shapes:
+                if pw <= fw + EPS and ph <= fh + EPS:
+                    lw = fw - pw
+                    lh = fh - ph
+                    score = (min(lw, lh), max(lw, lh), fy, fx)
+                    if best is None or score < best[0]:
+                        best = (score, (fx, fy, pw, ph), None)
+        return best
+
+    def place(self, r: Rect, ctx=None):
+        rx, ry, rw, rh = r
+        split: List[Rect] = []
+        kept: List[Rect] = []
+        for f in self.free:
+            if not rects_overlap(f, r):
+                kept.append(f)
+                continue
+            fx, fy, fw, fh = f
+            if rx > fx + EPS:
+                split.append((fx, fy, rx - fx, fh))
+            if rx + rw < fx + fw - EPS:
+                split.append((rx + rw, fy, fx + fw - rx - rw, fh))
+            if ry > fy + EPS:
+                split.append((fx, fy, fw, ry - fy))
+            if ry + rh < fy + fh - EPS:
+                split.append((fx, ry + rh, fw, fy + fh - ry - rh))
+        # only the freshly split rectangles can be redundant
+        pruned = []
+        for i, a in enumerate(split):
+            if any(_contains(b, a) for b in kept):
+                continue
+            if any(_contains(b, a) and (not _contains(a, b) or j < i) for j, b in enumerate(split) if j != i):
+                continue
+            pruned.append(a)
+        self.free = kept + pruned
+
+    def _merge(self, added: List[Rect]):
+        # keep the new rectangles no other free rectangle contains, drop the ones they contain
+        fresh = []
+        for i, a in enumerate(added):
+            if any(_contains(b, a) for b in self.free):
+                continue
+            if any(_contains(b, a) and (not _contains(a, b) or j < i) for j, b in enumerate(added) if j != i):
+                continue
+            fresh.append(a)
+        if fresh:
+            self.free = [f for f in self.free if not any(_contains(a, f) for a in fresh)] + fresh
+
+    def release(self, r: Rect):
+        """Return a placed rectangle to the free space. It is joined with the free neighbours
+        sharing an edge with it, which keeps the update local; the free list then still only
+        holds free space but is no longer guaranteed to consist of maximal rectangles."""
+        rx, ry, rw, rh = r
+        added = [r]
+        for fx, fy, fw, fh in self.free:
+            # overlap of the two spans along the shared edge
+            ox0, ox1 = max(fx, rx), min(fx + fw, rx + rw)
+            oy0, oy1 = max(fy, ry), min(fy + fh, ry + rh)
+            if ox1 - ox0 > EPS and (abs(fy + fh - ry) <= EPS or abs(ry + rh - fy) <= EPS):
+                added.append((ox0, min(fy, ry), ox1 - ox0, fh + rh))
+            if oy1 - oy0 > EPS and (abs(fx + fw - rx) <= EPS or abs(rx + rw - fx) <= EPS):
+                added.append((min(fx, rx), oy0, fw + rw, oy1 - oy0))
+        self._merge(added)
+
+    def resize(self, box_w: float, box_h: float):
+        """Change the box size. Free rectangles are clipped to a smaller box; ones touching the
+        old right or bottom edge grow into a larger one, plus the new strips themselves.
+        Placements outside the new box must be released first."""
+        old_w, old_h = self.box_w, self.box_h
+        free = []
+        for fx, fy, fw, fh in self.free:
+            x1, y1 = min(fx + fw, box_w), min(fy + fh, box_h)
+            # the area beyond the old box is empty, so touching edges extend to the new one
+            if box_w > old_w and fx + fw >= old_w - EPS:
+                x1 = box_w
+            if box_h > old_h and fy + fh >= old_h - EPS:
+                y1 = box_h
+            if x1 - fx > EPS and y1 - fy > EPS:
+                free.append((fx, fy, x1 - fx, y1 - fy))
+        self.free = free
+        self.box_w, self.box_h = box_w, box_h
+        strips = []
+        if box_w > old_w + EPS:
+            strips.append((old_w, 0.0, box_w - old_w, box_h))
+        if box_h > old_h + EPS:
+            strips.append((0.0, old_h, box_w, box_h - old_h))
+        self._merge(strips)
+
+
+class SkylinePacker:
+    """Skyline bottom-left: the packed area is summarized by its upper contour and an item
+    goes where its top edge ends up lowest, ties broken by the leftmost position."""
+
+    def __init__(self, box_w: float, box_h: float):
+        self.box_w = box_w
+        self.box_h = box_h
+        # segments (x, y, width) of the contour, left to right
+        self.skyline: List[Tuple[float, float, float]] = [(0.0, 0.0, float(box_w))]
+
+    def __len__(self) -> int:
+        return len(self.skyline)
+
+    def _fit(self, i: int, w: float, h: float) -> Optional[float]:
+        sky = self.skyline
+        x = sky[i][0]
+        if x + w > self.box_w + EPS:
+            return None
+        y = 0.0
+        left = w
+        j = i
+        while left > EPS:
+            if j >= len(sky):
+                return None
+            y = max(y, sky[j][1])
+            if y + h > self.box_h + EPS:
+                return None
+            left -= sky[j][2]
+            j += 1
+        return y
+
+    def find(self, w: float, h: float, rotate: bool = True):
+        best = None
+        shapes = ((w, h), (h, w)) if rotate else ((w, h),)
+        for i in range(len(self.skyline)):
+            for pw, ph in shapes:
+                y = self._fit(i, pw, ph)
+                if y is None:
+                    continue
+                score = (y + ph, self.skyline[i][0])
+                if best is None or score < best[0]:
+                    best = (score, (self.skyline[i][0], y, pw, ph), i)
+        return best
+
+    def place(self, r: Rect, ctx: int = 0):
+        x, y, w, h = r
+        end = x + w
+        out = self.skyline[:ctx]
+        out.append((x, y + h, w))
+        for sx, sy, sw in self.skyline[ctx:]:
+            if sx + sw <= end + EPS:
+                continue
+            if sx < end:
+                sw = sx + sw - end
+                sx = end
+            out.append((sx, sy, sw))
+        merged = [out[0]]
+        for seg in out[1:]:
+            px, py, pw = merged[-1]
+            if abs(py - seg[1]) <= EPS:
+                merged[-1] = (px, py, pw + seg[2])
+            else:
+                merged.append(seg)
+        self.skyline = merged
+
+
+class GuillotinePacker:
+    """Guillotine packer: free space is a set of disjoint rectangles, an item goes into the
+    best-area-fit rectangle and the remainder is cut along the shorter leftover axis."""
+
+    def __init__(self, box_w: float, box_h: float):
+        self.box_w = box_w
+        self.box_h = box_h
+        self.free: List[Rect] = [(0.0, 0.0, float(box_w), float(box_h))] if box_w > 0 and box_h > 0 else []
+
+    def __len__(self) -> int:
+        return len(self.free)
+
+    def find(self, w: float, h: float, rotate: bool = True):
+        best = None
+        shapes = ((w, h), (h, w)) if rotate else ((w, h),)
+        for i, (fx, fy, fw, fh) in enumerate(self.free):
+            for pw, ph in shapes:
+                if pw <= fw + EPS and ph <= fh + EPS:
+                    score = (fw * fh - pw * ph, min(fw - pw, fh - ph), fy, fx)
+                    if best is None or score < best[0]:
+                        best = (score, (fx, fy, pw, ph), i)
+        return best
+
+    def place(self, r: Rect, ctx: int = 0):
+        fx, fy, fw, fh = self.free.pop(ctx)
+        _, _, w, h = r
+        lw = fw - w
+        lh = fh - h
+        if lw <= lh:
+            right = (fx + w, fy, lw, h)
+            bottom = (fx, fy + h, fw, lh)
+        else:
+            right = (fx + w, fy, lw, fh)
+            bottom = (fx, fy + h, w, lh)
+        for piece in (right, bottom):
+            if piece[2] > EPS and piece[3] > EPS:
+                self._add(piece)
+
+    def _add(self, r: Rect):
+        # merge with a neighbour sharing a full edge, repeating while the result keeps growing
+        merged = True
+        while merged:
+            merged = False
+            x, y, w, h = r
+            for i, (fx, fy, fw, fh) in enumerate(self.free):
+                if abs(fy - y) <= EPS and abs(fh - h) <= EPS and (abs(fx + fw - x) <= EPS or abs(x + w - fx) <= EPS):
+                    r = (min(x, fx), y, w + fw, h)
+                elif abs(fx - x) <= EPS and abs(fw - w) <= EPS and (abs(fy + fh - y) <= EPS or abs(y + h - fy) <= EPS):
+                    r = (x, min(y, fy), w, h + fh)
+                else:
+                    continue
+                del self.free[i]
+                merged = True
+                break
+        self.free.append(r)
+
+
+def _engine_pack(packer, items: List[Dict], progress: Optional[Progress] = None) -> Layout:
+    """Largest-first placement of every unit through a candidate-point engine.
+    progress(placed, 1) is called every PROGRESS_EVERY placements; False stops the packing."""
+    placements = Layout()
+    stats = _stats
+    tried = 0
+    stopped = False
+    for t in _item_types(items):
+        while not stopped and (t['count'] is None or t['count'] > 0):
+            if progress is not None and len(placements) % PROGRESS_EVERY == 0 and progress(len(placements), 1) is False:
+                stopped = True
+                break
+            if stats is not None:
+                tried += 2 * len(packer)
+            found = packer.find(t['w'], t['h'])
+            if found is None:
+                break
+            _, (x, y, w, h), ctx = found
+            packer.place((x, y, w, h), ctx)
+            placements.append(x, y, w, h, t['type'])
+            if t['count'] is not None:
+                t['count'] -= 1
+    if stats is not None:
+        stats.incr('candidates', tried)
+        _count_placements(stats, placements)
+    return placements
+
+
+@timed('pack.maxrects')
+def maxrects_pack(box_w: float, box_h: float, items: List[Dict], progress: Optional[Progress] = None) -> Layout:
+    return _engine_pack(MaxRectsPacker(box_w, box_h), items, progress)
+
+
+@timed('pack.skyline')
+def skyline_pack(box_w: float, box_h: float, items: List[Dict], progress: Optional[Progress] = None) -> Layout:
+    return _engine_pack(SkylinePacker(box_w, box_h), items, progress)
+
+
+@timed('pack.guillotine')
+def guillotine_pack(box_w: float, box_h: float, items: List[Dict], progress: Optional[Progress] = None) -> Layout:
+    return _engine_pack(GuillotinePacker(box_w, box_h), items, progress)
+
+
+ALGORITHMS = {
+    'greedy': pack_multiple_items,
+    'maxrects': maxrects_pack,
+    'skyline': skyline_pack,
+    'guillotine': guillotine_pack,
+}
+
+
+# --- problem reduction ---
+# pack_items hands the engines a reduced problem: every item side a whole number of units (the
+# GCD of the sides, or a chosen resolution), the box cut down to what items can reach (for
+# greedy the largest sums of item sides that fit, for the other engines the largest multiple of
+# the sides' GCD) and item types that are the same up to rotation merged into one. The
+# placements are mapped back to the caller's units and item types.
+
+REDUCE_MAX_DENOMINATOR = 10 ** 6   # sides are read as decimals with at most this denominator
+REDUCE_MAX_UNITS = 4096            # a unit under 0.5 is only used while the box stays this many units
+REDUCE_MAX_BITS = 1 << 24          # longest bitset of positions worth building
+
+
+def _normal_positions(length: float, sides: List[float], limit: Optional[int] = None) -> Optional[List[float]]:
+    """Every sum of item sides up to length, ascending: the only places an item pushed towards
+    the origin can start at. None when there are more than `limit` of them. Sides with a common
+    unit are summed in a bitset, one shift per doubling of each side."""
+    sides = sorted({s for s in sides if s > 0})
+    found = _normal_bits(length, sides)
+    if found is not None:
+        reach, unit = found
+        if limit is not None and bin(reach).count('1') > limit:
+            return None
+        bits = bin(reach)[:1:-1]
+        if unit == 1:
+            return [float(i) for i, c in enumerate(bits) if c == '1']
+        return [i * unit.numerator / unit.denominator for i, c in enumerate(bits) if c == '1']
+    sums = {0.0}
+    frontier = [0.0]
+    while frontier:
+        nxt = []
+        for v in frontier:
+            for s in sides:
+                u = _key(v + s)
+                if u <= length + EPS and u not in sums:
+                    sums.add(u)
+                    nxt.append(u)
+        if limit is not None and len(sums) > limit:
+            return None
+        frontier = nxt
+    return sorted(sums)
+
+
+def _normal_bits(length: float, sides: List[float]) -> Optional[Tuple[int, Fraction]]:
+    # (bitset of the normal positions counted in `unit`, unit), when the sides have a common unit
+    # and the box is not too many of them long
+    if all(float(s).is_integer() for s in sides):
+        unit = Fraction(1)
+    else:
+        unit = _common_unit(sides)
+        if unit is None:
+            return None
+    n = math.floor(_decimal(length) / unit + EPS)
+    if n > REDUCE_MAX_BITS:
+        return None
+    return _normal_reach(n, [s / unit for s in map(_decimal, sides)]), unit
+
+
+def _normal_reach(n: int, sides) -> int:
+    # bit i set when i is a sum of (whole-number) sides, for i <= n
+    full = (1 << (n + 1)) - 1
+    reach = 1
+    for s in sides:
+        s = int(s)
+        while s <= n:
+            reach |= (reach << s) & full
+            s <<= 1
+    return reach
+
+
+def _normal_span(length: float, sides: List[float]) -> Optional[Tuple[int, float]]:
+    # (number of normal positions, largest one) without listing them, when that is affordable
+    found = _normal_bits(length, [s for s in sides if s > 0])
+    if found is None:
+        return None
+    reach, unit = found
+    return bin(reach).count('1'), (reach.bit_length() - 1) * unit.numerator / unit.denominator
+
+
+def _lattice(length: float, sides: List[float]) -> List[float]:
+    """Positions the greedy scan tries along one side of the box: the normal positions, or every
+    whole number when finely divided fractional sides have more of those than the scan can
+    afford (REDUCE_MAX_UNITS, or twice the whole numbers)."""
+    xs = _normal_positions(length, sides, max(REDUCE_MAX_UNITS, 2 * int(length) + 2))
+    if xs is None:
+        xs = [float(i) for i in range(int(length) + 1)]
+    return xs
+
+
+def _decimal(v: float) -> Fraction:
+    # the shortest decimal that reads back as v, so 2.35 is 47/20 and not its binary expansion
+    return Fraction(repr(float(v)))
+
+
+def _common_unit(values: List[float]) -> Optional[Fraction]:
+    """The largest length every value is a whole multiple of, or None when the values need
+    decimals past REDUCE_MAX_DENOMINATOR."""
+    if all(float(v).is_integer() for v in values):
+        g = functools.reduce(math.gcd, (int(v) for v in values), 0)
+        return Fraction(g) if g else None
+    fracs = [_decimal(v) for v in values]
+    den = 1
+    for f in fracs:
+        den = den * f.denominator // math.gcd(den, f.denominator)
+        if den > REDUCE_MAX_DENOMINATOR:
+            return None
+    num = 0
+    for f in fracs:
+        num = math.gcd(num, f.numerator * (den // f.denominator))
+    return Fraction(num, den) if num else None
+
+
+class Reduction:
+    """A packing problem in whole units and canonical form (see reduce_problem). box_w, box_h
+    and items are the reduced problem; restore() maps a layout of it back to the original units,
+    box orientation and item types."""
+
+    def __init__(self, box_w: float, box_h: float, unit: Optional[Fraction], items: List[Dict],
+                 sources: List[Union[int, List[Tuple[int, Optional[int]]]]], dims: List[float],
+                 reduced: List[float], positions: Optional[Tuple[int, int]], lattice: Tuple[int, int],
+                 transposed: bool = False, in_order: bool = True):
+        self.box_w = box_w
+        self.box_h = box_h
+        # the box was turned to put its longer side along x
+        self.transposed = transposed
+        # the types are the caller's, in their order and orientation
+        self.in_order = in_order
+        # one unit in the caller's coordinates; None when the sides were left as they are
+        self.unit = unit
+        self.items = items
+        # per reduced type: its original type, or for merged ones (original type, count) with
+        # the counted types first
+        self.sources = sources
+        # item sides before and after reduction, flat: w0, h0, w1, h1, ...
+        self.dims = dims
+        self.reduced = reduced
+        # normal positions per axis (None when not counted), and the whole-number positions of
+        # the original box
+        self.positions = positions
+        self.lattice = lattice
+
+    @property
+    def identity(self) -> bool:
+        return (self.unit in (None, 1) and self.in_order and not self.transposed
+                and 2 * len(self.items) == len(self.dims) and self.dims == self.reduced)
+
+    @property
+    def factor(self) -> Optional[float]:
+        """How many times fewer positions the reduced problem has than the whole-number lattice
+        of the original one, or None when the positions were not counted."""
+        if self.positions is None:
+            return None
+        return (self.lattice[0] * self.lattice[1]) / max(1, self.positions[0] * self.positions[1])
+
+    def scale(self, v: float) -> float:
+        if self.unit is None:
+            return v
+        return v * self.unit.numerator / self.unit.denominator
+
+    def restore(self, layout: Layout) -> Layout:
+        """The layout in the caller's units, box orientation and item types. When the types were
+        only turned or reordered, the layout is updated in place instead of copied."""
+        if self.identity:
+            return layout
+        if (self.unit in (None, 1) and 2 * len(self.items) == len(self.dims) and self.dims == self.reduced
+                and layout.box is None):
+            # placed sides are the items' own, so only the box orientation and the type
+            # numbers change
+            if self.transposed:
+                layout.x, layout.y, layout.w, layout.h = layout.y, layout.x, layout.h, layout.w
+            if not all(src == t for t, src in enumerate(self.sources)):
+                types = layout.type
+                for i, t in enumerate(types):
+                    types[i] = self.sources[t]
+            return layout
+        taken: Dict[int, int] = {}
+        out = Layout()
+        for x, y, w, h, t in layout.rows():
+            if self.transposed:
+                x, y, w, h = y, x, h, w
+            orig = self.sources[t]
+            if not isinstance(orig, int):
+                # the n-th placement of a merged type goes to the first source not yet full
+                n = taken.get(t, 0)
+                taken[t] = n + 1
+                for orig, cnt in self.sources[t]:
+                    if cnt is None or n < cnt:
+                        break
+                    n -= cnt
+            ow, oh = self.dims[2 * orig], self.dims[2 * orig + 1]
+            if _key(w) != _key(self.reduced[2 * orig]) or _key(h) != _key(self.reduced[2 * orig + 1]):
+                ow, oh = oh, ow
+            out.append(self.scale(x), self.scale(y), ow, oh, orig)
+        return out
+
+
+def reduce_problem(box_w: float, box_h: float, items: List[Dict], resolution: Optional[float] = None,
+                   normal: bool = True) -> Reduction:
+    """The problem in whole units. The unit is the GCD of the item sides, read as decimals, or
+    `resolution` (item sides are then rounded up and the box down to whole units, so restored
+    placements never overlap). With `normal` the normal positions are counted (a bitset per
+    axis, only worth building for the greedy scan that tries them) and the box is cut to the
+    largest; otherwise it is cut to the largest multiple of the GCD of the reduced sides, which
+    is arithmetic. Neither changes what an item can reach. Item types with the same sides
+    either way round are merged, their placements going to the counted types first.
+    The result is canonical, so shuffled or rotated variants of a request solve the same
+    problem: the box and every type are turned longer side first and the types are sorted by
+    longer, then shorter side, largest first."""
+    transposed = box_h > box_w
+    if transposed:
+        box_w, box_h = box_h, box_w
+    counts = []
+    for it in items:
+        cnt = it.get('count', 1)
+        if cnt is None or (isinstance(cnt, (int, str)) and int(cnt) == 0):
+            cnt = None
+        else:
+            cnt = int(cnt)
+        counts.append(cnt)
+    dims = [float(v) for it in items for v in (it['w'], it['h'])]
+    if resolution is not None:
+        if resolution <= 0:
+            raise ValueError('resolution must be positive')
+        unit = _decimal(resolution)
+    else:
+        unit = _common_unit(dims)
+        if unit is not None and unit < Fraction(1, 2) and max(box_w, box_h) / unit > REDUCE_MAX_UNITS:
+            unit = None
+    if unit is None:
+        reduced = dims
+        W, H = float(box_w), float(box_h)
+    elif unit.denominator == 1 and all(v.is_integer() for v in dims):
+        # whole-number sides and unit: integer division, no Fraction per side
+        n = unit.numerator
+        reduced = dims if n == 1 else [float(-(-int(v) // n)) for v in dims]
+        W, H = float(math.floor(_decimal(box_w) / unit)), float(math.floor(_decimal(box_h) / unit))
+    else:
+        reduced = [float(math.ceil(_decimal(v) / unit)) for v in dims]
+        W, H = float(math.floor(_decimal(box_w) / unit)), float(math.floor(_decimal(box_h) / unit))
+    merged: Dict[Tuple[float, float], int] = {}
+    out: List[Dict] = []
+    sources: List[Union[int, List[Tuple[int, Optional[int]]]]] = []
+    for i, cnt in enumerate(counts):
+        w, h = reduced[2 * i], reduced[2 * i + 1]
+        # reduced sides are whole numbers and need no rounding to compare
+        key = (max(w, h), min(w, h)) if unit is not None else (_key(max(w, h)), _key(min(w, h)))
+        k = merged.setdefault(key, len(out))
+        if k == len(out):
+            # an unscaled type with its longer side first is handed on as the caller's dict until
+            # another one merges into it
+            if reduced is dims and w >= h:
+                out.append(items[i])
+            else:
+                out.append({'w': max(w, h), 'h': min(w, h), 'count': cnt})
+            sources.append(i)
+            continue
+        if isinstance(sources[k], int):
+            j = sources[k]
+            sources[k] = [(j, counts[j])]
+            if out[k] is items[j]:
+                out[k] = {'w': reduced[2 * j], 'h': reduced[2 * j + 1], 'count': counts[j]}
+        if out[k]['count'] is not None:
+            out[k]['count'] = None if cnt is None else out[k]['count'] + cnt
+        sources[k].append((i, cnt))
+    for src in sources:
+        if not isinstance(src, int):
+            src.sort(key=lambda s: s[1] is None)
+    # merged types have distinct sides, so their (longer, shorter) keys order them completely
+    keys = list(merged)
+    order = sorted(range(len(out)), key=keys.__getitem__, reverse=True)
+    in_order = all(k == n and out[k] is items[k] for n, k in enumerate(order))
+    if not in_order:
+        out = [out[k] for k in order]
+        sources = [sources[k] for k in order]
+    sides = reduced
+    if not normal:
+        if unit is not None and sides:
+            # whole-number sides: every reachable position is a multiple of their GCD
+            g = functools.reduce(math.gcd, (int(s) for s in sides))
+            W, H = float(W // g * g), float(H // g * g)
+        return Reduction(W, H, unit, out, sources, dims, reduced, None, (int(box_w) + 1, int(box_h) + 1),
+                         transposed, in_order)
+    box, positions = [], []
+    for length in (W, H):
+        span = _normal_span(length, sides)
+        if span is None:
+            box.append(length)
+            positions.append(int(length) + 1)
+        else:
+            positions.append(span[0])
+            box.append(span[1])
+    return Reduction(box[0], box[1], unit, out, sources, dims, reduced, tuple(positions),
+                     (int(box_w) + 1, int(box_h) + 1), transposed, in_order)
+
+
+@timed('pack')
+def pack_items(box_w: float, box_h: float, items: List[Dict], algorithm: str = 'greedy',
+               cache: Optional['PackCache'] = None, progress: Optional[Progress] = None,
+               resolution: Optional[float] = None) -> Layout:
+    """Pack multiple item types with the named algorithm (see ALGORITHMS).
+    The engine solves the reduced problem (see reduce_problem; `resolution` fixes its unit)
+    and the placements come back in the original units and item types.
+    With a cache, shuffled, rotated or rescaled variants of a request, which reduce to the same
+    canonical problem, share one result, identical to what an uncached solve returns.
+    progress(placed, passes) is called while solving; returning False stops the solve and
+    returns the partial layout, which is not cached."""
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"unknown algorithm {algorithm!r}; choose from {', '.join(ALGORITHMS)}")
+    if _stats is not None:
+        _stats.incr('solves', algorithm=algorithm)
+    red = reduce_problem(box_w, box_h, items, resolution, normal=algorithm == 'greedy')
+    if cache is not None:
+        layout = _cached_pack(cache, red.box_w, red.box_h, red.items, algorithm, progress)
+    else:
+        layout = ALGORITHMS[algorithm](red.box_w, red.box_h, red.items, progress=progress)
+    return red.restore(layout)
+
+
+# --- anytime optimizer ---
+# A portfolio of packing strategies, each a self-contained candidate numbered 0, 1, 2, ...
+# Candidate k is fully determined by (seed, k): 0 is the plain requested algorithm, then come
+# fixed sort orders x engines x rotation policies, then alternating randomized restarts and
+# remove-and-reinsert local searches. Workers claim candidate numbers from a shared counter and
+# stream scores back; the best of the longest completed prefix of candidates wins (more items,
+# then more area, then the lower number), so the answer only depends on the seed and how many
+# candidates fit in the budget, never on which worker finished first.
+
+ORDERS = {
+    'area': lambda t: (-t['w'] * t['h'], -max(t['w'], t['h'])),
+    'perimeter': lambda t: (-(t['w'] + t['h']), -t['w'] * t['h']),
+    'long-side': lambda t: (-max(t['w'], t['h']), -min(t['w'], t['h'])),
+    'short-side': lambda t: (-min(t['w'], t['h']), -max(t['w'], t['h'])),
+    'width': lambda t: (-t['w'], -t['h']),
+    'height': lambda t: (-t['h'], -t['w']),
+}
+# free: the engine picks the orientation; landscape/portrait: long side fixed along x/y
+ROTATIONS = ('free', 'landscape', 'portrait')
+LOCAL_MOVES = 24
+
+
+def _portfolio_plan(k: int, seed: int):
+    """(kind, order, engine, rotation, rng) of portfolio candidate k > 0."""
+    import random
+    fixed = [(order, engine, 'free') for order in ORDERS for engine in ENGINES]
+    fixed += [('area', engine, rotation) for rotation in ROTATIONS[1:] for engine in ENGINES]
+    if k <= len(fixed):
+        order, engine, rotation = fixed[k - 1]
+        return 'fixed', order, engine, rotation, None
+    rng = random.Random(seed * 1000003 + k)
+    kind = 'restart' if (k - len(fixed)) % 2 else 'local'
+    order = rng.choice(list(ORDERS))
+    engine = rng.choice(list(ENGINES))
+    rotation = 'free' if kind == 'local' or rng.random() < 0.7 else rng.choice(ROTATIONS[1:])
+    return kind, order, engine, rotation, rng
+
+
+def _sequence_pack(box_w: float, box_h: float, types: List[Dict], seq: List[int], fill: List[int],
+                   engine: str, rotation: str):
+    """Place the limited units in seq order (a unit that does not fit is skipped), then as many
+    units of each unlimited type in fill as fit. Returns (layout, positions in seq skipped)."""
+    packer = ENGINES[engine](box_w, box_h)
+    placements = Layout()
+    skipped = []
+
+    def put(t) -> bool:
+        w, h = t['w'], t['h']
+        if rotation != 'free':
+            w, h = (max(w, h), min(w, h)) if rotation == 'landscape' else (min(w, h), max(w, h))
+        found = packer.find(w, h, rotation == 'free')
+        if found is None:
+            return False
+        _, r, ctx = found
+        packer.place(r, ctx)
+        placements.append(r[0], r[1], r[2], r[3], t['type'])
+        return True
+
+    for pos, ti in enumerate(seq):
+        if not put(types[ti]):
+            skipped.append(pos)
+    for ti in fill:
+        while put(types[ti]):
+            pass
+    return placements, skipped
+
+
+def _score(layout: Layout) -> Tuple[int, float]:
+    return len(layout), round(layout.area(), 6)
+
+
+def _run_candidate(k: int, seed: int, box_w: float, box_h: float, items: List[Dict], algorithm: str,
+                   deadline: float) -> Optional[Layout]:
+    """Layout of portfolio candidate k, or None when the deadline cut it short."""
+    if k == 0:
+        return ALGORITHMS[algorithm](box_w, box_h, items)
+    kind, order, engine, rotation, rng = _portfolio_plan(k, seed)
+    types = _item_types(items)
+    if kind == 'restart':
+        noise = {t['type']: rng.uniform(0.6, 1.4) for t in types}
+        key = lambda t: (-t['w'] * t['h'] * noise[t['type']], t['type'])
+    else:
+        key = lambda t: (ORDERS[order](t), t['type'])
+    ranked = sorted(range(len(types)), key=lambda i: key(types[i]))
+    seq = [i for i in ranked for _ in range(types[i]['count'] or 0)]
+    fill = [i for i in ranked if types[i]['count'] is None]
+    layout, skipped = _sequence_pack(box_w, box_h, types, seq, fill, engine, rotation)
+    if kind != 'local':
+        return layout
+    # remove-and-reinsert on the unit sequence: move a unit that did not fit (or, once every
+    # limited unit fits, any unit) to an earlier position and keep the change unless it hurts
+    score = _score(layout)
+    for _ in range(LOCAL_MOVES):
+        if time.time() > deadline:
+            return None
+        if not seq:
+            break
+        cand = list(seq)
+        src = rng.choice(skipped) if skipped else rng.randrange(len(cand))
+        unit = cand.pop(src)
+        cand.insert(rng.randrange(src + 1), unit)
+        trial, trial_skipped = _sequence_pack(box_w, box_h, types, cand, fill, engine, rotation)
+        trial_score = _score(trial)
+        if trial_score >= score:
+            seq, layout, skipped, score = cand, trial, trial_skipped, trial_score
+    return layout
+
+
+def _portfolio_worker(counter, results, seed, box_w, box_h, items, algorithm, deadline, limit):
+    best = None
+    try:
+        while True:
+            with counter.get_lock():
+                k = counter.value
+                counter.value += 1
+            # candidate 0 always runs to completion so there is a result however short the budget
+            if (limit is not None and k >= limit) or (k > 0 and time.time() > deadline):
+                break
+            layout = _run_candidate(k, seed, box_w, box_h, items, algorithm, deadline)
+            if layout is None:
+                break
+            score = _score(layout)
+            # only a worker's record-breaking candidates can win the prefix, so only they ship rows
+            rows = None
+            if best is None or score > best:
+                best = score
+                rows = list(layout.rows())
+            results.put((k, score, rows))
+    finally:
+        results.put(None)
+
+
+def _pick(done: Dict[int, Tuple], rows: Dict[int, list]) -> Tuple[int, Layout]:
+    k = 0
+    best = None
+    while k in done:
+        score = done[k]
+        if best is None or score > done[best]:
+            best = k
+        k += 1
+    return k, Layout.from_rows(rows[best])
+
+
+@timed('optimize')
+def optimize(box_w: float, box_h: float, items: List[Dict], time_limit: float = 1.0, seed: int = 0,
+             workers: Optional[int] = None, algorithm: str = 'maxrects', iterations: Optional[int] = None) -> Layout:
+    """Spend up to time_limit seconds on a portfolio of strategies (see above) and return the best
+    layout found; it never places fewer items than `algorithm` alone. Candidates run on
+    `workers` processes (default: CPU count, or in-process when already inside a worker process).
+    With `iterations` the number of candidates is capped as well, which makes the result
+    reproducible across machines; otherwise a seed gives the same answer whenever the same
+    number of candidates completes."""
+    import multiprocessing
+    import os
+    import queue
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"unknown algorithm {algorithm!r}; choose from {', '.join(ALGORITHMS)}")
+    items = [dict(it) for it in items]
+    _item_types(items)  # reject malformed items here rather than in every worker
+    deadline = time.time() + max(0.0, float(time_limit))
+    if workers is None:
+        workers = 1 if multiprocessing.parent_process() is not None else (os.cpu_count() or 1)
+    if multiprocessing.current_process().daemon:
+        workers = 1  # daemonic processes may not start children
+    done: Dict[int, Tuple] = {}
+    rows: Dict[int, list] = {}
+    if workers <= 1:
+        best = None
+        k = 0
+        while (iterations is None or k < iterations) and (k == 0 or time.time() <= deadline):
+            layout = _run_candidate(k, seed, box_w, box_h, items, algorithm, deadline)
+            if layout is None:
+                break
+            done[k] = _score(layout)
+            if best is None or done[k] > done[best]:
+                best = k
+                rows[k] = list(layout.rows())
+            k += 1
+    else:
+        ctx = multiprocessing.get_context()
+        counter = ctx.Value('l', 0)
+        results = ctx.Queue()
+        procs = [ctx.Process(target=_portfolio_worker,
+                             args=(counter, results, seed, box_w, box_h, items, algorithm, deadline, iterations),
+                             daemon=True)
+                 for _ in range(workers)]
+        for p in procs:
+            p.start()
+        running = len(procs)
+        while running:
+            # past the deadline, give in-flight candidates a short grace period (candidate 0 an
+            # unlimited one) before abandoning them
+            wait_for = max(0.05, deadline - time.time() + 0.5)
+            try:
+                msg = results.get(timeout=None if 0 not in done else wait_for)
+            except queue.Empty:
+                break
+            if msg is None:
+                running -= 1
+                continue
+            k, score, shipped = msg
+            done[k] = score
+            if shipped is not None:
+                rows[k] = shipped
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+            p.join()
+    if 0 not in done:
+        return ALGORITHMS[algorithm](box_w, box_h, items)
+    evaluated, layout = _pick(done, rows)
+    if _stats is not None:
+        _stats.incr('portfolio_candidates', evaluated)
+    return layout
+
+
+# --- exact search ---
+# Branch-and-bound for small instances. Every packing can be pushed left and down until each
+# item's corner lies on a normal pattern (a sum of item sides), so the box is cut into a grid
+# at those sums with one bitmask of occupied cells per grid row. The search takes the first
+# free cell in row order and either puts a unit's corner there or leaves the cell empty.
+# Nodes are pruned with a knapsack bound on the free area and a table of explored states.
+
+EXACT_NODE_LIMIT = 1_000_000
+EXACT_MAX_GRID = 2048          # normal patterns per axis; beyond this only the bound is computed
+EXACT_TABLE_SIZE = 1 << 20     # explored states remembered for dominance checks
+DP_MAX_WORK = 4_000_000        # cut evaluations allowed for the guillotine incumbent
+
+
+def _key(v: float) -> float:
+    return round(v, 9)
+
+
+def _normal_patterns(length: float, sides: List[float]) -> Optional[List[float]]:
+    """Every sum of item sides up to length, ascending; None when there are more than
+    EXACT_MAX_GRID of them. Nothing can reach past the largest sum, so the box is cut there."""
+    return _normal_positions(length, sides, EXACT_MAX_GRID)
+
+
+def _count_bound(area: float, types: List[Dict], left: List[Optional[int]]) -> int:
+    # at most this many more units fit in `area`: smallest units first (types ascend by area)
+    n = 0
+    for t, k in zip(types, left):
+        if k == 0:
+            continue
+        fit = int(area / t['area'] + EPS)
+        if k is not None and k < fit:
+            fit = k
+        n += fit
+        area -= fit * t['area']
+        if area < t['area'] - EPS:
+            break
+    return n
+
+
+def _merge_types(items: List[Dict]) -> List[Dict]:
+    # rotation-equivalent item types become one unit type, so the search never tries
+    # interchangeable units in both orders; 'sources' maps placements back to item types
+    merged: Dict[Tuple[float, float], Dict] = {}
+    for t in _item_types(items):
+        a, b = max(t['w'], t['h']), min(t['w'], t['h'])
+        m = merged.setdefault((_key(a), _key(b)), {'w': a, 'h': b, 'area': a * b, 'count': 0, 'sources': []})
+        m['sources'].append((t['type'], t['count']))
+        m['count'] = None if m['count'] is None or t['count'] is None else m['count'] + t['count']
+    return sorted(merged.values(), key=lambda m: m['area'])
+
+
+def _guillotine_dp(xs: List[float], ys: List[float], types: List[Dict]) -> Optional[List[Tuple]]:
+    """Most units in the box with guillotine cuts at normal patterns, ignoring counts. Every
+    sub-rectangle is solved once, smallest first. Returns (x, y, w, h, unit type) rows, or
+    None when the grid is too large."""
+    nx, ny = len(xs), len(ys)
+    if nx * ny * (nx + ny) > DP_MAX_WORK:
+        return None
+
+    def below(values, v):
+        return bisect.bisect_right(values, v + EPS) - 1
+
+    best: Dict[Tuple[int, int], Tuple] = {}
+    for i in range(nx):
+        for j in range(ny):
+            w, h = xs[i], ys[j]
+            cell = (0, None)
+            for u, t in enumerate(types):
+                for pw, ph in ((t['w'], t['h']), (t['h'], t['w'])):
+                    if pw <= w + EPS and ph <= h + EPS:
+                        cell = (1, ('item', u, pw, ph))
+                        break
+                if cell[0]:
+                    break
+            if cell[0]:
+                # nothing fits in a piece of a rectangle that holds no unit itself
+                for k in range(1, i):
+                    if xs[k] > w / 2 + EPS:
+                        break
+                    v = best[k, j][0] + best[below(xs, w - xs[k]), j][0]
+                    if v > cell[0]:
+                        cell = (v, ('x', k))
+                for k in range(1, j):
+                    if ys[k] > h / 2 + EPS:
+                        break
+                    v = best[i, k][0] + best[i, below(ys, h - ys[k])][0]
+                    if v > cell[0]:
+                        cell = (v, ('y', k))
+            best[i, j] = cell
+    out = []
+    todo = [(0.0, 0.0, nx - 1, ny - 1)]
+    while todo:
+        x, y, i, j = todo.pop()
+        how = best[i, j][1]
+        if how is None:
+            continue
+        if how[0] == 'item':
+            out.append((x, y, how[2], how[3], how[1]))
+        elif how[0] == 'x':
+            k = how[1]
+            todo.append((x, y, k, j))
+            todo.append((x + xs[k], y, below(xs, xs[i] - xs[k]), j))
+        else:
+            k = how[1]
+            todo.append((x, y, i, k))
+            todo.append((x, y + ys[k], i, below(ys, ys[j] - ys[k])))
+    return out
+
+
+def _exact_layout(units: List[Tuple], types: List[Dict]) -> Layout:
+    # hand each unit type's placements out to its source item types in turn
+    supply = [list(t['sources']) for t in types]
+    layout = Layout()
+    for x, y, w, h, u in units:
+        src = supply[u]
+        while src[0][1] == 0:
+            src.pop(0)
+        t, left = src[0]
+        if left is not None:
+            src[0] = (t, left - 1)
+        layout.append(x, y, w, h, t)
+    return layout
+
+
+def _exact_result(result: Dict, t0: float) -> Dict:
+    bound, count = result['bound'], result['count']
+    result['optimal'] = count >= bound
+    result['gap'] = (bound - count) / bound if bound > count else 0.0
+    result['seconds'] = time.perf_counter() - t0
+    if _stats is not None:
+        _stats.incr('exact_nodes', result['nodes'])
+    return result
+
+
+@timed('exact')
+def exact_pack(box_w: float, box_h: float, items: List[Dict], node_limit: Optional[int] = EXACT_NODE_LIMIT,
+               time_limit: Optional[float] = None, incumbent: Optional[Layout] = None) -> Dict:
+    """The most units of `items` that fit in the box, by branch-and-bound. The best heuristic
+    layout (every engine, or `incumbent` when given) and a guillotine DP seed the incumbent.
+    Returns {'placements', 'count', 'bound', 'optimal', 'gap', 'nodes', 'seconds'}. `bound` is
+    a proven upper bound on the count: equal to it when the search finished, otherwise
+    gap = (bound - count) / bound tells how far from optimal the node or time limit left it."""
+    t0 = time.perf_counter()
+    deadline = t0 + time_limit if time_limit is not None else None
+    box_w, box_h = float(box_w), float(box_h)
+    types = _merge_types(items)
+    left = [t['count'] for t in types]
+    root_bound = _count_bound(box_w * box_h, types, left)
+
+    best = incumbent
+    if best is None:
+        candidates = [fn(box_w, box_h, items) for fn in ALGORITHMS.values()]
+        if len(items) == 1:
+            it = _item_types(items)[0]
+            candidates.append(best_layout(box_w, box_h, it['w'], it['h'], it['count']).to_layout())
+        best = max(candidates, key=len)
+    sides = sorted({_key(s) for t in types for s in (t['w'], t['h'])})
+    xs = _normal_patterns(box_w, sides)
+    ys = _normal_patterns(box_h, sides)
+    if xs is not None and ys is not None:
+        root_bound = _count_bound(xs[-1] * ys[-1], types, left)
+    result = {'placements': best, 'count': len(best), 'bound': root_bound, 'nodes': 0}
+    if len(best) >= root_bound or xs is None or ys is None:
+        return _exact_result(result, t0)
+    units = _guillotine_dp(xs, ys, types)
+    if units is not None and len(units) > len(best):
+        used = Counter(u for *_, u in units)
+        if all(t['count'] is None or used[u] <= t['count'] for u, t in enumerate(types)):
+            best = _exact_layout(units, types)
+    if len(best) >= root_bound:
+        result.update(placements=best, count=len(best))
+        return _exact_result(result, t0)
+
+    nx, ny = len(xs) - 1, len(ys) - 1
+    full = (1 << nx) - 1
+    xi = {v: i for i, v in enumerate(xs)}
+    yi = {v: j for j, v in enumerate(ys)}
+    rows = [0] * ny
+    free = [xs[-1] * ys[-1]]
+    shapes = [[(t['w'], t['h'])] if abs(t['w'] - t['h']) <= EPS else [(t['w'], t['h']), (t['h'], t['w'])] for t in types]
+    placed: List[Tuple] = []  # (x, y, w, h, unit type)
+    incumbent_count = len(best)
+    best_units = None
+    seen: Dict[Tuple, int] = {}
+
+    def first_free(j):
+        while j < ny:
+            m = rows[j]
+            if m != full:
+                return j, (~m & (m + 1)).bit_length() - 1
+            j += 1
+        return None
+
+    def options(j, i):
+        # (unit type, w, h, cell mask, end row) for every unit whose corner fits on cell (i, j),
+        # largest first, then (None, ...) for leaving the cell empty
+        opts = []
+        for u in range(len(types) - 1, -1, -1):
+            if left[u] == 0:
+                continue
+            for pw, ph in shapes[u]:
+                i2 = xi.get(_key(xs[i] + pw))
+                j2 = yi.get(_key(ys[j] + ph))
+                if i2 is None or j2 is None:
+                    continue
+                mask = ((1 << i2) - 1) ^ ((1 << i) - 1)
+                if not any(rows[r] & mask for r in range(j, j2)):
+                    opts.append((u, pw, ph, mask, j2))
+        opts.append((None, xs[i + 1] - xs[i], ys[j + 1] - ys[j], 1 << i, j + 1))
+        return opts
+
+    def bound(opt):
+        u, pw, ph = opt[:3]
+        if u is None:
+            return len(placed) + _count_bound(free[0] - pw * ph, types, left)
+        k = left[u]
+        if k is not None:
+            left[u] = k - 1
+        b = len(placed) + 1 + _count_bound(free[0] - pw * ph, types, left)
+        left[u] = k
+        return b
+
+    def apply(opt, j, i, sign):
+        u, pw, ph, mask, j2 = opt
+        for r in range(j, j2):
+            rows[r] ^= mask
+        free[0] -= sign * pw * ph
+        if u is not None:
+            if left[u] is not None:
+                left[u] -= sign
+            if sign > 0:
+                placed.append((xs[i], ys[j], pw, ph, u))
+            else:
+                placed.pop()
+
+    nodes = 0
+    stopped = False
+    j, i = first_free(0)
+    # frames: [row, column, options, next option, option applied below this frame]
+    stack = [[j, i, options(j, i), 0, None]]
+    while stack:
+        frame = stack[-1]
+        j, i, opts, k, applied = frame
+        if applied is not None:
+            apply(applied, j, i, -1)
+            frame[4] = None
+        if k == len(opts):
+            stack.pop()
+            continue
+        if (node_limit is not None and nodes >= node_limit) or (deadline is not None and time.perf_counter() > deadline):
+            stopped = True
+            break
+        opt = opts[k]
+        frame[3] = k + 1
+        if bound(opt) <= incumbent_count:
+            continue
+        apply(opt, j, i, 1)
+        frame[4] = opt
+        nodes += 1
+        if len(placed) > incumbent_count:
+            incumbent_count = len(placed)
+            best_units = list(placed)
+        nxt = first_free(j)
+        if nxt is None:
+            continue
+        # dominance: the same free space and supply was already reached with as many units
+        key = (nxt, tuple(rows[nxt[0]:]), tuple(left))
+        if seen.get(key, -1) >= len(placed):
+            continue
+        if len(seen) < EXACT_TABLE_SIZE:
+            seen[key] = len(placed)
+        stack.append([nxt[0], nxt[1], options(*nxt), 0, None])
+
+    proven = incumbent_count
+    if stopped:
+        # what is left unexplored is bounded by the remaining options of every open frame
+        for frame in reversed(stack):
+            j, i, opts, k, applied = frame
+            if applied is not None:
+                apply(applied, j, i, -1)
+            for opt in opts[k:]:
+                proven = max(proven, bound(opt))
+    if best_units is not None:
+        best = _exact_layout(best_units, types)
+    result.update(placements=best, count=len(best), nodes=nodes, bound=min(root_bound, proven))
+    return _exact_result(result, t0)
+
+
+# --- incremental sessions ---
+# A LayoutSession keeps a layout together with the MaxRects free list of the space it leaves,
+# so that adding or removing a few units or resizing the box is repaired in place instead of
+# re-solving from an empty box.
+
+
+def _session_item(it: Dict) -> Dict:
+    cnt = it.get('count', 1)
+    if cnt is None or (isinstance(cnt, (int, str)) and int(cnt) == 0):
+        cnt = None
+    else:
+        cnt = int(cnt)
+    return {'w': float(it['w']), 'h': float(it['h']), 'count': cnt}
+
+
+class LayoutSession:
+    """An editable layout. add_items, remove_items and resize_box update the placements
+    through a MaxRects free list (whatever algorithm built the layout) and re-pack from scratch
+    with `algorithm` only when units that were asked for are left over and could still fit by
+    area; the re-packed layout is kept only if it places more. An item type is its index in
+    `items`, as in pack_items; removing a type renumbers the ones after it. Every edit returns
+    {'count', 'pending', 'repacked'} where pending is the number of units that did not fit."""
+
+    def __init__(self, box_w: float, box_h: float, items: List[Dict] = (), algorithm: str = 'maxrects',
+                 cache: Optional['PackCache'] = None, progress: Optional[Progress] = None):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"unknown algorithm {algorithm!r}; choose from {', '.join(ALGORITHMS)}")
+        self.box_w = float(box_w)
+        self.box_h = float(box_h)
+        self.items = [_session_item(it) for it in items]
+        self.algorithm = algorithm
+        self.cache = cache
+        # passed to every full solve, including the re-pack fallback of an edit
+        self.progress = progress
+        self.layout, self.engine = self._solve()
+
+    def _solve(self) -> Tuple[Layout, MaxRectsPacker]:
+        # a type whose count went down to 0 is left out; to the packers 0 means unlimited
+        wanted = [t for t, it in enumerate(self.items) if it['count'] != 0]
+        items = [self.items[t] for t in wanted]
+        if self.algorithm == 'maxrects' and self.cache is None:
+            engine = MaxRectsPacker(self.box_w, self.box_h)
+            layout = _engine_pack(engine, items, self.progress)
+        else:
+            layout = pack_items(self.box_w, self.box_h, items, self.algorithm, cache=self.cache, progress=self.progress)
+            engine = self._free_space(layout)
+        if len(wanted) < len(self.items):
+            layout.type = array('i', (wanted[v] for v in layout.type))
+        return layout, engine
+
+    def _free_space(self, layout: Layout) -> MaxRectsPacker:
+        engine = MaxRectsPacker(self.box_w, self.box_h)
+        for r in layout.rects():
+            engine.place(r)
+        return engine
+
+    def pending(self) -> Dict[int, int]:
+        """Units asked for but not placed, by type (item types with a count only)."""
+        placed = self.layout.counts()
+        out = {}
+        for t, it in enumerate(self.items):
+            if it['count'] is not None and it['count'] > placed.get(t, 0):
+                out[t] = it['count'] - placed.get(t, 0)
+        return out
+
+    def state(self) -> Dict:
+        return {'box': {'w': self.box_w, 'h': self.box_h}, 'algorithm': self.algorithm, 'items': self.items,
+                'placements': self.layout, 'count': len(self.layout), 'pending': self.pending()}
+
+    def _fill(self):
+        # largest-first into the free list, as _engine_pack does
+        placed = self.layout.counts()
+        for t in _item_types(self.items):
+            if self.items[t['type']]['count'] == 0:
+                continue
+            left = None if t['count'] is None else t['count'] - placed.get(t['type'], 0)
+            while left is None or left > 0:
+                found = self.engine.find(t['w'], t['h'])
+                if found is None:
+                    break
+                _, r, ctx = found
+                self.engine.place(r, ctx)
+                self.layout.append(*r, t['type'])
+                if left is not None:
+                    left -= 1
+
+    def _drop(self, indices: List[int]):
+        if len(indices) > len(self.layout) // 4:
+            # large removals: rebuilding the free list is cheaper than releasing one by one
+            keep = set(range(len(self.layout))) - set(indices)
+            self.layout = Layout.from_rows(r for i, r in enumerate(self.layout.rows()) if i in keep)
+            self.engine = self._free_space(self.layout)
+            return
+        for i in sorted(indices, reverse=True):
+            self.engine.release((self.layout.x[i], self.layout.y[i], self.layout.w[i], self.layout.h[i]))
+            del self.layout[i]
+
+    def _settle(self) -> Dict:
+        self._fill()
+        pending = self.pending()
+        repacked = False
+        if pending:
+            need = sum(self.items[t]['w'] * self.items[t]['h'] * n for t, n in pending.items())
+            if need <= self.box_w * self.box_h - self.layout.area() + EPS:
+                layout, engine = self._solve()
+                if _score(layout) > _score(self.layout):
+                    self.layout, self.engine = layout, engine
+                    pending = self.pending()
+                    repacked = True
+                if _stats is not None:
+                    _stats.incr('session_repacks')
+        return {'count': len(self.layout), 'pending': sum(pending.values()), 'repacked': repacked}
+
+    @timed('session')
+    def add_items(self, items: List[Dict]) -> Dict:
+        """Add item types ({'w', 'h', 'count'}, appended to `items`) or more units of an
+        existing one ({'type', 'count'})."""
+        for it in items:
+            if 'type' in it:
+                t = int(it['type'])
+                if not 0 <= t < len(self.items):
+                    raise ValueError(f'no item type {t}')
+                if self.items[t]['count'] is not None:
+                    self.items[t]['count'] += int(it.get('count', 1))
+            else:
+                self.items.append(_session_item(it))
+        return self._settle()
+
+    @timed('session')
+    def remove_items(self, type: int, count: Optional[int] = None) -> Dict:
+        """Remove `count` units of an item type, or the whole type when count is None. Units
+        that were not placed go first, then the most recently placed ones."""
+        t = int(type)
+        if not 0 <= t < len(self.items):
+            raise ValueError(f'no item type {t}')
+        placed = [i for i in range(len(self.layout) - 1, -1, -1) if self.layout.type[i] == t]
+        if count is None:
+            self._drop(placed)
+            del self.items[t]
+            self.layout.type = array('i', (v - 1 if v > t else v for v in self.layout.type))
+        else:
+            item = self.items[t]
+            demand = len(placed) if item['count'] is None else item['count']
+            item['count'] = max(0, demand - int(count))
+            self._drop(placed[:max(0, len(placed) - item['count'])])
+        return self._settle()
+
+    @timed('session')
+    def resize_box(self, box_w: float, box_h: float) -> Dict:
+        """Change the box size; placements that no longer fit are taken out and re-inserted
+        where there is room."""
+        box_w, box_h = float(box_w), float(box_h)
+        outside = [i for i, (x, y, w, h) in enumerate(self.layout.rects()) if x + w > box_w + EPS or y + h > box_h + EPS]
+        self._drop(outside)
+        self.engine.resize(box_w, box_h)
+        self.box_w, self.box_h = box_w, box_h
+        return self._settle()
+
+
+# --- result cache keys ---
+# PackCache (in packer) stores results under these keys. They hold the canonical problem the
+# engine solves with or without a cache (see reduce_problem and solve_single_type), so shuffled,
+# rotated and rescaled requests share an entry and a hit is what an uncached solve returns.
+
+
+# bump whenever a solver change alters results, so persisted entries are not reused
+CACHE_VERSION = 4
+
+
+def _cached_pack(cache: 'PackCache', box_w: float, box_h: float, items: List[Dict], algorithm: str,
+                 progress: Optional[Progress] = None) -> Layout:
+    import json
+    key = json.dumps(['items', CACHE_VERSION, algorithm, float(box_w), float(box_h),
+                      [[float(t['w']), float(t['h']), int(t.get('count', 1) or 0) or None] for t in items]])
+    rows = cache.get(key)
+    if rows is None:
+        stopped = []
+
+        def watch(placed, passes):
+            if progress(placed, passes) is False:
+                stopped.append(True)
+                return False
+
+        rows = [list(r) for r in ALGORITHMS[algorithm](box_w, box_h, items, progress=watch if progress else None).rows()]
+        if not stopped:
+            cache.put(key, rows)
+    return Layout.from_rows(tuple(r) for r in rows)
+
+
+def _cached_single_type(cache: 'PackCache', box_w: float, box_h: float, item_w: float, item_h: float) -> BlockLayout:
+    import json
+    transposed = box_h > box_w
+    W, H = (float(box_h), float(box_w)) if transposed else (float(box_w), float(box_h))
+    a, b = max(float(item_w), float(item_h)), min(float(item_w), float(item_h))
+    key = json.dumps(['single', CACHE_VERSION, W, H, a, b])
+    blocks = cache.get(key)
+    if blocks is None:
+        blocks = [list(blk) for blk in solve_single_type(W, H, a, b).blocks]
+        cache.put(key, blocks)
+    blocks = [tuple(blk) for blk in blocks]
+    if transposed:
+        return BlockLayout(float(box_w), float(box_h), _transpose(blocks))
+    return BlockLayout(float(box_w), float(box_h), blocks)
+
+
+# --- multi-bin packing ---
+
+ENGINES = {
+    'maxrects': MaxRectsPacker,
+    'skyline': SkylinePacker,
+    'guillotine': GuillotinePacker,
+}
+
+BIN_STRATEGIES = ('best-fit', 'first-fit')
+
+
+def _expand_boxes(boxes: List[Dict]) -> List[Dict]:
+    """One bin per physical box; a box entry may carry 'count' copies and an optional 'id'."""
+    bins = []
+    for i, b in enumerate(boxes):
+        n = int(b.get('count', 1) or 0)
+        if n <= 0:
+            raise ValueError(f'box {i} needs a positive count')
+        for _ in range(n):
+            bins.append({'box': len(bins), 'id': b.get('id', i), 'w': float(b['w']), 'h': float(b['h'])})
+    return bins
+
+
+@timed('pack_bins')
+def pack_bins(boxes: List[Dict], items: List[Dict], algorithm: str = 'maxrects', strategy: str = 'best-fit') -> Dict:
+    """Pack items across a fleet of boxes. Boxes: list of dicts {'w','h','count'(optional),'id'(optional)}.
+    Units are taken largest-first and each goes to the first box that accepts it (first-fit) or to
+    the accepting box with the least free area left (best-fit). Candidate boxes come from a sorted
+    index of remaining area, so boxes without room for the unit's area are never probed.
+    Returns {'bins', 'placements', 'unplaced', 'count'}; 'placements' is a Layout whose rows carry
+    their 'box' index and every bin holds its own Layout."""
+    if algorithm not in ENGINES:
+        raise ValueError(f"multi-bin packing needs one of: {', '.join(ENGINES)}")
+    if strategy not in BIN_STRATEGIES:
+        raise ValueError(f"unknown strategy {strategy!r}; choose from {', '.join(BIN_STRATEGIES)}")
+    bins = _expand_boxes(boxes)
+    packers = [ENGINES[algorithm](b['w'], b['h']) for b in bins]
+    remaining = [b['w'] * b['h'] for b in bins]
+    capacity = sorted((remaining[i], i) for i in range(len(bins)))
+    placements = Layout(with_box=True)
+    unplaced = []
+    probes = 0
+    for t in _item_types(items):
+        area = t['w'] * t['h']
+        # free space only shrinks, so a box that rejected this type once will keep rejecting it
+        rejected = set()
+        while t['count'] is None or t['count'] > 0:
+            candidates = capacity[bisect.bisect_left(capacity, (area - EPS, -1)):]
+            order = (i for _, i in candidates) if strategy == 'best-fit' else iter(sorted(i for _, i in candidates))
+            chosen = None
+            for i in order:
+                if i in rejected:
+                    continue
+                probes += 1
+                found = packers[i].find(t['w'], t['h'])
+                if found is None:
+                    rejected.add(i)
+                    continue
+                chosen = (i, found)
+                break
+            if chosen is None:
+                break
+            i, (_, (x, y, w, h), ctx) = chosen
+            packers[i].place((x, y, w, h), ctx)
+            del capacity[bisect.bisect_left(capacity, (remaining[i], i))]
+            remaining[i] -= w * h
+            bisect.insort(capacity, (remaining[i], i))
+            placements.append(x, y, w, h, t['type'], i)
+            if t['count'] is not None:
+                t['count'] -= 1
+        if t['count'] is not None and t['count'] > 0:
+            unplaced.append({'type': t['type'], 'w': t['w'], 'h': t['h'], 'count': t['count']})
+    unplaced.sort(key=lambda u: u['type'])
+    result_bins = [dict(b, placements=Layout()) for b in bins]
+    for x, y, w, h, t, i in placements.rows():
+        result_bins[i]['placements'].append(x, y, w, h, t)
+    for b in result_bins:
+        b['count'] = len(b['placements'])
+    if _stats is not None:
+        _stats.incr('box_probes', probes)
+        _count_placements(_stats, placements)
+    return {'bins': result_bins, 'placements': placements, 'unplaced': unplaced, 'count': len(placements)}
+
+
+def _pack_order(args):
+    return pack_bins(*args)
+
+
+def pack_orders(boxes: List[Dict], orders: List[List[Dict]], algorithm: str = 'maxrects', strategy: str = 'best-fit',
+                workers: Optional[int] = None) -> List[Dict]:
+    """Pack independent orders (each a list of items) against their own copy of the fleet.
+    Orders run on a process pool; results come back in input order whatever the worker count."""
+    from concurrent.futures import ProcessPoolExecutor
+    jobs = [(boxes, items, algorithm, strategy) for items in orders]
+    if workers == 1 or len(jobs) <= 1:
+        return [_pack_order(j) for j in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(_pack_order, jobs))
+
+
+
+
+# --- layered 3D packing ---
+
+# mode -> (item side placed along each plane axis and the stacking axis, box axis of each)
+# Box axes: x along W, y along H (vertical), z along D. 'layers' stack floors of W x D up the
+# height; 'columns' stand W x H slices one behind the other along the depth.
+LAYER_MODES = {
+    'layers': ('x', 'z', 'y'),
+    'columns': ('x', 'y', 'z'),
+}
+
+
+def _item_types_3d(items: List[Dict]) -> List[Dict]:
+    """Like _item_types, with a depth 'd' and an 'upright' flag (h must stay vertical)."""
+    types = []
+    for i, it in enumerate(items):
+        if it.get('d') is None:
+            raise ValueError(f'item {i} needs a depth d')
+        cnt = it.get('count', 1)
+        cnt = None if cnt is None or int(cnt) == 0 else int(cnt)
+        t = {'w': float(it['w']), 'h': float(it['h']), 'd': float(it['d']), 'count': cnt,
+             'type': i, 'upright': bool(it.get('upright'))}
+        if min(t['w'], t['h'], t['d']) <= 0:
+            raise ValueError(f'item {i} needs positive w, h and d')
+        types.append(t)
+    return types
+
+
+def _orientations(t: Dict, mode: str) -> List[Tuple[float, float, float, bool]]:
+    """(thickness, a, b, rotate) for each way the type can sit in a slice of `mode`: a and b are
+    the footprint along the plane axes and rotate says whether the footprint may be turned."""
+    axes = LAYER_MODES[mode]
+    seen = set()
+    for sides in ((0, 1, 2), (0, 2, 1), (1, 0, 2), (1, 2, 0), (2, 0, 1), (2, 1, 0)):
+        if t['upright'] and axes[sides.index(1)] != 'y':
+            continue
+        a, b, c = (t[('w', 'h', 'd')[s]] for s in sides)
+        seen.add((c, a, b))
+    out = []
+    for c, a, b in sorted(seen, reverse=True):
+        if (c, b, a) in seen and (c, b, a, True) in out:
+            continue
+        out.append((c, a, b, (c, b, a) in seen))
+    return out
+
+
+def _pack_slice(args) -> list:
+    """Rows (x, y, w, h, type) of one 2D slice: plane_w x plane_h filled largest-first from
+    units (a, b, rotate, thickness, type, count) through an ENGINES packer."""
+    plane_w, plane_h, units, algorithm = args
+    packer = ENGINES[algorithm](plane_w, plane_h)
+    rows = []
+    for a, b, rotate, _, t, count in sorted(units, key=lambda u: u[0] * u[1], reverse=True):
+        for _ in range(count):
+            found = packer.find(a, b, rotate)
+            if found is None:
+                break
+            _, (x, y, w, h), ctx = found
+            packer.place((x, y, w, h), ctx)
+            rows.append((x, y, w, h, t))
+    return rows
+
+
+def _slice_units(types: List[Dict], options: Dict[int, list], thickness: float, area: float) -> tuple:
+    """The units that fit a slice of `thickness`, each in its thickest orientation that fits.
+    Counts are capped at what the slice area could hold, so the same slice asked again with a
+    larger stock left gives the same key."""
+    units = []
+    for t in types:
+        if t['count'] == 0:
+            continue
+        fits = [o for o in options[t['type']] if o[0] <= thickness + EPS]
+        if not fits:
+            continue
+        c, a, b, rotate = fits[0]
+        cap = int(area / (a * b) + EPS)
+        count = cap if t['count'] is None else min(t['count'], cap)
+        if count > 0:
+            units.append((a, b, rotate, c, t['type'], count))
+    return tuple(units)
+
+
+def _layered(box: Tuple[float, float, float], types: List[Dict], mode: str, algorithm: str,
+             memo: Dict, tally: Counter, pool) -> Dict:
+    axes = LAYER_MODES[mode]
+    size = dict(zip('xyz', box))
+    plane_w, plane_h, length = size[axes[0]], size[axes[1]], size[axes[2]]
+    area = plane_w * plane_h
+    types = [dict(t) for t in types]
+    options = {t['type']: _orientations(t, mode) for t in types}
+    stats = _stats
+    layers = []
+    offset = 0.0
+    while True:
+        left = length - offset
+        thicknesses = sorted({o[0] for t in types if t['count'] != 0 for o in options[t['type']]
+                              if o[0] <= left + EPS})
+        candidates = []
+        for c in thicknesses:
+            units = _slice_units(types, options, c, area)
+            if units:
+                candidates.append((c, (plane_w, plane_h, algorithm, units)))
+        todo = list(dict.fromkeys(key for _, key in candidates if key not in memo))
+        tally['solved'] += len(todo)
+        tally['reused'] += len(candidates) - len(todo)
+        if stats is not None:
+            stats.incr('layer_solves', len(todo))
+            stats.incr('layer_reuses', len(candidates) - len(todo))
+        # the candidate slices of one step are independent 2D problems
+        jobs = [(w, h, units, alg) for w, h, alg, units in todo]
+        solved = pool.map(_pack_slice, jobs) if pool is not None and len(jobs) > 1 else map(_pack_slice, jobs)
+        memo.update(zip(todo, solved))
+        best = None
+        for c, key in candidates:
+            rows = memo[key]
+            thick = {u[4]: u[3] for u in key[3]}
+            volume = sum(w * h * thick[t] for _, _, w, h, t in rows)
+            score = (volume / (area * c), volume)
+            if rows and (best is None or score > best[0]):
+                best = (score, c, rows, thick)
+        if best is None:
+            break
+        (_, volume), c, rows, thick = best
+        placed = Counter(r[4] for r in rows)
+        for t in types:
+            if t['count'] is not None:
+                t['count'] -= placed.get(t['type'], 0)
+        layers.append({'axis': axes[2], 'offset': offset, 'thickness': c, 'rows': rows, 'thick': thick,
+                       'count': len(rows), 'volume': volume, 'utilization': volume / (area * c) if area else 0.0})
+        offset += c
+    return {'layers': layers, 'types': types}
+
+
+@timed('pack_3d')
+def pack_3d(box_w: float, box_h: float, box_d: float, items: List[Dict], algorithm: str = 'maxrects',
+            mode: str = 'auto', workers: Optional[int] = 1) -> Dict:
+    """Pack boxes w x h x d into a container box_w x box_h x box_d (x along W, y up along H,
+    z along D) as a stack of 2D slices. Items: {'w','h','d','count','upright'(optional)}; an
+    upright item keeps its h vertical and may only turn about that axis.
+    mode 'layers' stacks W x D floors up the height, 'columns' stands W x H slices along the
+    depth, 'auto' keeps whichever places more units. Each step solves one slice per candidate
+    thickness with the 2D `algorithm` and keeps the densest; the thickness is the tallest
+    orientation of any unit in it. Identical slices (same size, units and capped counts) are
+    solved once, and the candidates of a step run on `workers` processes.
+    Returns {'mode','layers','placements','count','unplaced','utilization','solved','reused'};
+    each layer holds its axis, offset, thickness, 2D Layout, count and volume utilization, and
+    'placements' are dicts x,y,z,w,h,d,type,layer in container coordinates."""
+    if algorithm not in ENGINES:
+        raise ValueError(f"3D packing needs one of: {', '.join(ENGINES)}")
+    modes = tuple(LAYER_MODES) if mode == 'auto' else (mode,)
+    if mode != 'auto' and mode not in LAYER_MODES:
+        raise ValueError(f"unknown mode {mode!r}; choose from auto, {', '.join(LAYER_MODES)}")
+    box = (float(box_w), float(box_h), float(box_d))
+    types = _item_types_3d(items)
+    pool = None
+    if workers is not None and workers > 1:
+        import multiprocessing
+        if not multiprocessing.current_process().daemon:
+            from concurrent.futures import ProcessPoolExecutor
+            pool = ProcessPoolExecutor(max_workers=workers)
+    memo: Dict = {}
+    tally: Counter = Counter()
+    best = None
+    try:
+        for m in modes:
+            res = _layered(box, types, m, algorithm, memo, tally, pool)
+            count = sum(layer['count'] for layer in res['layers'])
+            filled = sum(layer['volume'] for layer in res['layers'])
+            if best is None or (count, filled) > best[0]:
+                best = ((count, filled), m, res)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    (count, _), mode, res = best
+    placements = []
+    layers = []
+    volume = 0.0
+    for i, layer in enumerate(res['layers']):
+        layout = Layout.from_rows(layer['rows'])
+        u_axis, v_axis, s_axis = LAYER_MODES[mode]
+        for x, y, w, h, t in layer['rows']:
+            p = {u_axis: x, v_axis: y, s_axis: layer['offset']}
+            ext = {u_axis: w, v_axis: h, s_axis: layer['thick'][t]}
+            volume += w * h * ext[s_axis]
+            placements.append({'x': p['x'], 'y': p['y'], 'z': p['z'], 'w': ext['x'], 'h': ext['y'],
+                               'd': ext['z'], 'type': t, 'layer': i})
+        layers.append({k: layer[k] for k in ('axis', 'offset', 'thickness', 'count', 'utilization')})
+        layers[-1]['placements'] = layout
+    unplaced = sorted(({'type': t['type'], 'w': t['w'], 'h': t['h'], 'd': t['d'], 'count': t['count']}
+                       for t in res['types'] if t['count']), key=lambda u: u['type'])
+    total = box[0] * box[1] * box[2]
+    return {'mode': mode, 'layers': layers, 'placements': placements, 'count': count, 'unplaced': unplaced,
+            'utilization': volume / total if total else 0.0, 'solved': tally['solved'],
+            'reused': tally['reused']}
@@ -0,0 +1,231 @@
+"""Layout rendering shared by the CLI, the GUI and the web app.
+
+- render_image: Pillow raster, one ImageDraw call per visible placement
+- svg_chunks / write_svg: SVG streamed one <rect> per placement
+- draw_collection: a single matplotlib PolyCollection, used for vector formats
+  (PDF, EPS) or when Pillow is missing
+
+Placements narrower or shorter than `lod` pixels are not drawn one by one. Their area is
+accumulated per pixel (per SVG cell) and drawn as a coverage-weighted blend of their type
+colours, so a 100k-item layout renders in well under a second and still shows where the
+product is. A viewport (x0, y0, x1, y1) in box units renders only that part of the box.
+"""
+from typing import Dict, Iterator, Optional, Tuple
+
+from packer import Layout, placement_rows
+
+PALETTE = ((31, 119, 180), (255, 127, 14), (44, 160, 44), (214, 39, 40), (148, 103, 189),
+           (140, 86, 75), (227, 119, 194), (127, 127, 127), (188, 189, 34), (23, 190, 207))
+OUTLINE = (0, 0, 0)
+RASTER_FORMATS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.webp', '.tif', '.tiff')
+LOD_PIXELS = 1.0
+# placements at least this many pixels across also get an outline
+OUTLINE_PIXELS = 4.0
+
+Viewport = Tuple[float, float, float, float]
+
+
+def _numpy():
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+def visible(placements, view: Viewport):
+    """(x, y, w, h, type) of the placements overlapping the view. A Layout is culled with NumPy
+    masks when available, so a zoomed-in view of a huge layout only walks what it shows."""
+    vx, vy, vx1, vy1 = view
+    np = _numpy()
+    if np is not None and isinstance(placements, Layout) and len(placements):
+        cols = placements.to_numpy()
+        x, y, w, h = cols['x'], cols['y'], cols['w'], cols['h']
+        mask = (x < vx1) & (y < vy1) & (x + w > vx) & (y + h > vy)
+        return zip(*(cols[f][mask].tolist() for f in ('x', 'y', 'w', 'h', 'type')))
+    rows = placement_rows(placements, ('x', 'y', 'w', 'h', 'type'), missing=0)
+    return (r for r in rows if r[0] < vx1 and r[1] < vy1 and r[0] + r[2] > vx and r[1] + r[3] > vy)
+
+
+def _view(box_w: float, box_h: float, viewport: Optional[Viewport]) -> Viewport:
+    if viewport is None:
+        return 0.0, 0.0, float(box_w), float(box_h)
+    x0, y0, x1, y1 = (float(v) for v in viewport)
+    if x1 <= x0 or y1 <= y0:
+        raise ValueError('viewport needs x0 < x1 and y0 < y1')
+    return x0, y0, x1, y1
+
+
+def _size(view: Viewport, width: int, height: Optional[int]) -> Tuple[int, int, float]:
+    vw, vh = view[2] - view[0], view[3] - view[1]
+    if height is None:
+        height = max(1, round(width * vh / vw))
+    scale = min(width / vw, height / vh)
+    return int(width), int(height), scale
+
+
+def image_size(box_w: float, box_h: float, width: int = 1200, height: Optional[int] = None,
+               viewport: Optional[Viewport] = None) -> Tuple[int, int]:
+    """(width, height) in pixels of the image render_image would draw; the height follows the
+    aspect ratio of the view unless given, so callers can refuse oversized images up front."""
+    return _size(_view(box_w, box_h, viewport), width, height)[:2]
+
+
+def _cells(px: float, py: float, pw: float, ph: float) -> Iterator[Tuple[Tuple[int, int], float]]:
+    """The pixels a sub-pixel placement overlaps, with the overlapping area in pixels. Spreading
+    the area (rather than binning by centre) keeps regular grids from aliasing into stripes."""
+    x1, y1 = px + pw, py + ph
+    ix = int(px)
+    while ix < x1:
+        cw = min(x1, ix + 1) - max(px, ix)
+        iy = int(py)
+        while iy < y1:
+            yield (ix, iy), cw * (min(y1, iy + 1) - max(py, iy))
+            iy += 1
+        ix += 1
+
+
+def _blend(fg, alpha: float, bg=(255, 255, 255)):
+    alpha = min(1.0, alpha)
+    return tuple(round(f * alpha + b * (1 - alpha)) for f, b in zip(fg, bg))
+
+
+def render_image(placements, box_w: float, box_h: float, width: int = 1200, height: Optional[int] = None,
+                 viewport: Optional[Viewport] = None, lod: float = LOD_PIXELS):
+    """A Pillow RGB image of the layout (width pixels wide unless height is also given)."""
+    from PIL import Image, ImageDraw
+    view = _view(box_w, box_h, viewport)
+    width, height, scale = _size(view, width, height)
+    vx, vy, vx1, vy1 = view
+    img = Image.new('RGB', (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    # sub-pixel placements: accumulated colour (r, g, b) weighted by covered area, per pixel
+    dust: Dict[Tuple[int, int], list] = {}
+    for x, y, w, h, t in visible(placements, view):
+        px, py = (x - vx) * scale, (y - vy) * scale
+        pw, ph = w * scale, h * scale
+        color = PALETTE[int(t) % len(PALETTE)]
+        if pw < lod or ph < lod:
+            for key, cov in _cells(px, py, pw, ph):
+                acc = dust.get(key)
+                if acc is None:
+                    dust[key] = [color[0] * cov, color[1] * cov, color[2] * cov, cov]
+                else:
+                    acc[0] += color[0] * cov
+                    acc[1] += color[1] * cov
+                    acc[2] += color[2] * cov
+                    acc[3] += cov
+            continue
+        # snap both edges to the pixel grid so neighbours share an edge instead of leaving gaps
+        x0, y0 = round(px), round(py)
+        box = (x0, y0, max(x0, round(px + pw) - 1), max(y0, round(py + ph) - 1))
+        if pw >= OUTLINE_PIXELS and ph >= OUTLINE_PIXELS:
+            draw.rectangle(box, fill=color, outline=OUTLINE)
+        else:
+            draw.rectangle(box, fill=color)
+    for (px, py), (r, g, b, cov) in dust.items():
+        if 0 <= px < width and 0 <= py < height:
+            draw.point((px, py), fill=_blend((r / cov, g / cov, b / cov), cov))
+    # box outline
+    draw.rectangle(((0 - vx) * scale, (0 - vy) * scale, (box_w - vx) * scale - 1, (box_h - vy) * scale - 1), outline=OUTLINE)
+    return img
+
+
+def svg_chunks(placements, box_w: float, box_h: float, width: int = 1200, height: Optional[int] = None,
+               viewport: Optional[Viewport] = None, lod: float = LOD_PIXELS) -> Iterator[str]:
+    """SVG text in chunks, in box units (viewBox) scaled to width x height pixels. Placements
+    smaller than `lod` pixels are merged into one semi-transparent cell per pixel. A bad
+    viewport raises here rather than once the stream is being sent."""
+    view = _view(box_w, box_h, viewport)
+    return _svg(placements, box_w, box_h, view, *_size(view, width, height), lod)
+
+
+def _svg(placements, box_w: float, box_h: float, view: Viewport, width: int, height: int, scale: float,
+         lod: float) -> Iterator[str]:
+    vx, vy, vx1, vy1 = view
+    cell = 1.0 / scale  # one pixel in box units
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+           f'viewBox="{vx:g} {vy:g} {vx1 - vx:g} {vy1 - vy:g}">\n<style>')
+    yield ''.join('.t%d{fill:#%02x%02x%02x}' % ((i,) + c) for i, c in enumerate(PALETTE))
+    yield f'rect{{stroke:#000;stroke-width:{cell:g}}}.d{{stroke:none}}</style>\n'
+    yield f'<rect x="0" y="0" width="{box_w:g}" height="{box_h:g}" fill="#fff"/>\n'
+    dust: Dict[Tuple[int, int], list] = {}
+    parts = []
+    for x, y, w, h, t in visible(placements, view):
+        t = int(t) % len(PALETTE)
+        if w * scale < lod or h * scale < lod:
+            for key, cov in _cells((x - vx) * scale, (y - vy) * scale, w * scale, h * scale):
+                acc = dust.setdefault(key, [0.0] * (len(PALETTE) + 1))
+                acc[t] += cov
+                acc[-1] += cov
+            continue
+        parts.append(f'<rect class="t{t}" x="{x:g}" y="{y:g}" width="{w:g}" height="{h:g}"/>\n')
+        if len(parts) >= 4096:
+            yield ''.join(parts)
+            parts = []
+    yield ''.join(parts)
+    parts = []
+    for (cx, cy), acc in dust.items():
+        cov = acc[-1]
+        color = tuple(sum(acc[i] * PALETTE[i][c] for i in range(len(PALETTE))) / cov for c in range(3))
+        parts.append('<rect class="d" x="%g" y="%g" width="%g" height="%g" fill="#%02x%02x%02x" fill-opacity="%.3f"/>\n'
+                     % ((vx + cx * cell, vy + cy * cell, cell, cell) + tuple(round(c) for c in color) + (min(1.0, cov),)))
+        if len(parts) >= 4096:
+            yield ''.join(parts)
+            parts = []
+    yield ''.join(parts)
+    yield f'<rect x="0" y="0" width="{box_w:g}" height="{box_h:g}" fill="none"/>\n</svg>\n'
+
+
+def write_svg(path: str, placements, box_w: float, box_h: float, **kwargs):
+    import exporters
+    with exporters.open_output(path) as f:
+        for chunk in svg_chunks(placements, box_w, box_h, **kwargs):
+            f.write(chunk)
+
+
+def draw_collection(ax, placements, box_w: float, box_h: float, viewport: Optional[Viewport] = None):
+    """Add the layout to a matplotlib Axes as one PolyCollection."""
+    from matplotlib.collections import PolyCollection
+    from matplotlib.patches import Rectangle
+    view = _view(box_w, box_h, viewport)
+    vx, vy, vx1, vy1 = view
+    verts = []
+    colors = []
+    for x, y, w, h, t in visible(placements, view):
+        verts.append(((x, y), (x + w, y), (x + w, y + h), (x, y + h)))
+        colors.append(tuple(c / 255 for c in PALETTE[int(t) % len(PALETTE)]))
+    ax.add_collection(PolyCollection(verts, facecolors=colors, edgecolors='black',
+                                     linewidths=0.5 if len(verts) < 5000 else 0, alpha=0.8))
+    ax.add_patch(Rectangle((0, 0), box_w, box_h, fill=False, edgecolor='black', lw=1))
+    ax.set_xlim(vx, vx1)
+    ax.set_ylim(vy, vy1)
+    ax.set_aspect('equal')
+    ax.invert_yaxis()
+
+
+def save(path: str, placements, box_w: float, box_h: float, width: int = 1200, height: Optional[int] = None,
+         viewport: Optional[Viewport] = None):
+    """Render to a file: SVG by streaming, raster formats with Pillow, anything else (or a
+    raster format without Pillow) through matplotlib."""
+    lower = path.lower()
+    if lower.endswith(('.svg', '.svg.gz')):
+        write_svg(path, placements, box_w, box_h, width=width, height=height, viewport=viewport)
+        return
+    if lower.endswith(RASTER_FORMATS):
+        try:
+            img = render_image(placements, box_w, box_h, width, height, viewport)
+        except ImportError:
+            pass
+        else:
+            img.save(path)
+            return
+    try:
+        import matplotlib.pyplot as plt
+    except ImportError:
+        raise ImportError('install Pillow (raster images) or matplotlib (other formats) to render layouts')
+    fig, ax = plt.subplots()
+    draw_collection(ax, placements, box_w, box_h, viewport)
+    fig.savefig(path, bbox_inches='tight')
+    plt.close(fig)
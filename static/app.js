@@ -4,16 +4,61 @@
   const canvas = document.getElementById('canvas');
   const ctx = canvas.getContext('2d');
 
-  function renderBox(boxW, boxH, placements) {
+  // layouts are kept as columns {x, y, w, h, type} of equal length, never as one object per placement
+  const NDJSON = 'application/x-ndjson';
+  const F32 = 'application/vnd.packer.f32';
+
+  function clearBox(boxW, boxH) {
     // scale to fit canvas
     const scale = Math.min(canvas.width / boxW, canvas.height / boxH);
     ctx.clearRect(0,0,canvas.width,canvas.height);
     ctx.strokeStyle = '#000'; ctx.strokeRect(0,0,boxW*scale,boxH*scale);
-    placements.forEach(p => {
-      ctx.fillStyle = 'rgba(0,100,200,0.5)';
-      ctx.fillRect(p.x*scale, p.y*scale, p.w*scale, p.h*scale);
-      ctx.strokeStyle = '#000'; ctx.strokeRect(p.x*scale,p.y*scale,p.w*scale,p.h*scale);
-    });
+    return scale;
+  }
+
+  function drawColumns(cols, scale) {
+    const {x, y, w, h} = cols;
+    ctx.fillStyle = 'rgba(0,100,200,0.5)'; ctx.strokeStyle = '#000';
+    for (let i = 0; i < x.length; i++) {
+      ctx.fillRect(x[i]*scale, y[i]*scale, w[i]*scale, h[i]*scale);
+      ctx.strokeRect(x[i]*scale, y[i]*scale, w[i]*scale, h[i]*scale);
+    }
+  }
+
+  async function readNdjson(resp, onChunk) {
+    // one JSON line per chunk of columns; each chunk is drawn as soon as its line is complete
+    const reader = resp.body.getReader();
+    const decoder = new TextDecoder();
+    const cols = {};
+    let buffered = '', fields = [], meta = {};
+    const handle = line => {
+      if (!line) return;
+      const msg = JSON.parse(line);
+      if (msg.fields) { fields = msg.fields; fields.forEach(f => { cols[f] = []; }); }
+      else if (msg.columns) { fields.forEach(f => cols[f].push(...msg.columns[f])); onChunk(msg.columns); }
+      else meta = msg;
+    };
+    for (;;) {
+      const {done, value} = await reader.read();
+      if (done) break;
+      buffered += decoder.decode(value, {stream: true});
+      const lines = buffered.split('\n');
+      buffered = lines.pop();
+      lines.forEach(handle);
+    }
+    handle(buffered);
+    return {fields, cols, count: meta.count || 0};
+  }
+
+  async function readF32(resp) {
+    // float32 columns back to back, the field names and count in headers; the length-prefixed
+    // JSON trailer after the columns holds the rest of the result, which drawing does not need
+    const fields = resp.headers.get('X-Packer-Fields').split(',');
+    const count = parseInt(resp.headers.get('X-Packer-Count'), 10);
+    const buf = await resp.arrayBuffer();
+    const cols = {};
+    fields.forEach((f, i) => { cols[f] = new Float32Array(buf, i * count * 4, count); });
+    return {fields, cols, count};
   }
 
   function refreshItems() {
@@ -37,27 +82,46 @@
     const boxW = parseFloat(document.getElementById('box_w').value);
     const boxH = parseFloat(document.getElementById('box_h').value);
     const payload = items.length ? {box:{w:boxW,h:boxH}, items: items} : {box:{w:boxW,h:boxH}, item: {w: parseFloat(document.getElementById('item_w').value), h: parseFloat(document.getElementById('item_h').value)}};
-    const resp = await fetch('/pack', {method:'POST', headers:{'content-type':'application/json'}, body: JSON.stringify(payload)});
-    const data = await resp.json();
-    if (data.placements) {
-      renderBox(boxW, boxH, data.placements);
-      window.lastPlacements = {box:{w:boxW,h:boxH}, placements: data.placements};
+    // stream where the browser can, otherwise take the whole layout as typed arrays
+    const streaming = typeof ReadableStream !== 'undefined' && typeof TextDecoder !== 'undefined';
+    const resp = await fetch('/pack', {method:'POST', headers:{'content-type':'application/json', 'accept': streaming ? NDJSON : F32}, body: JSON.stringify(payload)});
+    if (!resp.ok) {
+      const err = await resp.json().catch(() => ({}));
+      alert(err.error || 'No placements returned');
+      return;
+    }
+    const scale = clearBox(boxW, boxH);
+    let layout;
+    if ((resp.headers.get('content-type') || '').startsWith(NDJSON)) {
+      layout = await readNdjson(resp, chunk => drawColumns(chunk, scale));
     } else {
-      alert('No placements returned');
+      layout = await readF32(resp);
+      drawColumns(layout.cols, scale);
     }
+    if (!layout.count) { alert('No placements returned'); return; }
+    window.lastPlacements = {box:{w:boxW,h:boxH}, ...layout};
   });
 
+  function placementRows() {
+    const {fields, cols, count} = window.lastPlacements;
+    const rows = [];
+    for (let i = 0; i < count; i++) rows.push(fields.map(f => cols[f][i]));
+    return rows;
+  }
+
   document.getElementById('exportJson').addEventListener('click', () => {
     if (!window.lastPlacements) { alert('No layout to export'); return; }
-    const blob = new Blob([JSON.stringify(window.lastPlacements,null,2)], {type:'application/json'});
+    const {box, fields} = window.lastPlacements;
+    const placements = placementRows().map(r => Object.fromEntries(fields.map((f, i) => [f, r[i]])));
+    const blob = new Blob([JSON.stringify({box, placements},null,2)], {type:'application/json'});
     const url = URL.createObjectURL(blob);
     const a = document.createElement('a'); a.href = url; a.download = 'placements.json'; a.click();
   });
 
   document.getElementById('exportCsv').addEventListener('click', () => {
     if (!window.lastPlacements) { alert('No layout to export'); return; }
-    const rows = ['x,y,w,h,type'];
-    window.lastPlacements.placements.forEach(p => rows.push([p.x,p.y,p.w,p.h,p.type||''].join(',')));
+    const rows = [window.lastPlacements.fields.join(',')];
+    placementRows().forEach(r => rows.push(r.join(',')));
     const blob = new Blob([rows.join('\n')], {type:'text/csv'});
     const url = URL.createObjectURL(blob);
     const a = document.createElement('a'); a.href = url; a.download = 'placements.csv'; a.click();
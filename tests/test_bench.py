@@ -0,0 +1,31 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import bench
+
+
+class TestBench(unittest.TestCase):
+    def test_compare_flags_regressions(self):
+        case = {'path': 'maxrects', 'family': 'fleet', 'seconds': 0.1, 'peak_bytes': 100000, 'count': 50}
+        base = {'calibration': 0.02, 'cases': {'a': case, 'b': case, 'c': case}}
+        cur = {'calibration': 0.04, 'cases': {
+            'a': dict(case, seconds=0.19),        # slower machine: within the calibrated budget
+            'b': dict(case, peak_bytes=400000),   # memory regression
+            'c': dict(case, seconds=0.5, count=49),
+            'd': case,                            # no baseline entry
+        }}
+        failures = bench.compare(base, cur, threshold=0.25)
+        self.assertEqual([f.split(':')[0] for f in failures], ['b', 'c', 'c', 'd'])
+
+    def test_quick_run(self):
+        results = bench.run('best_layout/fractional', quick=True, repeat=1)
+        r = results['cases']['best_layout/fractional']
+        self.assertGreater(r['count'], 0)
+        self.assertGreater(r['peak_bytes'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import capacity
+from packer import best_layout, best_count, solve_job, configure_capacity
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# band, three-block (8 x 7 for 3 x 2) and pinwheel (7 x 7 for 4 x 1, 5 x 5 for 3 x 1) winners
+ITEMS = [{'w': 2, 'h': 3, 'count': 1, 'skus': ['A']}, {'w': 4, 'h': 1, 'count': 1, 'skus': ['B', 'C']},
+         {'w': 1, 'h': 3, 'count': 1}, {'w': 2.5, 'h': 2.5, 'count': 1}, {'w': 1.7, 'h': 4.3, 'count': 1}]
+SHELVES = [{'w': 7, 'h': 8, 'id': 'S1'}, {'w': 7, 'h': 7}, {'w': 5, 'h': 5}, {'w': 23.5, 'h': 11, 'id': 'S2'}]
+
+
+class TestCapacity(unittest.TestCase):
+    def test_counts_match_solver(self):
+        rng = random.Random(7)
+        items = [capacity._canon(*d) for d in [(i['w'], i['h']) for i in ITEMS] +
+                 [(rng.randint(1, 9), rng.randint(1, 9)) for _ in range(4)] + [(round(rng.uniform(0.5, 6), 2), 1.25)]]
+        shelves = [capacity._canon(s['w'], s['h']) for s in SHELVES] + [(31.0, 4.5)]
+        # small batches, so pairs and split positions straddle batch edges
+        with mock.patch.object(capacity, 'CELL_BUDGET', 1 << 14):
+            counts = capacity.solve_counts(items, shelves)
+        for i, (a, b) in enumerate(items):
+            for j, (W, H) in enumerate(shelves):
+                self.assertEqual(counts[i, j], len(best_layout(H, W, b, a)), (W, H, a, b))
+
+    def test_table_rebuild_and_lookup(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'capacity.npy')
+            res = capacity.build_table(path, ITEMS, SHELVES + [{'w': 8, 'h': 7}])
+            self.assertEqual((res['items'], res['shelves'], res['solved'], res['reused']), (5, 4, 20, 0))
+            table = capacity.CapacityTable(path)
+            self.assertEqual(table.lookup(8, 7, 2, 3), 9)
+            self.assertEqual(table.lookup(7, 7, 1, 4), 12)
+            self.assertEqual(table.lookup(5, 5, 3, 1), 8)
+            self.assertIsNone(table.lookup(5, 5, 3, 3))
+            self.assertEqual((table.item('C'), table.shelf('S2')), ((4.0, 1.0), (23.5, 11.0)))
+            self.assertEqual(best_count(7, 8, 3, 2, 4, capacity=table), 4)
+            self.assertEqual(best_count(6, 8, 3, 2, capacity=table), len(best_layout(6, 8, 3, 2)))
+            self.assertEqual((table.hits, table.misses), (4, 2))
+            # a new item and a new shelf are solved; dropped rows go and every other cell is copied
+            items = [ITEMS[0], {'w': 3, 'h': 3, 'count': 2, 'skus': ['D']}] + ITEMS[2:4]
+            with mock.patch.object(capacity, 'solve_counts', wraps=capacity.solve_counts) as solve:
+                res = capacity.build_table(path, items, SHELVES + [{'w': 3, 'h': 9}])
+            self.assertEqual((res['solved'], res['reused']), (5 + 3, 12))
+            self.assertEqual(sum(len(c.args[0]) * len(c.args[1]) for c in solve.call_args_list), 8)
+            with mock.patch.object(capacity, 'REFRESH_INTERVAL', 0):
+                self.assertEqual(table.lookup(9, 3, 3, 3), 3)
+                self.assertIsNone(table.lookup(7, 7, 1, 4))
+                self.assertIsNone(table.item('B'))
+            self.assertEqual(table.lookup(7, 8, 3, 2), 9)
+            with open(capacity.index_path(path), 'w') as f:
+                json.dump({'version': 0}, f)
+            with self.assertRaises(ValueError):
+                capacity.CapacityTable(path)
+
+    def test_cli_and_jobs(self):
+        with tempfile.TemporaryDirectory() as d:
+            items, shelves, path = (os.path.join(d, n) for n in ('items.json', 'shelves.json', 'cap.npy'))
+            with open(items, 'w') as f:
+                json.dump(ITEMS, f)
+            with open(shelves, 'w') as f:
+                json.dump(SHELVES, f)
+            cmd = [sys.executable, 'packer.py', '--items-file', items, '--boxes-file', shelves, '--build-capacity', path]
+            out = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+            self.assertIn('5 item sizes x 4 shelf sizes, 20 solved, 0 reused', out)
+            cmd = [sys.executable, 'packer.py', '--box', '7', '7', '--item', '1', '4', '--count-only', '--capacity', path]
+            self.assertEqual(subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True, check=True).stdout, '12\n')
+            try:
+                table = configure_capacity(path)
+                self.assertEqual(solve_job({'box': [5, 5], 'item': [1, 3], 'count_only': True}), {'count': 8})
+                self.assertEqual(solve_job({'box': [5, 5], 'item': [1, 3], 'count': 5, 'count_only': True}), {'count': 5})
+                self.assertEqual(table.hits, 2)
+            finally:
+                configure_capacity(None)
+
+
+if __name__ == '__main__':
+    unittest.main()
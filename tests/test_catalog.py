@@ -0,0 +1,68 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import catalog
+from packer import parse_items_file
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROWS = [{'w': 30, 'h': 20, 'count': 3, 'sku': 'A'}, {'w': 20, 'h': 30, 'count': 2, 'sku': 'B'},
+        {'w': 30, 'h': 20, 'count': 1, 'sku': 'A'}, {'w': 12.5, 'h': 4, 'count': 0}, {'w': 4, 'h': 12.5, 'count': 7}]
+MERGED = [{'w': 30.0, 'h': 20.0, 'count': 6, 'skus': ['A', 'B']}, {'w': 12.5, 'h': 4.0, 'count': None}]
+
+
+class TestCatalog(unittest.TestCase):
+    def test_formats_merge_rotations(self):
+        csv_text = 'sku,w,h,count\n' + ''.join(f"{r.get('sku', '')},{r['w']},{r['h']},{r['count']}\n" for r in ROWS)
+        sources = {'csv': csv_text, 'json': json.dumps(ROWS), 'jsonl': ''.join(json.dumps(r) + '\n' for r in ROWS)}
+        for fmt, text in sources.items():
+            cat = catalog.read_catalog(io.StringIO(text), fmt)
+            self.assertEqual(cat.items, MERGED, fmt)
+            self.assertEqual(cat.rows, 5)
+        # JSON arrays are decoded across read boundaries, whatever the chunk size
+        with mock.patch.object(catalog, 'READ_CHUNK', 5):
+            text = json.dumps(ROWS + [{'w': 1e3, 'h': 123456789, 'count': 12345}], indent=2)
+            self.assertEqual(catalog.read_catalog(io.BytesIO(text.encode()), 'json').items[-1],
+                             {'w': 1000.0, 'h': 123456789.0, 'count': 12345})
+        # upright 3D rows only merge with turns about the vertical axis
+        rows = [{'w': 1, 'h': 2, 'd': 3, 'upright': True}, {'w': 3, 'h': 2, 'd': 1, 'upright': True},
+                {'w': 2, 'h': 1, 'd': 3, 'upright': True}, {'w': 3, 'h': 1, 'd': 2}, {'w': 1, 'h': 2, 'd': 3}]
+        self.assertEqual([t['count'] for t in catalog.read_catalog(io.StringIO(json.dumps(rows)), 'json').items], [2, 1, 2])
+
+    def test_files_and_bulk_errors(self):
+        # the examples start with a byte order mark
+        self.assertEqual(parse_items_file(os.path.join(ROOT, 'examples', 'items.csv')),
+                         parse_items_file(os.path.join(ROOT, 'examples', 'items.json')))
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'items.jsonl.gz')
+            with gzip.open(path, 'wt') as f:
+                f.writelines(json.dumps(r) + '\n' for r in ROWS)
+            self.assertEqual(parse_items_file(path), MERGED)
+        text = 'w,h,count\n10,5,1\n-1,5,1\nx,5,1\n10,5,2.5\n10,,1\n3,4,\n'
+        with self.assertRaises(catalog.CatalogError) as ctx:
+            catalog.read_catalog(io.StringIO(text), 'csv')
+        self.assertEqual(ctx.exception.invalid, 4)
+        self.assertEqual([w for w, _ in ctx.exception.errors], ['line 3', 'line 4', 'line 5', 'line 6'])
+        # a short row is not an unlimited count and a long one is not silently cut; JSON null is
+        for text, msg in (('w,h,count\n12,4\n', 'missing count'), ('w,h,count\n12,4,1\n12,4,1,9\n', 'more fields'),
+                          ('w,h,count,sku\n12,4,1,A\n12,4,1\n', 'missing sku')):
+            with self.assertRaises(catalog.CatalogError) as ctx:
+                catalog.read_catalog(io.StringIO(text), 'csv')
+            self.assertEqual(ctx.exception.invalid, 1, text)
+            self.assertIn(msg, str(ctx.exception))
+        self.assertEqual(catalog.read_catalog(io.StringIO('[{"w": 12, "h": 4, "count": null}]'), 'json').items,
+                         [{'w': 12.0, 'h': 4.0, 'count': None}])
+        with self.assertRaises(catalog.CatalogError) as ctx:
+            catalog.read_catalog(io.StringIO(json.dumps([{'w': 1, 'h': 1}] * 3 + [[1, 2]] * 300)), 'json', max_errors=5)
+        self.assertEqual((ctx.exception.invalid, len(ctx.exception.errors)), (300, 5))
+        for bad in ('{"w": 1}', '[{"w": 1, "h": 2} {"w": 3, "h": 4}]', '[{"w": 1, "h": 2},'):
+            with self.assertRaises(ValueError):
+                catalog.read_catalog(io.StringIO(bad), 'json')
+
+
+if __name__ == '__main__':
+    unittest.main()
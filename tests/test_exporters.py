@@ -0,0 +1,68 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import unittest
+
+import exporters
+from packer import best_layout, pack_bins, pack_items
+
+
+class TestExporters(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.layout = pack_items(200, 100, [{'w': 30, 'h': 20, 'count': 7}, {'w': 12.5, 'h': 7.25, 'count': 0}], 'maxrects')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_formats_round_trip(self):
+        dicts = self.layout.to_dicts()
+        exporters.export(self.path('a.json.gz'), self.layout, box=(200, 100))
+        with gzip.open(self.path('a.json.gz'), 'rt', encoding='utf8') as f:
+            data = json.load(f)
+        self.assertEqual(data, {'box': {'w': 200, 'h': 100}, 'placements': dicts, 'count': len(dicts)})
+        exporters.export(self.path('a.jsonl'), self.layout)
+        with open(self.path('a.jsonl'), encoding='utf8') as f:
+            self.assertEqual([json.loads(l) for l in f], dicts)
+        exporters.export(self.path('a.csv.xz'), self.layout)
+        with exporters.open_input(self.path('a.csv.xz')) as f:
+            rows = list(csv.DictReader(io.TextIOWrapper(f, encoding='utf8')))
+        self.assertEqual(len(rows), len(dicts))
+        self.assertEqual(float(rows[-1]['w']), dicts[-1]['w'])
+        for name in ('a.npy', 'a.npy.bz2'):
+            exporters.export(self.path(name), self.layout)
+            self.assertEqual(exporters.load_layout(self.path(name)), self.layout)
+        arr = exporters.load_npy(self.path('a.npy'))
+        self.assertEqual(arr.shape, (len(dicts),))
+        self.assertEqual(list(arr['type']), list(self.layout.type))
+
+    def test_npy_without_numpy_matches(self):
+        # the pure-Python encoder writes the same bytes as the NumPy fast path
+        a = b''.join(exporters.npy_chunks(self.layout))
+        b = b''.join(exporters.npy_chunks(self.layout.to_dicts(), self.layout.fields))
+        self.assertEqual(a, b)
+        self.assertEqual(len(a), len(exporters.npy_header(self.layout.fields, len(self.layout))) + 36 * len(self.layout))
+
+    def test_lazy_and_fleet_exports(self):
+        best = best_layout(100, 50, 30, 20)
+        exporters.export(self.path('s.npy'), best)
+        self.assertEqual(exporters.load_layout(self.path('s.npy')), best.to_layout())
+        result = pack_bins([{'w': 60, 'h': 40, 'count': 3}], [{'w': 30, 'h': 20, 'count': 10}])
+        exporters.export_bins(self.path('b.json'), result)
+        with open(self.path('b.json'), encoding='utf8') as f:
+            data = json.load(f)
+        self.assertEqual(data['count'], result['count'])
+        self.assertEqual(data['placements'], result['placements'].to_dicts())
+        self.assertEqual([u['count'] for u in data['unplaced']], [u['count'] for u in result['unplaced']])
+        exporters.export_bins(self.path('b.npy'), result)
+        self.assertEqual(list(exporters.load_layout(self.path('b.npy')).box), list(result['placements'].box))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,9 +2,58 @@
 import unittest
 import os
 import json
-from packer import pack_multiple_items, rects_overlap, best_layout
+import io
+import random
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+from packer import pack_multiple_items, rects_overlap, best_layout, can_place, SpatialIndex, pack_items, ALGORITHMS, pack_bins, pack_orders, run_batch, solve_job, PackCache, Layout, json_default, enable_stats, disable_stats, current_stats, optimize, LayoutSession, exact_pack, reduce_problem, pack_3d, validate_layout, validate_bins
+import pickle
+import exporters
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def naive_pack(box_w, box_h, items):
+    # reference copy of the original lattice scan without the occupancy index
+    types = []
+    for i, it in enumerate(items):
+        cnt = it.get('count', 1)
+        types.append({'w': float(it['w']), 'h': float(it['h']), 'count': None if not cnt else int(cnt), 'type': i})
+    types.sort(key=lambda x: x['w'] * x['h'], reverse=True)
+    placements = []
+    while True:
+        placed_in_pass = 0
+        for t in types:
+            if t['count'] is not None and t['count'] <= 0:
+                continue
+            w = t['w']; h = t['h']
+            for y in [float(i) for i in range(int(box_h) + 1)]:
+                if y + min(w, h) > box_h:
+                    break
+                for x in [float(i) for i in range(int(box_w) + 1)]:
+                    if t['count'] is not None and t['count'] <= 0:
+                        break
+                    rects = [(p['x'], p['y'], p['w'], p['h']) for p in placements]
+                    for pw, ph in ((w, h), (h, w)):
+                        if can_place(x, y, pw, ph, box_w, box_h, rects):
+                            placements.append({'x': x, 'y': y, 'w': pw, 'h': ph, 'type': t['type']})
+                            placed_in_pass += 1
+                            if t['count'] is not None:
+                                t['count'] -= 1
+                            break
+        if placed_in_pass == 0:
+            break
+    return placements
+
 
 class TestPacker(unittest.TestCase):
+    def assertValidLayout(self, box_w, box_h, placements, items=None, msg=None):
+        report = validate_layout(box_w, box_h, placements, items)
+        self.assertTrue(report['valid'], f"{msg or ''} {report['errors']} {report['issues'][:5]}")
+        return report
+
     def test_multi_pack_no_overlap(self):
         box_w, box_h = 200, 100
         items = [{'w':30,'h':20,'count':10},{'w':60,'h':30,'count':4}]
@@ -12,10 +61,7 @@ class TestPacker(unittest.TestCase):
         # ensure some placements
         self.assertGreater(len(placements), 0)
         # check no overlap
-        rects = [(p['x'],p['y'],p['w'],p['h']) for p in placements]
-        for i in range(len(rects)):
-            for j in range(i+1,len(rects)):
-                self.assertFalse(rects_overlap(rects[i], rects[j]))
+        self.assertValidLayout(box_w, box_h, placements, items)
 
     def test_unlimited_count(self):
         box_w, box_h = 100, 50
@@ -27,9 +73,453 @@ class TestPacker(unittest.TestCase):
     def test_single_type_count_zero(self):
         box_w, box_h = 100, 50
         item_w, item_h = 30, 20
-        # count=None (unlimited) -> expect 6 placements
+        # count=None (unlimited) -> a row of 3 upright items above 5 rotated ones = 8 placements
         best = best_layout(box_w, box_h, item_w, item_h, None)
-        self.assertEqual(len(best), 6)
+        self.assertEqual(len(best), 8)
+        self.assertEqual(len(best_layout(box_w, box_h, item_w, item_h, 5)), 5)
+
+    def test_best_layout_blocks_are_valid(self):
+        for box_w, box_h, item_w, item_h in [(50, 50, 30, 20), (2400, 600, 70, 45), (123.5, 77.25, 10.5, 6.25), (90, 40, 100, 10)]:
+            best = best_layout(box_w, box_h, item_w, item_h)
+            rects = list(best)
+            self.assertEqual(len(rects), len(best))
+            index = SpatialIndex(max(item_w, item_h))
+            for r in rects:
+                self.assertEqual(sorted(r[2:]), sorted((item_w, item_h)))
+                self.assertLessEqual(r[0] + r[2], box_w + 1e-6)
+                self.assertLessEqual(r[1] + r[3], box_h + 1e-6)
+                self.assertFalse(index.overlaps(r))
+                index.insert(r)
+        # the pinwheel of four 30x20 items in a 50x50 box
+        self.assertEqual(len(best_layout(50, 50, 30, 20)), 4)
+        # a grid that already fills the area bound skips the split and pinwheel searches
+        with mock.patch('packer_core._three_block_split') as three, mock.patch('packer_core._pinwheel') as pinwheel:
+            self.assertEqual(len(best_layout(2400, 600, 4, 3)), 120000)
+        three.assert_not_called()
+        pinwheel.assert_not_called()
+
+    def test_best_layout_is_lazy(self):
+        best = best_layout(10000, 10000, 1, 2)
+        self.assertEqual(len(best), 50000000)
+        self.assertEqual(best[0], (0.0, 0.0, 2.0, 1.0))
+        self.assertEqual(best[-1], (9998.0, 9999.0, 2.0, 1.0))
+        self.assertEqual(len(best[:50]), 50)
+
+    def test_indexed_pack_matches_naive_scan(self):
+        rng = random.Random(7)
+        for _ in range(5):
+            items = [{'w': rng.randint(3, 25), 'h': rng.randint(3, 25), 'count': rng.choice([0, 1, 3, 6])} for _ in range(3)]
+            self.assertEqual(pack_multiple_items(60, 40, items), naive_pack(60, 40, items))
+
+    def test_spatial_index_queries(self):
+        index = SpatialIndex(10)
+        index.insert((0, 0, 10, 10))
+        index.insert((25, 5, 10, 10))
+        self.assertTrue(index.overlaps((5, 5, 10, 10)))
+        self.assertFalse(index.overlaps((10, 0, 15, 5)))
+        self.assertEqual(index.blocking((20, 8, 10, 2)), (25, 5, 10, 10))
+        self.assertTrue(can_place(0, 12, 10, 10, 100, 100, index))
+        self.assertFalse(can_place(95, 0, 10, 10, 100, 100, index))
+
+    def test_engines_produce_valid_layouts(self):
+        items = [{'w': 30, 'h': 20, 'count': 10}, {'w': 60, 'h': 30, 'count': 4}, {'w': 12.5, 'h': 7.25, 'count': 0}]
+        for algorithm in ALGORITHMS:
+            if algorithm == 'greedy':
+                continue
+            placements = pack_items(200.5, 100.25, items, algorithm)
+            counts = self.assertValidLayout(200.5, 100.25, placements, items, algorithm)['counts']
+            self.assertEqual(counts.get(0), 10, algorithm)
+            self.assertEqual(counts.get(1), 4, algorithm)
+
+    def test_engines_ignore_box_area(self):
+        # a huge box must not cost more than a small one for the candidate-point engines
+        for algorithm in ('maxrects', 'skyline', 'guillotine'):
+            placements = pack_items(1e7, 1e7, [{'w': 3, 'h': 2, 'count': 50}], algorithm)
+            self.assertEqual(len(placements), 50)
+
+    def test_unknown_algorithm(self):
+        with self.assertRaises(ValueError):
+            pack_items(10, 10, [{'w': 1, 'h': 1}], 'nope')
+
+    def test_pack_bins_across_fleet(self):
+        boxes = [{'w': 200, 'h': 100, 'count': 2}, {'w': 120, 'h': 80}]
+        items = [{'w': 30, 'h': 20, 'count': 40}, {'w': 60, 'h': 30, 'count': 9}, {'w': 300, 'h': 10, 'count': 2}]
+        for strategy in ('best-fit', 'first-fit'):
+            result = pack_bins(boxes, items, 'maxrects', strategy)
+            self.assertEqual(len(result['bins']), 3)
+            self.assertEqual(result['count'], sum(b['count'] for b in result['bins']))
+            # the 300-long items fit no box
+            self.assertIn({'type': 2, 'w': 300.0, 'h': 10.0, 'count': 2}, result['unplaced'])
+            placed = {}
+            for p in result['placements']:
+                placed[p['type']] = placed.get(p['type'], 0) + 1
+            for u in result['unplaced']:
+                placed[u['type']] = placed.get(u['type'], 0) + u['count']
+            self.assertEqual(placed, {0: 40, 1: 9, 2: 2})
+            for b in result['bins']:
+                self.assertValidLayout(b['w'], b['h'], b['placements'], items)
+
+    def test_validate_layout(self):
+        # the sweep reports exactly the pairs the quadratic check finds
+        rng = random.Random(5)
+        for _ in range(200):
+            rects = [(rng.choice((0, 2, rng.uniform(0, 20))), rng.choice((0, 3, rng.uniform(0, 20))),
+                      rng.choice((2, 3, rng.uniform(0.1, 6))), rng.choice((3, rng.uniform(0.1, 6)))) for _ in range(rng.randint(0, 30))]
+            pairs = sorted(tuple(i['pair']) for i in validate_layout(30, 30, rects, max_issues=10 ** 6)['issues'] if i['kind'] == 'overlap')
+            self.assertEqual(pairs, [(i, j) for i in range(len(rects)) for j in range(i + 1, len(rects)) if rects_overlap(rects[i], rects[j])])
+        # mixed heights: unit squares crossed by a full-height, a full-width and a thin tall bar
+        rects = [(i % 30, i // 30, 1, 1) for i in range(900)] + [(10.5, 0, 1, 30), (0, 20.5, 30, 0.5), (3, 3, 0.25, 24)]
+        pairs = sorted(tuple(i['pair']) for i in validate_layout(30, 30, rects, max_issues=10 ** 6)['issues'] if i['kind'] == 'overlap')
+        self.assertEqual(pairs, [(i, j) for i in range(len(rects)) for j in range(i + 1, len(rects)) if rects_overlap(rects[i], rects[j])])
+        # a large generated layout, then the same with faults planted in it
+        layout = best_layout(600, 400, 3, 2).to_layout()
+        items = [{'w': 3, 'h': 2, 'count': 0}]
+        self.assertEqual(self.assertValidLayout(600, 400, layout, items)['counts'], {0: 40000})
+        rows = list(layout.rows())
+        rows[10] = (rows[11][0] + 1, rows[11][1], 3, 2, 0)  # overlaps its neighbour (and whatever else it lands on)
+        rows[20] = (599, 0, 3, 2, 0)  # out of the box
+        rows[30] = rows[30][:2] + (2, 2, 0)  # wrong size
+        rows[40] = rows[40][:4] + (3,)  # unknown type
+        report = validate_layout(600, 400, Layout.from_rows(rows), items, max_issues=10)
+        self.assertFalse(report['valid'])
+        self.assertEqual(report['errors']['bounds'], 1)
+        self.assertEqual((report['errors']['size'], report['errors']['type']), (1, 1))
+        self.assertGreaterEqual(report['errors']['overlap'], 1)
+        self.assertIn({'kind': 'bounds', 'placement': 20}, report['issues'])
+        self.assertTrue(any(i['kind'] == 'overlap' and 10 in i['pair'] for i in report['issues']))
+        # counts and the rotation rule
+        placed = [(0, 0, 20, 30, 0), (20, 0, 30, 20, 0)]
+        self.assertTrue(validate_layout(100, 50, placed, [{'w': 30, 'h': 20, 'count': 2}])['valid'])
+        report = validate_layout(100, 50, placed, [{'w': 30, 'h': 20, 'count': 1}], rotate=False)
+        self.assertEqual(report['errors'], {'size': 1, 'count': 1})
+        # the CLI reads the layout back from an export
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'layout.csv')
+            exporters.export(path, Layout.from_rows(rows[:12]))
+            cmd = [sys.executable, os.path.join(ROOT, 'packer.py'), '--verify', path, '--box', '600', '400', '--item', '3', '2']
+            proc = subprocess.run(cmd, capture_output=True, text=True)
+            self.assertEqual(proc.returncode, 1)
+            self.assertIn('overlap', proc.stdout)
+            exporters.export(path, layout)
+            self.assertEqual(subprocess.run(cmd, capture_output=True, text=True).stdout, 'Layout OK: 40000 placements in 600 x 400\n')
+        # a fleet layout is checked box by box, item counts over the whole fleet
+        boxes = [{'w': 60, 'h': 40, 'count': 2}, {'w': 30, 'h': 30}]
+        fleet = pack_bins(boxes, [{'w': 30, 'h': 20, 'count': 0}])
+        sizes = [(60, 40), (60, 40), (30, 30)]
+        self.assertTrue(validate_bins(sizes, fleet['placements'], [{'w': 30, 'h': 20, 'count': 0}])['valid'])
+        self.assertEqual(validate_bins(sizes, fleet['placements'], [{'w': 30, 'h': 20, 'count': 5}])['errors'], {'count': 1})
+        self.assertEqual(set(validate_bins(sizes[:1], fleet['placements'])['errors']), {'box'})
+        with tempfile.TemporaryDirectory() as d:
+            boxes_path, csv_path, json_path = (os.path.join(d, n) for n in ('boxes.json', 'fleet.csv', 'fleet.json'))
+            with open(boxes_path, 'w') as f:
+                json.dump(boxes, f)
+            exporters.export_bins(csv_path, fleet)
+            exporters.export_bins(json_path, fleet)
+            ok = f"Layout OK: {fleet['count']} placements in 3 boxes\n"
+            for args in ((csv_path, '--boxes-file', boxes_path), (json_path,)):
+                cmd = [sys.executable, os.path.join(ROOT, 'packer.py'), '--verify', *args, '--item', '30', '20']
+                self.assertEqual(subprocess.run(cmd, capture_output=True, text=True).stdout, ok)
+            proc = subprocess.run([sys.executable, os.path.join(ROOT, 'packer.py'), '--verify', csv_path], capture_output=True, text=True)
+            self.assertEqual(proc.returncode, 1)
+            self.assertIn('multi-box layout needs --boxes-file', proc.stderr)
+
+    def test_pack_3d_layers(self):
+        items = [{'w': 30, 'h': 20, 'd': 10, 'count': 40, 'upright': True}, {'w': 12, 'h': 7, 'd': 9, 'count': 100}]
+        for mode in ('layers', 'columns'):
+            result = pack_3d(100, 50, 60, items, 'maxrects', mode)
+            self.assertEqual(result['mode'], mode)
+            boxes = [(p['x'], p['y'], p['z'], p['w'], p['h'], p['d']) for p in result['placements']]
+            self.assertEqual(len(boxes), result['count'])
+            self.assertEqual(sum(layer['count'] for layer in result['layers']), result['count'])
+            for i, b in enumerate(boxes):
+                for k, limit in enumerate((100, 50, 60)):
+                    self.assertLessEqual(b[k] + b[k + 3], limit + 1e-9)
+                for o in boxes[i + 1:]:
+                    self.assertFalse(all(b[k] < o[k] + o[k + 3] and o[k] < b[k] + b[k + 3] for k in range(3)))
+            for p in result['placements']:
+                self.assertEqual(sorted((p['w'], p['h'], p['d'])), sorted(items[p['type']][k] for k in 'whd'))
+                if p['type'] == 0:
+                    self.assertEqual(p['h'], 20)
+            placed = {u['type']: u['count'] for u in result['unplaced']}
+            for p in result['placements']:
+                placed[p['type']] = placed.get(p['type'], 0) + 1
+            self.assertEqual(placed, {0: 40, 1: 100})
+            for layer in result['layers']:
+                self.assertGreater(layer['utilization'], 0)
+                self.assertLessEqual(layer['utilization'], 1 + 1e-9)
+        # unlimited stock repeats the same slice, which is solved once and reused
+        result = pack_3d(100, 50, 60, [{'w': 10, 'h': 10, 'd': 10, 'count': 0}], 'skyline', 'layers')
+        self.assertEqual(result['count'], 300)
+        self.assertEqual(len(result['layers']), 5)
+        self.assertEqual(result['solved'], 1)
+        self.assertEqual(result['reused'], 4)
+        self.assertAlmostEqual(result['utilization'], 1.0)
+        # candidate slices solved on a pool give the same answer
+        serial = pack_3d(80, 60, 70, items, 'guillotine')
+        pooled = pack_3d(80, 60, 70, items, 'guillotine', workers=2)
+        self.assertEqual(serial['placements'], pooled['placements'])
+        job = solve_job({'box': {'w': 100, 'h': 50, 'd': 60}, 'items': items, 'layering': 'columns'})
+        self.assertEqual(job['count'], pack_3d(100, 50, 60, items, mode='columns')['count'])
+        with self.assertRaises(ValueError):
+            pack_3d(100, 50, 60, [{'w': 1, 'h': 2, 'count': 3}])
+
+    def test_pack_orders_is_deterministic(self):
+        boxes = [{'w': 100, 'h': 60, 'count': 2}]
+        orders = [[{'w': 10 + i, 'h': 7 + 2 * i, 'count': 12}] for i in range(4)]
+        serial = pack_orders(boxes, orders, workers=1)
+        self.assertEqual(pack_orders(boxes, orders, workers=2), serial)
+        self.assertEqual(serial[0], pack_bins(boxes, orders[0]))
+
+    def test_batch_stream(self):
+        lines = [json.dumps({'id': i, 'box': [100, 50], 'items': [{'w': 30, 'h': 20, 'count': i + 1}], 'algorithm': 'maxrects'}) for i in range(6)]
+        lines.insert(3, 'not json')
+        lines.insert(1, '')
+        for jobs in (1, 2):
+            out = io.StringIO()
+            done, errors = run_batch(io.StringIO('\n'.join(lines) + '\n'), out, jobs=jobs, ordered=True)
+            self.assertEqual((done, errors), (7, 1))
+            results = [json.loads(l) for l in out.getvalue().splitlines()]
+            self.assertEqual([r['id'] for r in results], [0, 1, 2, 4, 3, 4, 5])
+            self.assertIn('error', results[3])
+            self.assertEqual([r['count'] for r in results if 'count' in r], [1, 2, 3, 4, 5, 6])
+
+    def test_serve_answers_each_line(self):
+        proc = subprocess.Popen([sys.executable, 'packer.py', '--serve', '--no-cache'], cwd=ROOT, text=True,
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        try:
+            # each answer arrives before the next job is sent: nothing waits for more input
+            for n in (3, 8):
+                proc.stdin.write(json.dumps({'id': n, 'box': [100, 50], 'item': [30, 20], 'count': n}) + '\n')
+                proc.stdin.flush()
+                self.assertEqual(json.loads(proc.stdout.readline())['count'], n)
+            proc.stdin.write('{}\n')
+            proc.stdin.flush()
+            self.assertIn('error', json.loads(proc.stdout.readline()))
+        finally:
+            proc.stdin.close()
+            self.assertEqual(proc.wait(timeout=30), 0)
+            proc.stdout.close()
+
+    def test_lean_import(self):
+        code = ('import sys, packer; print(sorted(m for m in ("argparse", "csv", "json", "sqlite3", "multiprocessing", '
+                '"numpy", "PIL", "matplotlib", "flask") if m in sys.modules))')
+        out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        self.assertEqual(out.strip(), '[]')
+
+    def test_solve_job_single_type(self):
+        self.assertEqual(solve_job({'id': 'x', 'box': {'w': 100, 'h': 50}, 'item': {'w': 30, 'h': 20}, 'count_only': True}), {'id': 'x', 'count': 8})
+        with self.assertRaises(ValueError):
+            solve_job({'box': [10, 10]})
+
+    def test_layout_columns(self):
+        layout = pack_items(100, 50, [{'w': 30, 'h': 20, 'count': 3}, {'w': 10, 'h': 10, 'count': 4}], 'maxrects')
+        self.assertIsInstance(layout, Layout)
+        self.assertEqual(layout.counts(), {0: 3, 1: 4})
+        self.assertAlmostEqual(layout.area(), 3 * 600 + 4 * 100)
+        self.assertAlmostEqual(layout.utilization(100, 50), 2200 / 5000)
+        dicts = layout.to_dicts()
+        self.assertEqual(layout, dicts)
+        self.assertEqual(dict(layout[-1]), dicts[-1])
+        self.assertEqual(layout[1:3], dicts[1:3])
+        self.assertEqual(list(layout.rows()), [tuple(d.values()) for d in dicts])
+        self.assertEqual(pickle.loads(pickle.dumps(layout)), layout)
+        self.assertEqual(json.loads(json.dumps({'p': layout}, default=json_default)), {'p': dicts})
+        self.assertEqual(best_layout(100, 50, 30, 20).to_layout().counts(), {0: 8})
+
+    def test_stats_are_switchable(self):
+        items = [{'w': 10, 'h': 7, 'count': 5}, {'w': 4, 'h': 4, 'count': 3}]
+        previous = current_stats()
+        stats = enable_stats()
+        try:
+            pack_items(50, 30, items)
+            pack_items(50, 30, items, 'maxrects')
+            disable_stats()
+            snap = stats.snapshot()
+            pack_items(50, 30, items)
+        finally:
+            if previous is not None:
+                enable_stats(previous)
+        self.assertEqual(snap['counters']['placements{type="0"}'], 10)
+        self.assertEqual(snap['counters']['placements{type="1"}'], 6)
+        self.assertEqual(snap['counters']['solves{algorithm="greedy"}'], 1)
+        self.assertGreaterEqual(snap['counters']['candidates'], 16)
+        self.assertGreater(snap['counters']['overlap_checks'], 0)
+        self.assertEqual(snap['phases']['pack']['calls'], 2)
+        self.assertEqual(snap['phases']['pack.maxrects']['calls'], 1)
+        self.assertEqual(stats.snapshot(), snap)
+
+    def test_optimize_portfolio(self):
+        items = [{'w': 37, 'h': 21, 'count': 5}, {'w': 11, 'h': 29, 'count': 7}, {'w': 23, 'h': 23, 'count': 6}, {'w': 8, 'h': 33, 'count': 9}]
+        base = pack_items(120, 100, items, 'maxrects')
+        best = optimize(120, 100, items, time_limit=30, seed=3, workers=1, algorithm='maxrects', iterations=40)
+        self.assertGreater(len(best), len(base))
+        self.assertValidLayout(120, 100, best, items)
+        # the same seed and candidate count give the same layout whatever the worker count
+        self.assertEqual(optimize(120, 100, items, time_limit=30, seed=3, workers=2, algorithm='maxrects', iterations=40), best)
+        # an exhausted budget still returns the plain algorithm's layout
+        self.assertEqual(optimize(120, 100, items, time_limit=0, algorithm='maxrects', workers=1), base)
+        res = solve_job({'box': [120, 100], 'items': items, 'algorithm': 'maxrects', 'time_limit': 5, 'iterations': 40, 'seed': 3, 'workers': 1})
+        self.assertEqual(res['count'], len(best))
+
+    def test_layout_session_edits(self):
+        def check(session):
+            self.assertValidLayout(session.box_w, session.box_h, session.layout, session.items)
+            # the free list never covers a placement
+            rects = list(session.layout.rects())
+            self.assertFalse(any(rects_overlap(f, r) for f in session.engine.free for r in rects))
+
+        rng = random.Random(5)
+        for algorithm in ALGORITHMS:
+            items = [{'w': rng.randint(4, 30), 'h': rng.randint(4, 30), 'count': rng.randint(1, 8)} for _ in range(4)]
+            session = LayoutSession(150, 100, items, algorithm)
+            self.assertEqual(len(session.layout), len(pack_items(150, 100, items, algorithm)))
+            change = session.add_items([{'w': 7, 'h': 5, 'count': 4}, {'type': 0, 'count': 2}])
+            self.assertEqual(change['count'], len(session.layout))
+            self.assertEqual(session.layout.counts().get(4, 0) + session.pending().get(4, 0), 4)
+            check(session)
+            session.remove_items(1, 1)
+            check(session)
+            session.remove_items(0)
+            self.assertEqual(len(session.items), 4)
+            self.assertEqual(max(session.layout.type), 3)
+            check(session)
+            session.resize_box(60, 100)
+            check(session)
+            session.resize_box(200, 120)
+            check(session)
+            self.assertEqual(session.pending(), {})
+        # removing units of an unlimited type caps it at what is left
+        session = LayoutSession(100, 100, [{'w': 10, 'h': 10, 'count': 0}])
+        self.assertEqual(len(session.layout), 100)
+        self.assertEqual(session.remove_items(0, 30), {'count': 70, 'pending': 0, 'repacked': False})
+        session.remove_items(0, 70)
+        self.assertEqual(len(session.layout), 0)
+        self.assertEqual(session.add_items([{'type': 0, 'count': 5}])['count'], 5)
+
+    def test_progress_stops_with_partial_layout(self):
+        items = [{'w': 3, 'h': 2, 'count': 0}, {'w': 5, 'h': 4, 'count': 20}]
+        for algorithm in ALGORITHMS:
+            full = pack_items(60, 40, items, algorithm)
+            seen = []
+
+            def progress(placed, passes):
+                seen.append(placed)
+                return placed < 100
+
+            cache = PackCache()
+            part = pack_items(60, 40, items, algorithm, cache=cache, progress=progress)
+            self.assertGreaterEqual(len(part), 100)
+            self.assertLess(len(part), len(full))
+            self.assertEqual(seen, sorted(seen))
+            self.assertEqual(part, full[:len(part)])
+            # a stopped solve is not cached
+            self.assertEqual(pack_items(60, 40, items, algorithm, cache=cache), full)
+
+    def test_exact_pack(self):
+        items = [{'w': 7, 'h': 7, 'count': 3}, {'w': 7, 'h': 8, 'count': 5}, {'w': 4, 'h': 6, 'count': 4}]
+        heuristic = max(len(pack_items(23, 15, items, a)) for a in ALGORITHMS)
+        res = exact_pack(23, 15, items)
+        self.assertTrue(res['optimal'])
+        self.assertEqual((res['count'], res['bound'], res['gap']), (8, 8, 0.0))
+        self.assertGreater(res['count'], heuristic)
+        self.assertValidLayout(23, 15, res['placements'], items)
+        # stopped early: the incumbent is kept and the gap is measured against a proven bound
+        items = [{'w': 7, 'h': 6, 'count': 5}, {'w': 5, 'h': 3, 'count': 1}, {'w': 5, 'h': 6, 'count': 3}]
+        res = exact_pack(21, 16, items, node_limit=500)
+        self.assertFalse(res['optimal'])
+        self.assertEqual(res['nodes'], 500)
+        self.assertGreaterEqual(res['bound'], res['count'])
+        self.assertAlmostEqual(res['gap'], (res['bound'] - res['count']) / res['bound'])
+        # single type: the count-first layout is the incumbent and often already meets the bound
+        res = solve_job({'box': [52, 33], 'item': [9, 5], 'exact': True})
+        self.assertEqual((res['count'], res['optimal']), (38, True))
+
+    def test_problem_reduction(self):
+        items = [{'w': 300, 'h': 200, 'count': 0}, {'w': 150, 'h': 100, 'count': 10}, {'w': 200, 'h': 300, 'count': 3}]
+        red = reduce_problem(2430, 600, items)
+        self.assertEqual((red.unit, red.box_w, red.box_h), (50, 48, 12))
+        self.assertEqual(red.items, [{'w': 6, 'h': 4, 'count': None}, {'w': 3, 'h': 2, 'count': 10}])
+        self.assertEqual(red.positions, (48, 12))
+        # half-unit sides: the same layout as the doubled problem, halved
+        half = [{'w': 10.5, 'h': 20.5, 'count': 0}, {'w': 7.5, 'h': 3, 'count': 30}]
+        doubled = [{'w': it['w'] * 2, 'h': it['h'] * 2, 'count': it['count']} for it in half]
+        for algorithm in ALGORITHMS:
+            for its, W, H, res in ((items, 2430, 600, None), (half, 100, 60, None), (half, 100, 60, 1)):
+                layout = pack_items(W, H, its, algorithm, resolution=res)
+                self.assertValidLayout(W, H, layout, its, algorithm)
+            expected = pack_items(200, 120, doubled, algorithm)
+            self.assertEqual([[v / 2 for v in r[:4]] + [r[4]] for r in expected.rows()],
+                             [list(r) for r in pack_items(100, 60, half, algorithm).rows()])
+        self.assertEqual(reduce_problem(100, 60, half).unit, 0.5)
+        # a coarser resolution rounds the sides up
+        self.assertEqual(reduce_problem(100.5, 60, half, resolution=1).items[0], {'w': 21, 'h': 11, 'count': None})
+        # only greedy scans normal positions; the other engines get the box cut to the sides' GCD
+        red = reduce_problem(2480, 650, [{'w': 300, 'h': 200}, {'w': 100, 'h': 400}], resolution=50, normal=False)
+        self.assertEqual((red.unit, red.box_w, red.box_h, red.positions, red.factor), (50, 48, 12, None, None))
+        with mock.patch('packer_core._normal_bits') as bits:
+            for algorithm in ALGORITHMS:
+                if algorithm != 'greedy':
+                    pack_items(3_000_000, 3_000_000, [{'w': 7, 'h': 5, 'count': 3}], algorithm)
+                    pack_items(100000.3, 100000.7, [{'w': 2.35, 'h': 3.7, 'count': 3}], algorithm)
+        bits.assert_not_called()
+
+    def test_cache_matches_uncached(self):
+        cache = PackCache()
+        rows = lambda *args, **kw: list(pack_items(*args, **kw).rows())
+        items = [{'w': 14, 'h': 15, 'count': 0}, {'w': 12, 'h': 4, 'count': 2}, {'w': 3, 'h': 3, 'count': 0}]
+        self.assertEqual(rows(48, 37, items, 'greedy', cache=cache), rows(48, 37, items, 'greedy'))
+        rng = random.Random(11)
+        for n in range(60):
+            algorithm = list(ALGORITHMS)[n % len(ALGORITHMS)]
+            box = (rng.randint(10, 60), rng.randint(10, 60))
+            items = [{'w': rng.randint(2, 15), 'h': rng.randint(2, 15), 'count': rng.randint(0, 4)} for _ in range(rng.randint(1, 4))]
+            uncached = rows(*box, items, algorithm)
+            self.assertEqual(rows(*box, items, algorithm, cache=cache), uncached, (box, items, algorithm))
+            self.assertEqual(rows(*box, items, algorithm, cache=cache), uncached)
+        self.assertEqual(cache.stats()['hits'], 60)
+        # the same problem in other units reduces to one entry
+        before = cache.stats()['misses']
+        rows(4.8, 3.7, [{'w': 1.4, 'h': 1.5, 'count': 0}, {'w': 1.2, 'h': 0.4, 'count': 2}, {'w': 0.3, 'h': 0.3, 'count': 0}], 'greedy', cache=cache)
+        self.assertEqual(cache.stats()['misses'], before)
+        self.assertEqual(list(best_layout(50, 100, 20, 30, cache=cache)), list(best_layout(50, 100, 20, 30)))
+        self.assertEqual(list(best_layout(50, 100, 20, 30, cache=cache)), list(best_layout(50, 100, 20, 30)))
+
+    def test_cache_canonicalizes_requests(self):
+        cache = PackCache()
+        items = [{'w': 30, 'h': 20, 'count': 10}, {'w': 60, 'h': 30, 'count': 4}]
+        first = pack_items(200, 100, items, 'maxrects', cache=cache)
+        # same problem with the types swapped, each item rotated and the box turned
+        shuffled = [{'w': 30, 'h': 60, 'count': 4}, {'w': 20, 'h': 30, 'count': 10}]
+        second = pack_items(100, 200, shuffled, 'maxrects', cache=cache)
+        self.assertEqual(cache.stats()['misses'], 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(len(first), len(second))
+        self.assertEqual(list(second.rows()), list(pack_items(100, 200, shuffled, 'maxrects').rows()))
+        self.assertEqual([(y, x, h, w, 1 - t) for x, y, w, h, t in first.rows()], list(second.rows()))
+        for p in second:
+            self.assertLessEqual(p['x'] + p['w'], 100)
+            self.assertLessEqual(p['y'] + p['h'], 200)
+            self.assertEqual(sorted((p['w'], p['h'])), sorted((shuffled[p['type']]['w'], shuffled[p['type']]['h'])))
+        # single type: every rotation of the box and item shares one solve
+        turned = best_layout(50, 100, 20, 30, cache=cache)
+        self.assertEqual(list(best_layout(100, 50, 30, 20, cache=cache)), [(y, x, h, w) for x, y, w, h in turned])
+        self.assertEqual(list(turned), list(best_layout(50, 100, 30, 20)))
+        self.assertEqual(cache.stats()['misses'], 2)
+
+    def test_cache_bounds_and_persistence(self):
+        cache = PackCache(max_entries=2)
+        for w in (10, 11, 12):
+            pack_items(100, 100, [{'w': w, 'h': 5, 'count': 3}], 'skyline', cache=cache)
+        self.assertEqual(cache.stats()['entries'], 2)
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'cache.db')
+            first = PackCache(path=path)
+            expected = pack_items(100, 50, [{'w': 30, 'h': 20, 'count': 0}], 'guillotine', cache=first)
+            other = PackCache(path=path)
+            self.assertEqual(pack_items(100, 50, [{'w': 30, 'h': 20, 'count': 0}], 'guillotine', cache=other), expected)
+            self.assertEqual(other.stats()['disk_hits'], 1)
+            first.close()
+            other.close()
 
 if __name__ == '__main__':
     unittest.main()
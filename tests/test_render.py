@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+import render
+from packer import Layout, pack_items
+
+SVG = '{http://www.w3.org/2000/svg}'
+
+
+class TestRender(unittest.TestCase):
+    def setUp(self):
+        self.layout = pack_items(200, 100, [{'w': 30, 'h': 20, 'count': 7}, {'w': 1, 'h': 2, 'count': 300}], 'maxrects')
+
+    def test_raster_size_and_lod(self):
+        img = render.render_image(self.layout, 200, 100, width=400)
+        self.assertEqual(img.size, (400, 200))
+        # a 30x20 item drawn at 2 px per unit, filled with its type colour
+        x, y = self.layout.x[0], self.layout.y[0]
+        self.assertEqual(img.getpixel((int(x * 2) + 10, int(y * 2) + 10)), render.PALETTE[0])
+        # at 0.1 px per unit the 1x2 items fall below the LOD and are blended, not skipped
+        small = render.render_image(self.layout, 200, 100, width=20)
+        self.assertEqual(small.size, (20, 10))
+        dust = [p for p in small.getdata() if p not in ((255, 255, 255), (0, 0, 0))]
+        self.assertTrue(dust)
+
+    def test_svg_and_viewport(self):
+        svg = ''.join(render.svg_chunks(self.layout, 200, 100, width=400))
+        root = ET.fromstring(svg.encode('utf8'))
+        self.assertEqual(root.get('viewBox'), '0 0 200 100')
+        rects = root.findall(f'{SVG}rect')
+        # background + one per placement + outline
+        self.assertEqual(len(rects), len(self.layout) + 2)
+        view = Layout.from_rows([(0, 0, 10, 10, 0), (150, 50, 10, 10, 1)])
+        root = ET.fromstring(''.join(render.svg_chunks(view, 200, 100, width=100, viewport=(100, 0, 200, 100))).encode('utf8'))
+        self.assertEqual(root.get('height'), '100')
+        self.assertEqual(len(root.findall(f'{SVG}rect')), 3)
+        with self.assertRaises(ValueError):
+            render.svg_chunks(view, 200, 100, viewport=(5, 0, 5, 10))
+        # culling gives the same rows for a Layout (NumPy masks) and for plain dicts
+        self.assertEqual(list(render.visible(view, (100, 0, 200, 100))), [(150, 50, 10, 10, 1)])
+        self.assertEqual(list(render.visible(view.to_dicts(), (0, 0, 10, 10))), [[0, 0, 10, 10, 0]])
+
+    def test_save_by_extension(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ('a.png', 'a.svg'):
+                path = os.path.join(tmp, name)
+                render.save(path, self.layout, 200, 100, width=300)
+                self.assertGreater(os.path.getsize(path), 0)
@@ -1,7 +1,11 @@
-﻿import unittest
+﻿import time
+import unittest
 
 try:
+    import web_app
     from web_app import app
+    from jobs import JobQueue
+    from packer import solve_job
     flask_available = True
 except Exception:
     app = None
@@ -26,5 +30,301 @@ class TestWebUI(unittest.TestCase):
         self.assertIn('placements', data)
         self.assertGreater(len(data['placements']), 0)
 
+    def test_pack_api_algorithm(self):
+        if not flask_available:
+            self.skipTest('Flask not available')
+        client = app.test_client()
+        payload = { 'box': {'w':200,'h':100}, 'items':[{'w':30,'h':20,'count':5}], 'algorithm': 'maxrects' }
+        r = client.post('/pack', json=payload)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.get_json()['count'], 5)
+        payload['algorithm'] = 'bogus'
+        r = client.post('/pack', json=payload)
+        self.assertEqual(r.status_code, 400)
+
+    def test_metrics(self):
+        if not flask_available:
+            self.skipTest('Flask not available')
+        client = app.test_client()
+        client.post('/pack', json={'box': {'w':120,'h':80}, 'items':[{'w':17,'h':13,'count':4}], 'algorithm': 'skyline'})
+        r = client.get('/metrics')
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.content_type.startswith('text/plain'))
+        text = r.get_data(as_text=True)
+        self.assertIn('packer_request_duration_seconds_bucket{endpoint="/pack",method="POST",status="200",le="+Inf"}', text)
+        self.assertIn('packer_solves_total{algorithm="skyline"}', text)
+        self.assertIn('packer_phase_seconds_total{phase="job"}', text)
+
+    def test_pack_formats(self):
+        if not flask_available:
+            self.skipTest('Flask not available')
+        import gzip, json, struct, zlib
+        client = app.test_client()
+        payload = {'box': {'w':200,'h':100}, 'items':[{'w':30,'h':20,'count':5}], 'algorithm': 'maxrects'}
+        expected = client.post('/pack', json=payload).get_json()['placements']
+        fields = ('x', 'y', 'w', 'h', 'type')
+        r = client.post('/pack', json=payload, headers={'Accept': 'application/vnd.packer.columns+json'})
+        data = r.get_json(force=True)
+        self.assertEqual(data['fields'], list(fields))
+        self.assertEqual(data['count'], 5)
+        self.assertEqual([dict(zip(fields, row)) for row in zip(*(data['placements'][f] for f in fields))], expected)
+        r = client.post('/pack', json=payload, headers={'Accept': 'application/vnd.packer.f32', 'Accept-Encoding': 'gzip'})
+        self.assertEqual(r.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(r.headers['X-Packer-Fields'], 'x,y,w,h,type')
+        self.assertEqual(json.loads(r.headers['X-Packer-Result']), {'count': 5})
+        body = gzip.decompress(r.data)
+        values = struct.unpack('<25f', body[:100])
+        self.assertEqual(values[:5], tuple(p['x'] for p in expected))
+        self.assertEqual(values[20:], tuple(p['type'] for p in expected))
+        (size,) = struct.unpack('<I', body[100:104])
+        self.assertEqual(json.loads(body[104:104 + size]), {'count': 5})
+        self.assertEqual(len(body), 104 + size)
+        # a fleet result keeps its box and unplaced lists out of the headers
+        fleet = {'boxes': [{'w': 60, 'h': 40, 'count': 2}], 'items': [{'w': 30, 'h': 20, 'count': 9}]}
+        whole = client.post('/pack', json=fleet).get_json()
+        r = client.post('/pack?format=f32', json=fleet)
+        self.assertEqual(json.loads(r.headers['X-Packer-Result']), {'count': whole['count']})
+        end = len(r.headers['X-Packer-Fields'].split(',')) * whole['count'] * 4
+        (size,) = struct.unpack('<I', r.data[end:end + 4])
+        self.assertEqual(json.loads(r.data[end + 4:end + 4 + size]), {k: v for k, v in whole.items() if k != 'placements'})
+        # NDJSON: fields, one columnar chunk per line, then the rest of the result
+        r = client.post('/pack?format=ndjson', json=payload, headers={'Accept-Encoding': 'deflate'})
+        lines = [json.loads(line) for line in zlib.decompress(r.data).decode().splitlines()]
+        self.assertEqual(lines[0], {'fields': list(fields)})
+        self.assertEqual(lines[1]['columns']['y'], [p['y'] for p in expected])
+        self.assertEqual(lines[-1], {'count': 5})
+        r = client.post('/pack', json=payload, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(json.loads(gzip.decompress(r.data))['placements'], expected)
+        self.assertEqual(client.post('/pack?format=xml', json=payload).status_code, 400)
+
+    def test_verify(self):
+        if not flask_available:
+            self.skipTest('Flask not available')
+        client = app.test_client()
+        payload = {'box': {'w':200,'h':100}, 'items':[{'w':30,'h':20,'count':5}], 'algorithm': 'maxrects'}
+        placements = client.post('/pack', json=payload).get_json()['placements']
+        r = client.post('/verify', json={**payload, 'placements': placements})
+        self.assertEqual(r.get_json()['valid'], True)
+        # columns, with one placement moved onto another
+        columns = {f: [p[f] for p in placements] for f in ('x', 'y', 'w', 'h', 'type')}
+        columns['x'][1], columns['y'][1] = columns['x'][0], columns['y'][0]
+        report = client.post('/verify', json={**payload, 'placements': columns}).get_json()
+        self.assertFalse(report['valid'])
+        self.assertIn({'kind': 'overlap', 'pair': [0, 1]}, report['issues'])
+        self.assertEqual(client.post('/verify', json={'placements': []}).status_code, 400)
+
+    def test_catalog_upload(self):
+        if not flask_available:
+            self.skipTest('Flask not available')
+        import io
+        client = app.test_client()
+        r = client.post('/catalog', data='sku,w,h,count\nA,30,20,3\nB,20,30,2\n', content_type='text/csv')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.get_json(), {'items': [{'w': 30.0, 'h': 20.0, 'count': 5, 'skus': ['A', 'B']}], 'rows': 2, 'count': 1})
+        upload = {'file': (io.BytesIO(b'{"w": 1, "h": 0}\n{"w": 1}\n'), 'items.jsonl')}
+        r = client.post('/catalog', data=upload, content_type='multipart/form-data')
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual([e['where'] for e in r.get_json()['errors']], ['line 1', 'line 2'])
+
+    def test_export_streams_compressed(self):
+        if not flask_available:
+            self.skipTest('Flask not available')
+        import gzip, json
+        client = app.test_client()
+        payload = {'box': {'w':200,'h':100}, 'items':[{'w':30,'h':20,'count':5}], 'algorithm': 'maxrects'}
+        r = client.post('/export', json=payload, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.headers['Content-Encoding'], 'gzip')
+        data = json.loads(gzip.decompress(r.data))
+        self.assertEqual(data['count'], 5)
+        self.assertEqual(data['box'], {'w': 200, 'h': 100})
+        r = client.post('/export', json=dict(payload, format='csv'))
+        self.assertEqual(r.get_data(as_text=True).splitlines()[0], 'x,y,w,h,type')
+        self.assertEqual(client.post('/export', json=dict(payload, format='xml')).status_code, 400)
+
+    def test_render(self):
+        if not flask_available:
+            self.skipTest('Flask not available')
+        client = app.test_client()
+        payload = {'box': {'w':200,'h':100}, 'items':[{'w':30,'h':20,'count':5}], 'algorithm': 'maxrects', 'width': 300}
+        r = client.post('/render', json=payload)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.mimetype, 'image/png')
+        self.assertTrue(r.data.startswith(b'\x89PNG'))
+        r = client.post('/render', json=dict(payload, format='svg', viewport=[0, 0, 100, 100]))
+        self.assertEqual(r.mimetype, 'image/svg+xml')
+        self.assertIn('viewBox="0 0 100 100"', r.get_data(as_text=True))
+        self.assertEqual(client.post('/render', json=dict(payload, format='svg', viewport=[5, 0, 5, 1])).status_code, 400)
+        # tall boxes and thin viewports are refused by pixel count, not only by width
+        tall = {'box': [10, 100000], 'item': [5, 5], 'width': 8192}
+        self.assertEqual(client.post('/render', json=tall).status_code, 400)
+        self.assertEqual(client.post('/render', json=dict(payload, width=8192, viewport=[0, 0, 1, 100])).status_code, 400)
+
+    def test_sessions(self):
+        if not flask_available:
+            self.skipTest('Flask not available')
+        client = app.test_client()
+        r = client.post('/sessions', json={'box': {'w':200,'h':100}, 'items':[{'w':30,'h':20,'count':5}]})
+        self.assertEqual(r.status_code, 201)
+        sid = r.get_json()['id']
+        r = client.post(f'/sessions/{sid}/items', json={'items': [{'w':10,'h':10,'count':3}]})
+        self.assertEqual(r.get_json()['change'], {'count': 8, 'pending': 0, 'repacked': False})
+        r = client.delete(f'/sessions/{sid}/items/0?count=2')
+        self.assertEqual(r.get_json()['count'], 6)
+        r = client.put(f'/sessions/{sid}/box', json={'box': [30, 20]})
+        self.assertEqual(r.get_json()['box'], {'w': 30, 'h': 20})
+        self.assertEqual(client.delete(f'/sessions/{sid}/items/7').status_code, 400)
+        self.assertEqual(client.delete(f'/sessions/{sid}').status_code, 204)
+        self.assertEqual(client.get(f'/sessions/{sid}').status_code, 404)
+
+    def test_pack_api_count_only(self):
+        if not flask_available:
+            self.skipTest('Flask not available')
+        client = app.test_client()
+        payload = { 'box': {'w':10000,'h':10000}, 'item': {'w':1,'h':2}, 'count_only': True }
+        r = client.post('/pack', json=payload)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.get_json(), {'count': 50000000})
+
+    def test_capacity(self):
+        if not flask_available:
+            self.skipTest('Flask not available')
+        import os
+        import tempfile
+        import capacity
+        from packer import configure_capacity
+        client = app.test_client()
+        self.assertEqual(client.get('/capacity?box=7,7&item=4x1').get_json(),
+                         {'count': 12, 'box': [7.0, 7.0], 'item': [4.0, 1.0], 'source': 'solved'})
+        self.assertEqual(client.get('/capacity?shelf=S1&item=4,1').status_code, 400)
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'capacity.npy')
+            capacity.build_table(path, [{'w': 1, 'h': 4, 'skus': ['B']}], [{'w': 7, 'h': 7, 'id': 'S1'}])
+            try:
+                configure_capacity(path)
+                r = client.get('/capacity?shelf=S1&sku=B&count=10')
+                self.assertEqual(r.get_json(), {'count': 10, 'box': [7.0, 7.0], 'item': [4.0, 1.0], 'source': 'table'})
+                self.assertEqual(client.get('/capacity?box=7,6&sku=B').get_json()['source'], 'solved')
+                self.assertEqual(client.get('/capacity?shelf=S9&sku=B').status_code, 404)
+                self.assertEqual(client.post('/pack', json={'box': [7, 7], 'item': [1, 4], 'count_only': True}).get_json(),
+                                 {'count': 12})
+            finally:
+                configure_capacity(None)
+
+    def test_pack_batch(self):
+        if not flask_available:
+            self.skipTest('Flask not available')
+        client = app.test_client()
+        payload = {'items': [{'w':30,'h':20,'count':0}], 'algorithm': 'maxrects',
+                   'jobs': [{'box': {'w':100,'h':50}}, {'box': {'w':60,'h':40}}, {'box': {'w':10,'h':10}, 'algorithm': 'bogus'}]}
+        r = client.post('/pack/batch', json=payload)
+        self.assertEqual(r.status_code, 200)
+        results = r.get_json()['results']
+        self.assertEqual(results[0], solve_job({'box': {'w':100,'h':50}, 'items': payload['items'], 'algorithm': 'maxrects'}))
+        self.assertEqual(results[1]['count'], solve_job({'box': {'w':60,'h':40}, 'items': payload['items'], 'algorithm': 'maxrects'})['count'])
+        self.assertIn('error', results[2])
+
+    def test_search_budgets_are_capped(self):
+        if not flask_available:
+            self.skipTest('Flask not available')
+        from unittest import mock
+        from packer import Layout
+        client = app.test_client()
+        payload = {'box': [100, 50], 'items': [{'w': 30, 'h': 20, 'count': 0}], 'time_limit': 1e9, 'workers': 500,
+                   'iterations': 10 ** 9}
+        with mock.patch('packer.optimize', return_value=Layout()) as optimize:
+            self.assertEqual(client.post('/pack', json=payload).status_code, 200)
+            self.assertEqual(client.post('/pack/batch', json={'jobs': [payload]}).status_code, 200)
+            self.assertEqual(client.post('/pack', json={**payload, 'workers': None, 'iterations': None}).status_code, 200)
+        budgets = [c.args[3:6] + c.args[7:] for c in optimize.call_args_list]
+        limits = (web_app.MAX_SYNC_TIME, 0, web_app.MAX_JOB_WORKERS, web_app.MAX_ITERATIONS)
+        self.assertEqual(budgets, [limits, limits, limits[:3] + (None,)])
+        self.assertEqual(client.post('/pack', json={**payload, 'workers': 'many'}).status_code, 400)
+
+    def test_batch_has_one_deadline(self):
+        if not flask_available:
+            self.skipTest('Flask not available')
+        from unittest import mock
+        from packer import Layout
+        client = app.test_client()
+        job = {'box': [100, 50], 'items': [{'w': 30, 'h': 20, 'count': 0}], 'time_limit': 5}
+        slow = lambda *args, **kw: time.sleep(0.6) or Layout()
+        with mock.patch.object(web_app, 'MAX_BATCH_TIME', 1.0), mock.patch('packer.optimize', side_effect=slow) as optimize:
+            results = client.post('/pack/batch', json={'jobs': [job, job, job]}).get_json()['results']
+        # each job gets what is left of the batch budget, and jobs past the deadline are not run
+        first, second = [c.args[3] for c in optimize.call_args_list]
+        self.assertTrue(0.9 < first <= 1.0 and second < 0.5, (first, second))
+        self.assertEqual(results[2], {'error': 'batch time limit of 1 s reached'})
+
+    def test_3d_workers_and_box_are_checked(self):
+        if not flask_available:
+            self.skipTest('Flask not available')
+        from unittest import mock
+        client = app.test_client()
+        result = {'mode': 'layers', 'layers': [], 'placements': [], 'unplaced': [], 'count': 0, 'utilization': 0.0}
+        with mock.patch('packer.pack_3d', return_value=result) as pack_3d:
+            payload = {'box': [10, 10, 10], 'items': [{'w': 2, 'h': 2, 'd': 2, 'count': 1}], 'workers': 500}
+            self.assertEqual(client.post('/pack', json=payload).status_code, 200)
+        self.assertEqual(pack_3d.call_args.args[6], web_app.MAX_JOB_WORKERS)
+        for box in (10, 'abc', [10], [1, 2, 3, 4], None):
+            r = client.post('/pack', json={'box': box, 'items': [{'w': 2, 'h': 2, 'count': 1}]})
+            self.assertEqual(r.status_code, 400, box)
+            self.assertIn('box must be', r.get_json()['error'])
+
+    def test_exact_budgets_are_capped(self):
+        if not flask_available:
+            self.skipTest('Flask not available')
+        from unittest import mock
+        from packer import Layout
+        client = app.test_client()
+        payload = {'box': [15, 19], 'items': [{'w': 4, 'h': 3, 'count': 0}, {'w': 5, 'h': 2, 'count': 0}],
+                   'exact': True, 'node_limit': 0}
+        result = {'placements': Layout(), 'count': 0, 'bound': 0, 'optimal': False, 'gap': 0.0}
+        with mock.patch('packer.exact_pack', return_value=result) as exact:
+            client.post('/pack', json=payload)
+            client.post('/pack', json={**payload, 'node_limit': 10 ** 12, 'time_limit': 1e9})
+            client.post('/pack', json={**payload, 'node_limit': 50, 'time_limit': 0.5})
+        self.assertEqual([c.args[3:5] for c in exact.call_args_list],
+                         [(web_app.MAX_EXACT_NODES, web_app.MAX_SYNC_TIME)] * 2 + [(50, 0.5)])
+
+    def test_jobs_roundtrip(self):
+        if not flask_available:
+            self.skipTest('Flask not available')
+        client = app.test_client()
+        r = client.post('/jobs', json={'box': {'w':200,'h':100}, 'items':[{'w':30,'h':20,'count':5}]})
+        self.assertEqual(r.status_code, 202)
+        job_id = r.get_json()['id']
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            job = client.get(f'/jobs/{job_id}').get_json()
+            if job['status'] not in ('queued', 'running'):
+                break
+            time.sleep(0.05)
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['result']['count'], 5)
+        self.assertEqual(client.get('/jobs/nope').status_code, 404)
+
+    def test_jobs_backpressure_and_cancel(self):
+        if not flask_available:
+            self.skipTest('Flask not available')
+        client = app.test_client()
+        saved = web_app.job_queue
+        web_app.job_queue = JobQueue(max_workers=1, max_pending=1)
+        try:
+            # the greedy lattice scan on a large box keeps the single worker busy
+            slow = {'box': {'w':3000,'h':3000}, 'items':[{'w':7,'h':5,'count':0}, {'w':3,'h':2,'count':0}]}
+            first = client.post('/jobs', json=slow).get_json()['id']
+            deadline = time.time() + 30
+            while web_app.job_queue.get(first)['status'] == 'queued' and time.time() < deadline:
+                time.sleep(0.02)
+            second = client.post('/jobs', json=slow)
+            self.assertEqual(second.status_code, 202)
+            third = client.post('/jobs', json=slow)
+            self.assertEqual(third.status_code, 429)
+            self.assertEqual(client.delete(f"/jobs/{second.get_json()['id']}").get_json()['status'], 'cancelled')
+            self.assertEqual(client.delete(f'/jobs/{first}').get_json()['status'], 'cancelled')
+        finally:
+            web_app.job_queue = saved
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,39 +1,503 @@
-﻿import os
-from flask import Flask, render_template, request, jsonify
-from packer import pack_multiple_items, best_layout
+﻿import bisect
+import io
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from packer import EXACT_NODE_LIMIT, solve_job, default_cache, default_capacity, best_count, json_default, enable_stats, current_stats, LayoutSession, validate_layout
+from jobs import JobQueue, QueueFull
+import catalog
+import exporters
+import render
 
 base_dir = os.path.dirname(__file__)
 template_dir = os.path.join(base_dir, 'templates')
 static_dir = os.path.join(base_dir, 'static')
 app = Flask(__name__, static_folder=static_dir, template_folder=template_dir)
 
+
+class PackerJSONProvider(DefaultJSONProvider):
+    # results hold packer.Layout columns, which json_default turns into placement dicts
+    @staticmethod
+    def default(o):
+        try:
+            return json_default(o)
+        except TypeError:
+            return DefaultJSONProvider.default(o)
+
+
+app.json = PackerJSONProvider(app)
+
+# background solves for POST /jobs; sized through the environment
+job_queue = JobQueue(
+    max_workers=int(os.environ.get('PACKER_WORKERS', os.cpu_count() or 2)),
+    max_pending=int(os.environ.get('PACKER_MAX_PENDING', 32)),
+    time_limit=float(os.environ.get('PACKER_TIME_LIMIT', 300)),
+)
+MAX_BATCH_JOBS = int(os.environ.get('PACKER_MAX_BATCH', 1000))
+# search budgets a request may ask for: solver processes, portfolio candidates and seconds for
+# synchronous solves (queued /jobs get the queue's time limit instead)
+MAX_JOB_WORKERS = int(os.environ.get('PACKER_MAX_WORKERS', min(4, os.cpu_count() or 1)))
+MAX_ITERATIONS = int(os.environ.get('PACKER_MAX_ITERATIONS', 10000))
+MAX_SYNC_TIME = float(os.environ.get('PACKER_MAX_SYNC_TIME', 10))
+# seconds for a whole /pack/batch request; jobs get what is left of it
+MAX_BATCH_TIME = float(os.environ.get('PACKER_MAX_BATCH_TIME', 30))
+# search nodes of a synchronous exact solve, which always runs with a time limit as well
+MAX_EXACT_NODES = int(os.environ.get('PACKER_MAX_EXACT_NODES', EXACT_NODE_LIMIT))
+# editable layouts for /sessions, least recently used dropped beyond PACKER_MAX_SESSIONS
+MAX_SESSIONS = int(os.environ.get('PACKER_MAX_SESSIONS', 256))
+sessions: 'OrderedDict[str, tuple]' = OrderedDict()
+sessions_lock = threading.Lock()
+
+# solver counters and phase timers for /metrics; PACKER_STATS=0 switches them off
+if os.environ.get('PACKER_STATS', '1') != '0':
+    enable_stats()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyHistogram:
+    """Request latency histogram per (endpoint, method, status), rendered for /metrics."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # labels -> [per-bucket counts (last is +Inf), sum, count]
+
+    def observe(self, labels, seconds: float):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            rec = self._series.get(labels)
+            if rec is None:
+                rec = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            rec[0][i] += 1
+            rec[1] += seconds
+            rec[2] += 1
+
+    def render(self, name: str):
+        lines = [f'# HELP {name} Request latency in seconds.', f'# TYPE {name} histogram']
+        with self._lock:
+            series = sorted((k, [list(v[0]), v[1], v[2]]) for k, v in self._series.items())
+        for (endpoint, method, status), (counts, total, n) in series:
+            labels = f'endpoint="{endpoint}",method="{method}",status="{status}"'
+            running = 0
+            for le, c in zip(self.buckets + (float('inf'),), counts):
+                running += c
+                bound = '+Inf' if le == float('inf') else repr(le)
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {running}')
+            lines.append(f'{name}_sum{{{labels}}} {total}')
+            lines.append(f'{name}_count{{{labels}}} {n}')
+        return lines
+
+
+request_latency = LatencyHistogram()
+
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _record_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        request_latency.observe((endpoint, request.method, response.status_code), time.perf_counter() - started)
+    return response
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+# /pack response formats, chosen by the Accept header (or ?format=); plain JSON by default
+PACK_TYPES = {'json': 'application/json', 'columns': 'application/vnd.packer.columns+json',
+              'f32': 'application/vnd.packer.f32', 'ndjson': 'application/x-ndjson'}
+
+def _pack_format():
+    fmt = request.args.get('format')
+    if fmt is not None:
+        return fmt if fmt in PACK_TYPES else None
+    best = request.accept_mimetypes.best_match(list(PACK_TYPES.values()), default=PACK_TYPES['json'])
+    return next(k for k, v in PACK_TYPES.items() if v == best)
+
+def _pack_response(result, fmt):
+    # json: the result as is; columns: one array per field; f32: float32 columns, then the rest
+    # of the result as a length-prefixed JSON trailer (field names, count and the scalar keys
+    # also go in headers); ndjson: columnar chunks, one per line
+    accepted = request.accept_encodings
+    encoding = 'gzip' if accepted['gzip'] else 'deflate' if accepted['deflate'] else None
+    if fmt == 'json' and encoding is None:
+        return jsonify(result)
+    placements = result.get('placements', [])
+    rest = {k: v for k, v in result.items() if k != 'placements'}
+    fields = exporters.default_fields(placements)
+    if fmt == 'json':
+        stream = [app.json.dumps(result)]
+    elif fmt == 'columns':
+        stream = exporters.columns_chunks(placements, fields, rest)
+    elif fmt == 'f32':
+        stream = exporters.f32_chunks(placements, fields, rest)
+    else:
+        stream = exporters.ndjson_chunks(placements, fields, rest)
+    resp = Response(stream_with_context(exporters.compress_chunks(stream, encoding, flush=fmt == 'ndjson')),
+                    mimetype=PACK_TYPES[fmt])
+    if encoding:
+        resp.headers['Content-Encoding'] = encoding
+    resp.headers['Vary'] = 'Accept, Accept-Encoding'
+    if fmt == 'f32':
+        resp.headers['X-Packer-Fields'] = ','.join(fields)
+        resp.headers['X-Packer-Count'] = str(len(placements))
+        # only scalars: layers, bins and unplaced lists can run to megabytes, past header limits
+        resp.headers['X-Packer-Result'] = app.json.dumps(
+            {k: v for k, v in rest.items() if v is None or isinstance(v, (bool, int, float, str))})
+    return resp
+
+def _limit_job(job, max_time=MAX_SYNC_TIME, max_nodes=MAX_EXACT_NODES):
+    # a copy of a /pack payload with its budgets held to the server's ceilings, so one request
+    # cannot start any number of processes or hold a worker indefinitely
+    job = dict(job)
+    if job.get('exact'):
+        # node_limit 0 means no limit and time_limit is optional for exact_pack
+        job['time_limit'] = job.get('time_limit') or max_time
+        if max_nodes:
+            job['node_limit'] = min(int(job.get('node_limit', max_nodes)) or max_nodes, max_nodes)
+    if job.get('time_limit'):
+        job['time_limit'] = min(float(job['time_limit']), max_time)
+    if job.get('workers') or job.get('time_limit'):
+        # the optimizer would otherwise start one process per CPU
+        job['workers'] = max(1, min(int(job.get('workers') or MAX_JOB_WORKERS), MAX_JOB_WORKERS))
+    if job.get('iterations'):
+        job['iterations'] = max(1, min(int(job['iterations']), MAX_ITERATIONS))
+    return job
+
 @app.route('/pack', methods=['POST'])
 def pack_api():
+    # box + items (algorithm: greedy, maxrects, skyline or guillotine), box + item (count, count_only)
+    # or boxes + items for a fleet of boxes; see packer.solve_job
+    data = request.get_json() or {}
+    fmt = _pack_format()
+    if fmt is None:
+        return jsonify({'error': f"format must be one of {', '.join(PACK_TYPES)}"}), 400
+    try:
+        result = solve_job(_limit_job(data))
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'error': str(e)}), 400
+    return _pack_response(result, fmt)
+
+@app.route('/pack/batch', methods=['POST'])
+def pack_batch_api():
+    # {'jobs': [...], ...}: every job is a /pack payload; other top-level keys are shared defaults,
+    # e.g. {'items': [...], 'jobs': [{'box': {...}}, {'box': {...}}]} packs the same items into many boxes
+    data = request.get_json() or {}
+    jobs = data.get('jobs')
+    if not isinstance(jobs, list):
+        return jsonify({'error': 'jobs must be a list'}), 400
+    if len(jobs) > MAX_BATCH_JOBS:
+        return jsonify({'error': f'at most {MAX_BATCH_JOBS} jobs per batch'}), 413
+    defaults = {k: v for k, v in data.items() if k != 'jobs'}
+    deadline = time.monotonic() + MAX_BATCH_TIME
+    results = []
+    for job in jobs:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            results.append({'error': f'batch time limit of {MAX_BATCH_TIME:g} s reached'})
+            continue
+        try:
+            results.append(solve_job(_limit_job({**defaults, **job}, min(MAX_SYNC_TIME, left))))
+        except (ValueError, TypeError, KeyError) as e:
+            results.append({'error': str(e)})
+    return jsonify({'results': results, 'count': len(results)})
+
+@app.route('/verify', methods=['POST'])
+def verify_api():
+    # box + placements (objects, [x, y, w, h, type] rows or columns {'x': [...], ...}) with optional
+    # items and rotate (default true); answers with the validation report, see packer.validate_layout
     data = request.get_json() or {}
-    box = data.get('box', {})
-    box_w = float(box.get('w', 100))
-    box_h = float(box.get('h', 50))
-    items = data.get('items')
-
-    if items:
-        # items: list of {w,h,count}
-        placements = pack_multiple_items(box_w, box_h, items)
-        return jsonify({'placements': placements, 'count': len(placements)})
-
-    item = data.get('item')
-    count = data.get('count')
-    if not item:
-        return jsonify({'error': 'no item or items provided'}), 400
-    item_w = float(item.get('w'))
-    item_h = float(item.get('h'))
-    placements = best_layout(box_w, box_h, item_w, item_h, count)
-    # convert to dicts
-    placements_dicts = [{'x':x,'y':y,'w':w,'h':h,'type':0} for (x,y,w,h) in placements]
-    return jsonify({'placements': placements_dicts, 'count': len(placements_dicts)})
+    try:
+        box_w, box_h = _box(data['box'])
+        placements = data.get('placements') or []
+        if isinstance(placements, dict):
+            fields = [f for f in ('x', 'y', 'w', 'h', 'type') if f in placements]
+            placements = [dict(zip(fields, row)) for row in zip(*(placements[f] for f in fields))]
+        report = validate_layout(box_w, box_h, placements, data.get('items'), bool(data.get('rotate', True)))
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(report)
+
+CATALOG_TYPES = {'text/csv': 'csv', 'application/json': 'json', 'application/x-ndjson': 'jsonl',
+                 'application/jsonl': 'jsonl'}
+
+@app.route('/catalog', methods=['POST'])
+def catalog_api():
+    # a CSV, JSON or JSONL catalog as the request body (format from ?format= or the Content-Type)
+    # or as an uploaded 'file'; read as a stream and answered with the merged item types
+    upload = request.files.get('file')
+    if upload is not None:
+        fmt = request.args.get('format') or catalog.catalog_format(upload.filename or '')
+        source = upload.stream
+    else:
+        fmt = request.args.get('format') or CATALOG_TYPES.get(request.mimetype)
+        source = request.stream
+    if fmt not in catalog.FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(catalog.FORMATS)}"}), 400
+    try:
+        cat = catalog.read_catalog(source, fmt)
+    except catalog.CatalogError as e:
+        return jsonify({'error': str(e), 'invalid': e.invalid,
+                        'errors': [{'where': w, 'message': m} for w, m in e.errors]}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'items': cat.items, 'rows': cat.rows, 'count': len(cat.items)})
+
+EXPORT_TYPES = {'json': 'application/json', 'jsonl': 'application/x-ndjson', 'csv': 'text/csv',
+                'npy': 'application/octet-stream'}
+
+@app.route('/export', methods=['POST'])
+def export_api():
+    # a /pack payload plus 'format' (json, jsonl, csv or npy); the layout is streamed as it is
+    # encoded and gzip/deflate-compressed when the client's Accept-Encoding allows it
+    data = request.get_json() or {}
+    fmt = data.get('format', 'json')
+    if fmt not in EXPORT_TYPES:
+        return jsonify({'error': f"format must be one of {', '.join(EXPORT_TYPES)}"}), 400
+    job = {k: v for k, v in data.items() if k not in ('format', 'count_only')}
+    try:
+        result = solve_job(_limit_job(job))
+        stream = exporters.result_chunks(result, fmt, job.get('box'))
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'error': str(e)}), 400
+    accepted = request.accept_encodings
+    encoding = 'gzip' if accepted['gzip'] else 'deflate' if accepted['deflate'] else None
+    resp = Response(stream_with_context(exporters.compress_chunks(stream, encoding)), mimetype=EXPORT_TYPES[fmt])
+    if encoding:
+        resp.headers['Content-Encoding'] = encoding
+    resp.headers['Content-Disposition'] = f'attachment; filename=layout.{fmt}'
+    return resp
+
+def _box(box):
+    # {'w', 'h'} or [w, h]
+    w, h = (box['w'], box['h']) if isinstance(box, dict) else box
+    return float(w), float(h)
+
+MAX_RENDER_WIDTH = int(os.environ.get('PACKER_MAX_RENDER_WIDTH', '8192'))
+# the height follows the box or viewport, so the pixel count is capped as well
+MAX_RENDER_PIXELS = int(os.environ.get('PACKER_MAX_RENDER_PIXELS', 1 << 24))
+
+@app.route('/render', methods=['POST'])
+def render_api():
+    # a /pack payload plus 'format' (png or svg), 'width' in pixels and an optional 'viewport'
+    # [x0, y0, x1, y1] in box units; fleets render one box, chosen by 'bin' (default 0)
+    data = request.get_json() or {}
+    fmt = data.get('format', 'png')
+    if fmt not in ('png', 'svg'):
+        return jsonify({'error': 'format must be png or svg'}), 400
+    job = {k: v for k, v in data.items() if k not in ('format', 'width', 'viewport', 'bin', 'count_only')}
+    try:
+        width = int(data.get('width', 1200))
+        if not 0 < width <= MAX_RENDER_WIDTH:
+            raise ValueError(f'width must be between 1 and {MAX_RENDER_WIDTH}')
+        viewport = data.get('viewport')
+        result = solve_job(_limit_job(job))
+        placements = result['placements']
+        if 'boxes' in result:
+            box = result['boxes'][int(data.get('bin', 0))]
+            placements = [p for p in placements.rows() if p[5] == box['box']]
+            box_w, box_h = box['w'], box['h']
+        else:
+            box_w, box_h = _box(job.get('box', {}))
+        img_w, img_h = render.image_size(box_w, box_h, width, viewport=viewport)
+        if img_w * img_h > MAX_RENDER_PIXELS:
+            raise ValueError(f'a {img_w} x {img_h} image is over the limit of {MAX_RENDER_PIXELS} pixels; '
+                             'lower width or widen the viewport')
+        if fmt == 'svg':
+            stream = render.svg_chunks(placements, box_w, box_h, width, viewport=viewport)
+            return Response(stream_with_context(exporters.compress_chunks(stream, None)), mimetype='image/svg+xml')
+        img = render.render_image(placements, box_w, box_h, width, viewport=viewport)
+    except (ValueError, TypeError, KeyError, IndexError) as e:
+        return jsonify({'error': str(e)}), 400
+    except ImportError as e:
+        return jsonify({'error': str(e)}), 501
+    buf = io.BytesIO()
+    img.save(buf, 'PNG')
+    return Response(buf.getvalue(), mimetype='image/png')
+
+@app.route('/cache', methods=['GET'])
+def cache_stats():
+    # hit/miss statistics of this worker's result cache (PACKER_CACHE persists it across workers)
+    cache = default_cache()
+    return jsonify(cache.stats() if cache is not None else {'enabled': False})
+
+def _sides(text):
+    # 'W,H' or 'WxH'
+    w, h = text.lower().replace('x', ',').split(',')
+    return float(w), float(h)
+
+@app.route('/capacity', methods=['GET'])
+def capacity_api():
+    # how many items fit: ?box=W,H or ?shelf=ID with ?item=w,h or ?sku=SKU (ids from the catalog and
+    # shelf list of the capacity table, PACKER_CAPACITY), optional count; answered from the table in
+    # O(1) when it lists both sizes, solved otherwise
+    try:
+        table = default_capacity()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 500
+    args = request.args
+    if not ('box' in args or 'shelf' in args) or not ('item' in args or 'sku' in args):
+        return jsonify({'error': 'give box (or shelf) and item (or sku)'}), 400
+    if table is None and ('box' not in args or 'item' not in args):
+        return jsonify({'error': 'shelf and sku need a capacity table'}), 400
+    try:
+        box = _sides(args['box']) if 'box' in args else table.shelf(args['shelf'])
+        item = _sides(args['item']) if 'item' in args else table.item(args['sku'])
+        count = int(args.get('count') or 0) or None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if box is None or item is None:
+        return jsonify({'error': 'unknown shelf' if box is None else 'unknown sku'}), 404
+    found = table.lookup(*box, *item) if table is not None else None
+    if found is None:
+        return jsonify({'count': best_count(*box, *item, count, default_cache()), 'box': box, 'item': item,
+                        'source': 'solved'})
+    return jsonify({'count': found if count is None else min(found, count), 'box': box, 'item': item,
+                    'source': 'table'})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Prometheus text exposition: request latency, solver counters and phases, cache and job queue
+    lines = request_latency.render('packer_request_duration_seconds')
+    stats = current_stats()
+    if stats is not None:
+        snap = stats.snapshot()
+        typed = set()
+        for key, value in snap['counters'].items():
+            name, brace, labels = key.partition('{')
+            metric = f'packer_{name}_total'
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric}{brace}{labels} {value}')
+        lines.append('# TYPE packer_phase_seconds_total counter')
+        lines += [f'packer_phase_seconds_total{{phase="{k}"}} {v["seconds"]}' for k, v in snap['phases'].items()]
+        lines.append('# TYPE packer_phase_calls_total counter')
+        lines += [f'packer_phase_calls_total{{phase="{k}"}} {v["calls"]}' for k, v in snap['phases'].items()]
+    cache = default_cache()
+    if cache is not None:
+        cs = cache.stats()
+        lines.append('# TYPE packer_cache_lookups_total counter')
+        for result in ('hits', 'disk_hits', 'misses'):
+            lines.append(f'packer_cache_lookups_total{{result="{result}"}} {cs[result]}')
+        lines.append('# TYPE packer_cache_entries gauge')
+        lines.append(f'packer_cache_entries {cs["entries"]}')
+    qs = job_queue.stats()
+    lines.append('# TYPE packer_jobs gauge')
+    lines.append(f'packer_jobs{{state="queued"}} {qs["queued"]}')
+    lines.append(f'packer_jobs{{state="running"}} {qs["running"]}')
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    data = request.get_json() or {}
+    try:
+        # the queue stops a job at its time limit, so the node count is left to the caller
+        job_id = job_queue.submit(_limit_job(data, job_queue.time_limit, None), data.get('time_limit'))
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    except QueueFull:
+        resp = jsonify({'error': 'job queue is full, retry later'})
+        resp.headers['Retry-After'] = '1'
+        return resp, 429
+    resp = jsonify(job_queue.get(job_id))
+    resp.headers['Location'] = f'/jobs/{job_id}'
+    return resp, 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'unknown job'}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'unknown job'}), 404
+    return jsonify(job)
+
+def _session(session_id):
+    with sessions_lock:
+        entry = sessions.get(session_id)
+        if entry is not None:
+            sessions.move_to_end(session_id)
+        return entry
+
+def _edit_session(session_id, edit):
+    # run one edit under the session's own lock so edits to different sessions run in parallel
+    entry = _session(session_id)
+    if entry is None:
+        return jsonify({'error': 'unknown session'}), 404
+    session, lock = entry
+    data = request.get_json(silent=True) or {}
+    with lock:
+        try:
+            change = edit(session, data)
+        except (ValueError, TypeError, KeyError) as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({'id': session_id, 'change': change, **session.state()})
+
+@app.route('/sessions', methods=['POST'])
+def create_session():
+    # box + items (+ algorithm, default maxrects): a layout kept on the server for small edits
+    data = request.get_json() or {}
+    try:
+        box_w, box_h = _box(data['box'])
+        session = LayoutSession(box_w, box_h, data.get('items') or [], data.get('algorithm', 'maxrects'))
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'error': str(e)}), 400
+    session_id = uuid.uuid4().hex
+    with sessions_lock:
+        sessions[session_id] = (session, threading.Lock())
+        while len(sessions) > MAX_SESSIONS:
+            sessions.popitem(last=False)
+    resp = jsonify({'id': session_id, **session.state()})
+    resp.headers['Location'] = f'/sessions/{session_id}'
+    return resp, 201
+
+@app.route('/sessions/<session_id>', methods=['GET'])
+def get_session(session_id):
+    entry = _session(session_id)
+    if entry is None:
+        return jsonify({'error': 'unknown session'}), 404
+    session, lock = entry
+    with lock:
+        return jsonify({'id': session_id, **session.state()})
+
+@app.route('/sessions/<session_id>/items', methods=['POST'])
+def session_add_items(session_id):
+    # {'items': [{'w', 'h', 'count'}, ...]} adds types, {'type': t, 'count': n} adds units to one
+    return _edit_session(session_id, lambda s, d: s.add_items(d['items']))
+
+@app.route('/sessions/<session_id>/items/<int:item_type>', methods=['DELETE'])
+def session_remove_items(session_id, item_type):
+    # ?count=N removes N units; without it the whole item type goes
+    count = request.args.get('count', type=int)
+    return _edit_session(session_id, lambda s, d: s.remove_items(item_type, count))
+
+@app.route('/sessions/<session_id>/box', methods=['PUT'])
+def session_resize(session_id):
+    return _edit_session(session_id, lambda s, d: s.resize_box(*_box(d['box'])))
+
+@app.route('/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    with sessions_lock:
+        entry = sessions.pop(session_id, None)
+    if entry is None:
+        return jsonify({'error': 'unknown session'}), 404
+    return '', 204
 
 if __name__ == '__main__':
     app.run(debug=True)